@@ -0,0 +1,207 @@
+"""Time the scanners and rollup scripts on synthetic Downloads trees.
+
+For every size in `--rows`, a tree is generated with
+synthetic_downloads.py and the script chain is run over it, one stage per
+child process so each stage gets its own peak RSS:
+
+    find_and_process, save_outputs     extract_and_fix_dates_downloads
+    raw_scan                           extract_health_from_downloads
+    fix_subset_dates                   fix_subset_dates.main
+    export_nutrition_events            export_nutrition_events.main
+    export_nutrition_full_and_agg      export_nutrition_full_and_agg.main
+    create_final_daily_csv             create_final_daily_csv.main
+
+The scripts' data/ paths are redirected into a scratch directory, so the
+repository's data/ is never touched. Throughput is rows of the generated
+tree per second. Results go to a JSON file (by default under
+data/cache/benchmarks/, named after the commit) that `--compare` reads
+back to print the change against an earlier run.
+
+Usage:
+    python scripts/benchmark.py --rows 1000 10000 100000
+    python scripts/benchmark.py --rows 1000000 --compare data/cache/benchmarks/bench-1d24b6c.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from instrument import peak_rss_mb
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA = ROOT / 'data'
+OUT_DIR = DATA / 'cache' / 'benchmarks'
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+# child process groups, in chain order, and the stages each one times
+GROUPS = [
+    ('scan', ['find_and_process', 'save_outputs']),
+    ('raw_scan', ['raw_scan']),
+    ('fix_subset_dates', ['fix_subset_dates']),
+    ('export_nutrition_events', ['export_nutrition_events']),
+    ('export_nutrition_full_and_agg', ['export_nutrition_full_and_agg']),
+    ('create_final_daily_csv', ['create_final_daily_csv']),
+]
+MODULES = ['extract_and_fix_dates_downloads', 'extract_health_from_downloads', 'fix_subset_dates',
+           'export_nutrition_events', 'export_nutrition_full_and_agg', 'create_final_daily_csv']
+
+
+def redirect(module, data_dir):
+    """Point every data/ path constant of `module` into `data_dir`."""
+    for name, value in list(vars(module).items()):
+        if isinstance(value, Path) and (value == DATA or DATA in value.parents):
+            setattr(module, name, data_dir / value.relative_to(DATA))
+
+
+def run_group(group, tree, data_dir, workers):
+    """Run one group of stages in this process; return {stage: seconds}."""
+    import importlib
+
+    modules = {}
+    for name in MODULES:
+        modules[name] = importlib.import_module(name)
+        redirect(modules[name], data_dir)
+    (data_dir / 'cache').mkdir(parents=True, exist_ok=True)
+
+    seconds = {}
+    start = time.perf_counter()
+    if group == 'scan':
+        dates = modules['extract_and_fix_dates_downloads']
+        found = dates.find_and_process(workers=workers, root=tree)
+        seconds['find_and_process'] = time.perf_counter() - start
+        start = time.perf_counter()
+        dates.save_outputs(*found)
+        seconds['save_outputs'] = time.perf_counter() - start
+    elif group == 'raw_scan':
+        raw = modules['extract_health_from_downloads']
+        raw.normalize_and_save(*raw.find_and_load(workers=workers, root=tree))
+        seconds['raw_scan'] = time.perf_counter() - start
+    else:
+        modules[group].main()
+        seconds[group] = time.perf_counter() - start
+    return seconds
+
+
+def run_child(group, tree, data_dir, workers, log):
+    """Run `group` in a fresh interpreter; return ({stage: seconds}, peak RSS)."""
+    cmd = [sys.executable, __file__, '--child', group, '--tree', str(tree),
+           '--data', str(data_dir), '--workers', str(workers)]
+    with open(log, 'a', encoding='utf-8') as f:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=f, text=True, check=True)
+    # the scripts print progress; the result is the last line
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    with open(log, 'a', encoding='utf-8') as f:
+        f.write(proc.stdout)
+    return result['seconds'], result['peak_rss_mb']
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def environment():
+    import pandas as pd
+
+    commit, dirty = git_commit()
+    return {'commit': commit, 'dirty': dirty,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'platform': platform.platform(), 'machine': platform.machine()}
+
+
+def benchmark(sizes, workers=1, seed=0, work_dir=None, keep=False):
+    """Generate a tree per size and time every stage; return the result dict."""
+    import synthetic_downloads
+
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix='health-bench-'))
+    log = work_dir / 'benchmark.log'
+    results = dict(environment(), workers=workers, seed=seed, runs=[])
+    for rows in sizes:
+        tree = work_dir / f'tree-{rows}'
+        data_dir = work_dir / f'data-{rows}'
+        if not tree.exists():
+            print(f'Generating {rows} rows in {tree}')
+            generated = synthetic_downloads.generate(tree, rows, seed=seed)
+        else:
+            generated = {'files': sum(1 for p in tree.rglob('*') if p.is_file()), 'rows': rows}
+        shutil.rmtree(data_dir, ignore_errors=True)
+        for group, stages in GROUPS:
+            seconds, rss = run_child(group, tree, data_dir, workers, log)
+            for stage in stages:
+                s = seconds[stage]
+                run = {'rows': rows, 'files': generated['files'], 'stage': stage, 'seconds': round(s, 4),
+                       'rows_per_s': round(rows / s) if s > 0 else None, 'peak_rss_mb': rss}
+                results['runs'].append(run)
+                print(f"{rows:>9} rows  {stage:<30} {s:9.3f}s  {run['rows_per_s'] or 0:>10} rows/s  "
+                      f"{rss if rss is not None else '-':>8} MB")
+        if not keep:
+            shutil.rmtree(tree, ignore_errors=True)
+            shutil.rmtree(data_dir, ignore_errors=True)
+    print('Log:', log)
+    return results
+
+
+def compare(old, new):
+    """Print seconds per (rows, stage) of `old` against `new`."""
+    before = {(r['rows'], r['stage']): r for r in old['runs']}
+    print(f"{'rows':>9}  {'stage':<30} {old.get('commit') or 'old':>10} {new.get('commit') or 'new':>10}  ratio")
+    for r in new['runs']:
+        o = before.get((r['rows'], r['stage']))
+        if o is None:
+            continue
+        ratio = o['seconds'] / r['seconds'] if r['seconds'] else float('inf')
+        print(f"{r['rows']:>9}  {r['stage']:<30} {o['seconds']:>9.3f}s {r['seconds']:>9.3f}s  {ratio:5.2f}x")
+
+
+def default_out(results):
+    name = results['commit'] or datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    if results['dirty']:
+        name += '-dirty'
+    return OUT_DIR / f'bench-{name}.json'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='tree sizes in data rows (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1, help='scanner worker processes (0 = one per CPU)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', type=Path, default=None,
+                        help='where trees and outputs go (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated trees and outputs')
+    parser.add_argument('--out', type=Path, default=None, help='results JSON (default: data/cache/benchmarks/)')
+    parser.add_argument('--compare', type=Path, default=None, help='earlier results JSON to compare against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--tree', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--data', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        seconds = run_group(args.child, args.tree, args.data, args.workers)
+        print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_rss_mb()}))
+        sys.exit(0)
+
+    results = benchmark(args.rows, args.workers, args.seed, args.work_dir, args.keep)
+    out = args.out or default_out(results)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print('Wrote', out)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
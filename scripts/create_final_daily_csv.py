@@ -7,77 +7,164 @@ Output: data/final_daily_nutrition_exercise.csv with columns:
 
 Uses `data/nutrition_events_dmy.csv` if present, otherwise falls back to
 `data/nutrition_aggregated.csv` or `data/merged_health_from_downloads_dates_fixed.csv`.
+With `--from` / `--to`, the event rows of that range are built from the
+month partitions of the merged file instead (see month_partitions.py), the
+way export_nutrition_events.py builds them, and the output is named after
+the range, e.g. `final_daily_nutrition_exercise_2025-06_to_2025-07.csv`.
 """
 
+import argparse
 from pathlib import Path
-import pandas as pd
+
+import daily_agg
+import day_key
+import export_nutrition_events as events
+from daily_agg import ChunkDateParser, DailyAccumulator, aggregate
+from daily_patch import DailyPatch, code_version
+from month_partitions import add_range_args, has_dataset, iter_range, range_path, read_range
+from table_io import iter_table, read_columns, read_table, write_table
 
 ROOT = Path(__file__).resolve().parents[1]
 OUT = ROOT / 'data' / 'final_daily_nutrition_exercise.csv'
 PRIM = ROOT / 'data' / 'nutrition_events_dmy.csv'
 BACK1 = ROOT / 'data' / 'nutrition_aggregated.csv'
 BACK2 = ROOT / 'data' / 'merged_health_from_downloads_dates_fixed.csv'
+PATCH = ROOT / 'data' / 'cache' / 'patch_final_daily.pkl'
 
-def join_nonempty_preserve(series):
-    vals = [str(x).strip() for x in series if pd.notna(x) and str(x).strip()!='']
-    seen = set()
-    out = []
-    for v in vals:
-        if v and v not in seen:
-            out.append(v)
-            seen.add(v)
-    return ' | '.join(out)
-
-def main():
-    if PRIM.exists():
-        df = pd.read_csv(PRIM, dtype=str, low_memory=False)
-        date_col = 'Date'
-        food_col = 'Nutrition'
-        ex_col = 'Exercise'
-    elif BACK1.exists():
-        df = pd.read_csv(BACK1, dtype=str, low_memory=False)
-        # assume aggregated already has Nutrition and Exercise joined
-        date_col = 'Date'
-        food_col = 'Nutrition'
-        ex_col = 'Exercise'
-    elif BACK2.exists():
-        df = pd.read_csv(BACK2, dtype=str, low_memory=False)
-        # try to locate columns
-        cols = {c.lower(): c for c in df.columns}
-        date_col = cols.get('date_normalized') or cols.get('date')
-        # guess food/ex columns
-        food_col = cols.get('nutrition') or cols.get('food')
-        ex_col = cols.get('exercise')
-    else:
-        print('No input data found to aggregate')
-        return
+def read_input(path):
+    if not path.exists():
+        return None
+    return read_table(path)
+
+def read_header(path):
+    if not path.exists():
+        return None
+    return read_columns(path)
 
-    # normalize date parsing: expect DD-MM-YYYY in PRIM, else parse
-    # create a parseable datetime column
-    if PRIM.exists():
+def input_columns(path, columns):
+    """Return (date_col, food_col, ex_col, fmt) for input `path`, where `fmt`
+    is the date format of the input if known."""
+    if path == PRIM:
         # PRIM Date format is DD-MM-YYYY
-        df['_dt'] = pd.to_datetime(df[date_col], format='%d-%m-%Y', errors='coerce')
-    else:
-        df['_dt'] = pd.to_datetime(df[date_col], errors='coerce')
+        return 'Date', 'Nutrition', 'Exercise', '%d-%m-%Y'
+    if path == BACK1:
+        # assume aggregated already has Nutrition and Exercise joined
+        return 'Date', 'Nutrition', 'Exercise', None
+    # try to locate columns
+    cols = {c.lower(): c for c in columns}
+    date_col = cols.get('date_normalized') or cols.get('date')
+    # guess food/ex columns
+    food_col = cols.get('nutrition') or cols.get('food')
+    ex_col = cols.get('exercise')
+    return date_col, food_col, ex_col, None
+
+def find_input(columns_of=read_header):
+    """Return (path, (date_col, food_col, ex_col, fmt)) for the first available
+    input; `columns_of(path)` gives its columns or None if it is missing."""
+    for path in (PRIM, BACK1, BACK2):
+        columns = columns_of(path)
+        if columns is not None:
+            return path, input_columns(path, columns)
+    print('No input data found to aggregate')
+    return None
 
-    # group by date (use formatted DD-MM-YYYY for final)
-    df['Date_DMY'] = df['_dt'].dt.strftime('%d-%m-%Y')
+def load(read=read_input, columns_of=read_header):
+    """Read the first available input with `read(path)`.
 
-    # aggregate
-    agg = df.groupby('Date_DMY').agg({
-        food_col: join_nonempty_preserve if food_col in df.columns else (lambda s: ''),
-        ex_col: join_nonempty_preserve if ex_col in df.columns else (lambda s: ''),
-    }).reset_index()
+    Returns (df, date_col, food_col, ex_col, fmt), or None when nothing is found.
+    """
+    found = find_input(columns_of)
+    if found is None:
+        return None
+    path, cols = found
+    return (read(path),) + cols
+
+def load_range(start, end):
+    """`load` for the event rows dated from `start` to `end`, read from the
+    month partitions of BACK2 only."""
+    if not has_dataset(BACK2):
+        print('No input data found to aggregate')
+        return None
+    df = events.build(read_range(BACK2, start, end))
+    if df is None:
+        return None
+    return (df,) + input_columns(PRIM, df.columns)
+
+def finish(agg, food_col, ex_col):
+    # sort newest-first on the day key, then format it as DD-MM-YYYY
+    agg = agg.sort_values('Day', ascending=False, kind='stable')
+    agg['Day'] = day_key.to_text(agg['Day'], '%d-%m-%Y')
 
     # rename to requested columns
-    agg = agg.rename(columns={'Date_DMY': 'Date', food_col: 'Food', ex_col: 'Exercise'})
+    return agg.rename(columns={'Day': 'Date', food_col: 'Food', ex_col: 'Exercise'})
+
+def daily_patch(food_col='Nutrition', ex_col='Exercise', enabled=True):
+    """The DailyPatch that lets `build` re-aggregate only the changed days."""
+    version = code_version([daily_agg.__file__, day_key.__file__, __file__], food_col, ex_col)
+    return DailyPatch(PATCH, version, enabled)
+
+def build(df, date_col='Date', food_col='Nutrition', ex_col='Exercise', fmt='%d-%m-%Y', patch=None):
+    """Return one row per day with food and exercise entries joined.
+
+    With a `patch` (see daily_patch.py), only the days whose rows changed
+    since its last build are aggregated again.
+    """
+    # normalize date parsing: expect DD-MM-YYYY in PRIM, else parse;
+    # group by day key
+    keys = day_key.parse(df[date_col], fmt)
+
+    # aggregate: non-empty items per day, first occurrence order, no repeats
+    if patch is None:
+        agg = aggregate(keys, df, joined=[food_col, ex_col], key_name='Day')
+    else:
+        columns = [c for c in (food_col, ex_col) if c in df.columns]
+        agg = patch.build(keys, df[columns],
+                          lambda keys, rows: aggregate(keys, rows, joined=[food_col, ex_col], key_name='Day'), 'Day')
+    return finish(agg, food_col, ex_col)
+
+def build_streaming(chunks, date_col='Date', food_col='Nutrition', ex_col='Exercise', fmt='%d-%m-%Y'):
+    """`build` over an iterable of frames; only one chunk and the per-date
+    accumulators are held in memory."""
+    parse = ChunkDateParser(fmt)
+    acc = DailyAccumulator(joined=[food_col, ex_col])
+    for chunk in chunks:
+        acc.add(parse(chunk[date_col]), chunk)
+    return finish(acc.result('Day'), food_col, ex_col)
 
-    # sort newest-first
-    agg['_dt'] = pd.to_datetime(agg['Date'], format='%d-%m-%Y', errors='coerce')
-    agg = agg.sort_values('_dt', ascending=False).drop(columns=['_dt'])
+def save(agg, formats=('csv',), out=None):
+    for path in write_table(agg, out or OUT, formats):
+        print('Saved final CSV to', path, 'shape=', agg.shape)
 
-    agg.to_csv(OUT, index=False)
-    print('Saved final CSV to', OUT, 'shape=', agg.shape)
+def main(chunksize=None, start=None, end=None):
+    ranged = start is not None or end is not None
+    # a range never replaces the full-history output
+    out = range_path(OUT, start, end)
+    if chunksize and ranged:
+        if not has_dataset(BACK2):
+            print('No input data found to aggregate')
+            return
+        date_col, food_col, ex_col, fmt = input_columns(PRIM, [])
+        chunks = (events.build(chunk) for chunk in iter_range(BACK2, chunksize, start, end))
+        save(build_streaming(chunks, date_col, food_col, ex_col, fmt), out=out)
+        return
+    if chunksize:
+        found = find_input()
+        if found is None:
+            return
+        path, (date_col, food_col, ex_col, fmt) = found
+        chunks = iter_table(path, chunksize, columns=[date_col, food_col, ex_col])
+        save(build_streaming(chunks, date_col, food_col, ex_col, fmt))
+        return
+    loaded = load_range(start, end) if ranged else load()
+    if loaded is None:
+        return
+    df, date_col, food_col, ex_col, fmt = loaded
+    save(build(df, date_col, food_col, ex_col, fmt), out=out)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the input in chunks of this many rows (memory bounded by the number of days)')
+    add_range_args(parser)
+    args = parser.parse_args()
+    main(args.chunksize, args.start, args.end)
@@ -7,17 +7,15 @@ Sorted by date (latest first).
 from pathlib import Path
 import pandas as pd
 
+import day_key
+from table_io import read_table, write_table
+
 ROOT = Path(__file__).resolve().parents[1]
 IN_FILE = ROOT / 'data' / 'merged_health_clean_subset_dates_fixed_source.csv'
 OUT_FILE = ROOT / 'data' / 'nutrition.csv'
 
-def main():
-    if not IN_FILE.exists():
-        print('Input file not found:', IN_FILE)
-        return
-    print('Loading', IN_FILE)
-    df = pd.read_csv(IN_FILE, dtype=str, encoding='utf-8', low_memory=False)
-
+def build(df):
+    """Return the Day/Month/Year rows of the subset, or None without a date column."""
     # Find date column: prefer 'Date', then 'Date_normalized', then any column containing 'date'
     date_col = None
     for candidate in ['Date','Date_normalized','date','Date_normalised']:
@@ -32,15 +30,17 @@ def main():
 
     if date_col is None:
         print('No date column found; aborting')
-        return
+        return None
 
-    # parse to datetime (coerce invalid)
-    df['_dt'] = pd.to_datetime(df[date_col], errors='coerce')
+    # parse to day keys (invalid -> <NA>)
+    keys = day_key.parse(df[date_col])
 
-    # create Day, Month, Year
-    df['Day'] = df['_dt'].dt.day
-    df['Month'] = df['_dt'].dt.month
-    df['Year'] = df['_dt'].dt.year
+    # create Day, Month, Year; float when some date is missing, as the
+    # .dt accessors gave them
+    parts = day_key.to_parts(keys)
+    if keys.isna().any():
+        parts = [p.astype('float64') for p in parts]
+    df['Day'], df['Month'], df['Year'] = parts
 
     # keep Weight, Nutrition, Exercise if present (case-insensitive)
     cols_lower = {c.lower(): c for c in df.columns}
@@ -56,18 +56,30 @@ def main():
     out['Nutrition'] = df[nutrition_col] if nutrition_col else None
     out['Exercise'] = df[exercise_col] if exercise_col else None
 
-    # drop rows with no date (i.e., _dt is NaT)
-    out['_dt'] = df['_dt']
-    out = out.dropna(subset=['_dt'])
+    # drop rows with no date (i.e., no day key)
+    out['_key'] = keys
+    out = out.dropna(subset=['_key'])
 
     # sort by date descending (latest first)
-    out = out.sort_values('_dt', ascending=False)
+    out = out.sort_values('_key', ascending=False, kind='stable')
 
     # drop helper
-    out = out.drop(columns=['_dt'])
+    out = out.drop(columns=['_key'])
+    return out
+
+def save(out, formats=('csv',)):
+    for path in write_table(out, OUT_FILE, formats):
+        print('Saved', path, 'shape=', out.shape)
 
-    out.to_csv(OUT_FILE, index=False)
-    print('Saved', OUT_FILE, 'shape=', out.shape)
+def main():
+    if not IN_FILE.exists():
+        print('Input file not found:', IN_FILE)
+        return
+    print('Loading', IN_FILE)
+    df = read_table(IN_FILE)
+    out = build(df)
+    if out is not None:
+        save(out)
 
 if __name__ == '__main__':
     main()
@@ -7,46 +7,62 @@ Reads `data/nutrition.csv` (expects Day,Month,Year columns) and outputs
 from pathlib import Path
 import pandas as pd
 
+import day_key
+from table_io import read_table, write_table
+
 ROOT = Path(__file__).resolve().parents[1]
 IN_FILE = ROOT / 'data' / 'nutrition.csv'
 OUT_FILE = ROOT / 'data' / 'nutrition_dmy.csv'
 
-def main():
-    if not IN_FILE.exists():
-        print('Input file not found:', IN_FILE)
-        return
-    print('Loading', IN_FILE)
-    df = pd.read_csv(IN_FILE, dtype=str, encoding='utf-8', low_memory=False)
+def whole_numbers(s):
+    """`int(float(value))` of each value of `s`, <NA> where that fails;
+    computed once per distinct value."""
+    def to_int(value):
+        try:
+            return int(float(value))
+        except Exception:
+            return None
+    codes, uniques = pd.factorize(s)
+    numbers = pd.array([to_int(u) for u in uniques], dtype='Int64')
+    return pd.Series(numbers.take(codes, allow_fill=True), index=s.index)
 
+def build(df):
+    """Return the rows of `nutrition.csv` with a DD-MM-YYYY Date, or None."""
     # Ensure Day/Month/Year present
     for c in ['Day','Month','Year']:
         if c not in df.columns:
             print('Missing column', c, 'in', IN_FILE)
-            return
+            return None
 
-    # Pad and build date string DD-MM-YYYY
-    def to_dmy(row):
-        try:
-            d = int(float(row['Day']))
-            m = int(float(row['Month']))
-            y = int(float(row['Year']))
-            return f"{d:02d}-{m:02d}-{y:04d}"
-        except Exception:
-            return ''
-
-    df['Date'] = df.apply(to_dmy, axis=1)
+    # whole Day/Month/Year numbers; Date is '' when one of them is not a number
+    d, m, y = (whole_numbers(df[c]) for c in ['Day','Month','Year'])
+    ok = d.notna() & m.notna() & y.notna()
+    text = (d.astype(str).str.zfill(2) + '-' + m.astype(str).str.zfill(2) + '-' + y.astype(str).str.zfill(4))
+    df['Date'] = text.where(ok, '')
 
-    # parse to datetime for sorting; invalid parse -> NaT
-    df['_dt'] = pd.to_datetime(df['Date'], format='%d-%m-%Y', errors='coerce')
+    # day keys for sorting; dates that do not exist -> <NA>
+    df['_key'] = day_key.from_parts(d, m, y)
 
     # sort newest-first
-    df = df.sort_values('_dt', ascending=False)
+    df = df.sort_values('_key', ascending=False, kind='stable')
 
     # drop helper
     df_out = df[['Date','Weight','Nutrition','Exercise']].copy()
+    return df_out
 
-    df_out.to_csv(OUT_FILE, index=False)
-    print('Saved', OUT_FILE, 'shape=', df_out.shape)
+def save(df_out, formats=('csv',)):
+    for path in write_table(df_out, OUT_FILE, formats):
+        print('Saved', path, 'shape=', df_out.shape)
+
+def main():
+    if not IN_FILE.exists():
+        print('Input file not found:', IN_FILE)
+        return
+    print('Loading', IN_FILE)
+    df = read_table(IN_FILE)
+    out = build(df)
+    if out is not None:
+        save(out)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,182 @@
+"""Read CSV files: encoding and header from the first bytes, rows with pyarrow.
+
+The scanners used to read a CSV whole as UTF-8 and, when that failed
+anywhere, read all of it again as latin-1, and ran `pd.read_csv(nrows=0)`
+through the whole pandas parser just to look at a header; every script
+had its own `read_csv(dtype=str, low_memory=False)`. All CSV reads go
+through here instead:
+
+- `sniff` reads the first PREFIX_BYTES of a file and returns its encoding
+  (from a BOM, else UTF-8 if the prefix decodes as UTF-8, else latin-1)
+  and its header, parsed from those bytes with the csv module and named
+  the way read_csv names columns (`Unnamed: 3`, `a.1`).
+- `read_csv` sniffs the file, then loads it as strings with pyarrow's
+  multithreaded CSV reader, only `columns` if given. A file pyarrow
+  rejects (rows with more or fewer fields than the header, which read_csv
+  pads or turns into an index) goes to pandas' C engine instead, and a
+  file that turns out not to be UTF-8 past the prefix is read again as
+  latin-1. Either way the frame is the one `pd.read_csv(path, dtype=str)`
+  returns, with the `categorical` columns as categoricals.
+
+Usage:
+    if header_has_expected(read_header(path) or []):
+        df = read_csv(path)
+"""
+
+import codecs
+import csv
+import io
+from collections import defaultdict
+
+import pandas as pd
+
+PREFIX_BYTES = 64 * 1024
+
+# read_csv's default NA strings
+NA_STRINGS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+              '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+BOMS = [(codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+
+
+def detect_encoding(prefix, final=False):
+    """Encoding of a file from its first bytes (all of them if `final`)."""
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        # a character cut off at the end of the prefix is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=final)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    return 'utf-8'
+
+
+def column_names(names):
+    """`names` as read_csv names the columns of a header: empty names become
+    `Unnamed: i` and repeats get `.1`, `.2`, ..., skipping names the header
+    already has; named columns are numbered before unnamed ones."""
+    unnamed = [i for i, name in enumerate(names) if name == '']
+    named = [i for i, name in enumerate(names) if name != '']
+    names = [name if name != '' else f'Unnamed: {i}' for i, name in enumerate(names)]
+    counts = {}
+    for i in named + unnamed:
+        name = original = names[i]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f'{original}.{count}'
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def header_row(path):
+    """(encoding, header cells as written) of the CSV at `path` from its
+    first bytes; the cells are None for a file without a header line."""
+    with open(path, 'rb') as f:
+        prefix = f.read(PREFIX_BYTES)
+    final = len(prefix) < PREFIX_BYTES
+    encoding = detect_encoding(prefix, final)
+    text = codecs.getincrementaldecoder('utf-8-sig' if encoding == 'utf-8' else encoding)(
+        errors='replace').decode(prefix, final=final)
+    # read_csv skips blank lines before the header
+    for row in csv.reader(io.StringIO(text)):
+        if row:
+            return encoding, row
+    return encoding, None
+
+
+def sniff(path):
+    """(encoding, column names) of the CSV at `path` from its first bytes,
+    the names as `pd.read_csv(path, nrows=0)` gives them; None for a file
+    without a header line."""
+    encoding, row = header_row(path)
+    return encoding, None if row is None else column_names(row)
+
+
+def read_header(path):
+    """Column names of the CSV at `path` (see `sniff`)."""
+    return sniff(path)[1]
+
+
+def read_csv(path, columns=None, categorical=()):
+    """The CSV at `path` as strings, as `pd.read_csv(path, dtype=str)` reads
+    it, with the `categorical` columns as categoricals.
+
+    `columns` is a list of names to read; unknown names are ignored.
+    """
+    encoding, row = header_row(path)
+    if row is None:
+        raise pd.errors.EmptyDataError(f'No columns to parse from file {path}')
+    try:
+        return read_with_arrow(path, encoding, row, columns, categorical)
+    except Exception:
+        pass
+    try:
+        return read_with_pandas(path, encoding, columns, categorical)
+    except UnicodeDecodeError:
+        if encoding != 'utf-8':
+            raise
+    # not UTF-8 after all, past the prefix
+    try:
+        return read_with_arrow(path, 'latin-1', row, columns, categorical)
+    except Exception:
+        return read_with_pandas(path, 'latin-1', columns, categorical)
+
+
+def read_with_arrow(path, encoding, row, columns, categorical):
+    """`read_csv` with pyarrow; raises where pyarrow reads the file differently
+    from read_csv (or not at all)."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    names = column_names(row)
+    types = {raw: pa.dictionary(pa.int32(), pa.string()) if name in categorical else pa.string()
+             for raw, name in zip(row, names)}
+    if columns is not None and not set(names) & set(columns):
+        raise ValueError(f'none of {columns} in {path}')
+    include = None
+    if columns is not None and names == row:
+        # file order, as usecols
+        include = [name for name in names if name in set(columns)]
+    table = pa_csv.read_csv(
+        str(path),
+        read_options=pa_csv.ReadOptions(use_threads=True, encoding='utf8' if encoding == 'utf-8' else encoding),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types=types, include_columns=include, null_values=NA_STRINGS,
+                                              strings_can_be_null=True, quoted_strings_can_be_null=True))
+    if table.column_names != (row if include is None else include):
+        raise ValueError(f'header of {path} read differently')
+    if include is None:
+        table = table.rename_columns(names)
+        if columns is not None:
+            table = table.select([i for i, name in enumerate(names) if name in set(columns)])
+    df = table.to_pandas()
+    for name in df.columns:
+        if name in categorical:
+            # sorted, as read_csv orders the categories
+            categories = df[name].cat.categories
+            categories = categories.astype('str' if len(categories) else object)
+            df[name] = df[name].cat.rename_categories(categories).cat.reorder_categories(categories.sort_values())
+        else:
+            df[name] = df[name].astype('str')
+    return df
+
+
+def read_with_pandas(path, encoding, columns, categorical):
+    dtype = {name: 'category' for name in categorical}
+    usecols = None if columns is None else set(columns).__contains__
+    df = pd.read_csv(path, dtype=defaultdict(lambda: str, dtype), encoding=encoding, low_memory=False,
+                     usecols=usecols)
+    # a defaultdict dtype leaves the columns of a header-only file as object
+    return df.astype({name: 'str' for name in df.columns if df[name].dtype == object})
+
+
+def try_read_csv(path):
+    """`read_csv(path)`, or None if the file cannot be read."""
+    try:
+        return read_csv(path)
+    except Exception:
+        return None
@@ -0,0 +1,138 @@
+"""Fold rows into per-date accumulators, one chunk at a time.
+
+`create_final_daily_csv.py` and `export_nutrition_full_and_agg.py` build
+their per-day tables with `groupby(...).agg` over the whole input. In
+streaming mode they feed the input to a `DailyAccumulator` chunk by chunk
+instead. For every date it keeps
+
+- each joined column's distinct non-empty items, stripped, in the order
+  they were first seen (joined with ' | ' at the end), and
+- each "last" column's last non-empty value, as it appears in the input,
+
+so memory grows with the number of dates and their distinct items, not
+with the number of rows or chunks: `add` keeps only the (date, item) pairs
+of a chunk that are not stored yet and overwrites each date's last value.
+`result()` returns the same table, in the same (sorted date key) order, as
+the scripts' old `groupby(...).agg` with Python lambdas. Everything is
+vectorized: stripping and filtering are string ops, a chunk's pairs are
+deduped with `drop_duplicates` and checked against the stored ones with one
+`isin`, the last weight is `drop_duplicates(keep='last')` and the final join
+is one `np.add.reduceat`, so the cost stays flat as the number of dates
+grows.
+`aggregate` runs it over a single in-memory frame.
+
+A value is empty when it is missing or when, stripped, it is one of
+`empty`.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+import day_key
+
+# strings pd.to_datetime skips when it infers a format from the first value
+NAT_STRINGS = {'', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN', 'now', 'today'}
+
+
+def nonempty(values, empty):
+    """(mask, stripped values) of the non-empty entries of `values`."""
+    stripped = values.astype(str).str.strip().where(values.notna())
+    return stripped.notna() & ~stripped.isin(empty), stripped
+
+
+class DailyAccumulator:
+    def __init__(self, joined=(), last=(), empty=('',)):
+        self.joined = list(joined)
+        self.last = list(last)
+        self.empty = list(empty)
+        self.dtype = object
+        # distinct keys, each column's distinct (key, item) pairs in the order
+        # first seen, and each "last" column's value by key
+        self.keys = pd.Index([], dtype=object)
+        self.items = {c: pd.DataFrame({'key': [], 'value': []}, dtype=object) for c in self.joined}
+        self.latest = {c: pd.Series([], index=pd.Index([], dtype=object), dtype=object) for c in self.last}
+
+    def add(self, keys, chunk):
+        """Fold the rows of `chunk` into the dates in `keys` (NaN keys are dropped)."""
+        valid = keys.notna().to_numpy()
+        self.dtype = keys.dtype
+        keys = keys[valid].astype(object).reset_index(drop=True)
+        chunk = chunk[valid].reset_index(drop=True)
+        fresh = pd.Index(keys.unique(), dtype=object)
+        self.keys = self.keys.append(fresh[~fresh.isin(self.keys)])
+        for c in self.joined:
+            if c not in chunk.columns:
+                continue
+            keep, stripped = nonempty(chunk[c], self.empty)
+            # first occurrence of each item wins: keep the chunk's new pairs only
+            pairs = pd.DataFrame({'key': keys[keep], 'value': stripped[keep].astype(object)}).drop_duplicates()
+            stored = pd.MultiIndex.from_frame(self.items[c])
+            new = ~pd.MultiIndex.from_frame(pairs).isin(stored)
+            self.items[c] = pd.concat([self.items[c], pairs[new]], ignore_index=True)
+        for c in self.last:
+            if c not in chunk.columns:
+                continue
+            keep, _ = nonempty(chunk[c], self.empty)
+            pairs = pd.DataFrame({'key': keys[keep], 'value': chunk[c][keep].astype(object)})
+            latest = pairs.drop_duplicates('key', keep='last').set_index('key')['value']
+            old = self.latest[c]
+            self.latest[c] = pd.concat([old[~old.index.isin(latest.index)], latest])
+
+    def result(self, key_name):
+        """One row per date, sorted by date key; dates without items get ''."""
+        out = pd.DataFrame({key_name: pd.Series(self.keys.sort_values(), dtype=self.dtype)})
+        for c in self.last:
+            out[c] = out[key_name].map(self.latest[c]).fillna('')
+        for c in self.joined:
+            items = self.items[c]
+            # str even when no date has an item (an all-'' column would be object)
+            out[c] = out[key_name].map(join_groups(items['key'], items['value'])).fillna('').astype('str')
+        return out
+
+
+def join_groups(keys, values, sep=' | '):
+    """`sep`-join `values` per key, keeping their order within a key.
+
+    Equivalent to `values.groupby(keys).agg(sep.join)`, but the strings are
+    concatenated by one `np.add.reduceat` over all groups instead of a
+    Python call per group.
+    """
+    if len(keys) == 0:
+        return pd.Series([], dtype=object)
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    values = values.to_numpy(dtype=object)[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    # every item but the first of its group gets the separator in front
+    pieces = sep + values
+    pieces[starts] = values[starts]
+    return pd.Series(np.add.reduceat(pieces, starts), index=uniques.take(codes[starts]))
+
+
+def aggregate(keys, frame, joined=(), last=(), empty=('',), key_name='key'):
+    """`DailyAccumulator` over a single frame: one row per distinct key."""
+    acc = DailyAccumulator(joined, last, empty)
+    acc.add(keys, frame)
+    return acc.result(key_name)
+
+
+class ChunkDateParser:
+    """`day_key.parse(column, fmt)` applied chunk by chunk.
+
+    Without `fmt`, pandas infers a format from the first non-null value of
+    the whole column; the parser does the same with the first chunk that
+    has one, and uses that format for every later chunk.
+    """
+
+    def __init__(self, fmt=None):
+        self.fmt = fmt
+
+    def __call__(self, values):
+        if self.fmt is None:
+            for v in values:
+                if isinstance(v, str) and v not in NAT_STRINGS:
+                    self.fmt = guess_datetime_format(v, dayfirst=False) or 'mixed'
+                    break
+        return day_key.parse(values, self.fmt)
@@ -0,0 +1,128 @@
+"""Rebuild a per-day table by re-aggregating only the days whose rows changed.
+
+A row of `nutrition_aggregated.csv` or `final_daily_nutrition_exercise.csv`
+depends on the input rows of its own day alone, in input order. A
+`DailyPatch` keeps, from the last build, the table (with its day keys,
+before formatting) and a digest of every day's rows. The next build hashes
+the input again and compares digests: only the days that changed, appeared
+or disappeared are aggregated, from their own rows, and replace their old
+rows in the table. Everything else is copied.
+
+A day's digest covers the columns the aggregation reads and each row's
+position within the day, so the patched table equals a full rebuild.
+Hashing is one vectorized pass over the rows; the string work follows the
+number of changed days.
+
+The state is a pickle under data/cache/. It is dropped, and the table built
+in full, when its version differs: a hash of the code that builds the table
+and of the columns it reads.
+
+    patch = DailyPatch(PATCH, code_version([daily_agg.__file__, __file__], columns))
+    agg = patch.build(keys, frame[columns], lambda keys, rows: aggregate(...), 'Date')
+    ... write agg ...
+    patch.save()
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+PRIME = np.uint64(0x100000001B3)
+# hash of a missing value (code -1 takes the last entry)
+MISSING = np.uint64(0x9E3779B97F4A7C15)
+
+
+def code_version(files, *extra):
+    """Hash of the contents of `files` and the repr of `extra`."""
+    h = hashlib.sha1()
+    for path in files:
+        h.update(Path(path).read_bytes())
+    h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+def row_hashes(frame):
+    """uint64 hash of each row of `frame`. Each column's distinct values are
+    hashed once and taken by code, which is much cheaper than hashing every
+    cell's string."""
+    hashes = np.zeros(len(frame), dtype='uint64')
+    for _, values in frame.items():
+        codes, uniques = pd.factorize(values)
+        hashed = np.append(pd.util.hash_array(np.asarray(uniques, dtype=object).astype(str)), MISSING)
+        hashes = hashes * PRIME ^ hashed[codes]
+    return hashes
+
+
+def day_digests(keys, frame):
+    """uint64 digest of the rows of `frame` on each key of `keys`, indexed by
+    key; rows with a missing key are left out."""
+    valid = keys.notna().to_numpy()
+    keys = keys[valid].reset_index(drop=True)
+    if len(keys) == 0:
+        return pd.Series([], dtype='uint64', index=pd.Index(keys))
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    # position of each row within its day, hashed in so that moving rows
+    # within a day changes its digest
+    position = np.arange(len(codes)) - np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+    hashes = pd.util.hash_array(row_hashes(frame[valid])[order] + position.astype('uint64') * PRIME)
+    return pd.Series(np.bitwise_xor.reduceat(hashes, starts), index=uniques.take(codes[starts]))
+
+
+def changed_keys(old, new):
+    """Keys whose digest differs between `old` and `new`, or that are in
+    only one of them."""
+    common = old.index.intersection(new.index)
+    differs = common[old.reindex(common).to_numpy() != new.reindex(common).to_numpy()]
+    return differs.append(old.index.difference(new.index)).append(new.index.difference(old.index))
+
+
+class DailyPatch:
+    def __init__(self, path, version, enabled=True):
+        self.path = Path(path)
+        self.version = version
+        self.previous = None
+        self.state = None
+        # days re-aggregated by the last build; None after a full build
+        self.recomputed = None
+        if enabled and self.path.exists():
+            try:
+                state = pd.read_pickle(self.path)
+            except Exception:
+                print('Ignoring unreadable patch state', self.path)
+            else:
+                if state.get('version') == version:
+                    self.previous = state
+
+    def build(self, keys, frame, aggregate, key_name):
+        """`aggregate(keys, frame)`, a table sorted by the day keys in column
+        `key_name`, recomputed only for the changed days when the last
+        build's table is available."""
+        digests = day_digests(keys, frame)
+        if self.previous is None:
+            table = aggregate(keys, frame)
+        else:
+            changed = changed_keys(self.previous['digests'], digests)
+            old = self.previous['table']
+            rows = keys.isin(changed).to_numpy()
+            fresh = aggregate(keys[rows], frame[rows])
+            table = pd.concat([old[~old[key_name].isin(changed)], fresh], ignore_index=True)
+            table = table.sort_values(key_name, kind='stable', ignore_index=True)
+            self.recomputed = len(changed)
+            print('Patched', self.recomputed, 'of', len(digests), 'days')
+            instrument.count('days_recomputed', self.recomputed)
+        self.state = {'version': self.version, 'digests': digests, 'table': table}
+        return table
+
+    def save(self):
+        """Keep the state of the last build for the next one."""
+        if self.state is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(self.state, self.path)
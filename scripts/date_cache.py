@@ -0,0 +1,110 @@
+"""Persistent cache of parsed raw date strings.
+
+The same serials and text dates show up in every copy of a workbook, so the
+date scripts keep what they parsed in a small SQLite table keyed by
+(raw string, parser version). Values are stored as microseconds since the
+epoch (NULL for unparseable). Every lookup stamps the rows it hits; when the
+table grows past `max_entries` the least recently used rows are dropped on
+close.
+
+Usage:
+    with DateParseCache(path) as cache:
+        df['Date_normalized'] = normalize_dates(df['Date'], parser, cache=cache)
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+MAX_ENTRIES = 200_000
+# sqlite's default limit on host parameters is 999
+CHUNK = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS date_parse (
+    raw TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value INTEGER,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (raw, version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS date_parse_used ON date_parse (used);
+"""
+
+
+def to_micros(value):
+    if pd.isna(value):
+        return None
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[us]').astype('int64'))
+
+
+def from_micros(value):
+    if value is None:
+        return pd.NaT
+    return pd.Timestamp(value, unit='us')
+
+
+class DateParseCache:
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.stamp = int(time.time())
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, raws, version):
+        """Return {raw: Timestamp or NaT} for the raws already cached."""
+        raws = list(raws)
+        found = {}
+        for i in range(0, len(raws), CHUNK):
+            chunk = raws[i:i + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT raw, value FROM date_parse WHERE version = ? AND raw IN ({marks})',
+                [version] + chunk).fetchall()
+            for raw, value in rows:
+                found[raw] = from_micros(value)
+        if found:
+            self.conn.executemany('UPDATE date_parse SET used = ? WHERE raw = ? AND version = ?',
+                                  [(self.stamp, raw, version) for raw in found])
+        self.hits += len(found)
+        self.misses += len(raws) - len(found)
+        return found
+
+    def store(self, parsed, version):
+        """Cache {raw: value}; tz-aware or out-of-range values are skipped."""
+        rows = []
+        for raw, value in parsed.items():
+            try:
+                if getattr(value, 'tzinfo', None) is not None:
+                    continue
+                rows.append((raw, version, to_micros(value), self.stamp))
+            except Exception:
+                continue
+        self.conn.executemany('INSERT OR REPLACE INTO date_parse VALUES (?, ?, ?, ?)', rows)
+
+    def evict(self):
+        """Drop least recently used rows beyond `max_entries`."""
+        (count,) = self.conn.execute('SELECT COUNT(*) FROM date_parse').fetchone()
+        extra = count - self.max_entries
+        if extra > 0:
+            self.conn.execute(
+                'DELETE FROM date_parse WHERE (raw, version) IN '
+                '(SELECT raw, version FROM date_parse ORDER BY used LIMIT ?)', (extra,))
+        return max(extra, 0)
+
+    def close(self):
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,240 @@
+"""Column-level date normalization shared by the date-fixing scripts.
+
+`normalize_date_value` (extract_and_fix_dates_downloads.py), `try_parse_any`
+(fix_dates_v2.py) and `parse_date_value` (fix_subset_dates.py) parse one cell
+at a time: a few regexes, up to eight `pd.to_datetime(format=...)` attempts
+and finally dateutil. `normalize_dates` gives the same result for a whole
+column:
+
+- cleaning (ordinal suffixes, commas, `45909.0` floats) is done with
+  vectorized string ops, in the same order as the per-cell parser
+- values are bucketed into pattern classes (Excel serials, YYYYMMDD, YYMMDD,
+  one class per strptime format) and each class is converted with a single
+  vectorized call
+- whatever is left is de-duplicated and handed to the per-cell parser, which
+  is the only place dateutil is ever reached
+
+A sheet almost always sticks to one date convention. `infer_format` picks
+it from a sample of the column (day-first or month-first included) and
+`normalize_dates(..., fmt=...)` tries that format first: the whole column is
+then parsed in one pass, and ambiguous values such as 03/04/2025 are read the
+way the rest of the sheet is instead of always day-first.
+
+Under a run report (instrument.py) every distinct value is counted by the
+tier that resolved it: `dates.cached`, `dates.serial`, `dates.digits`
+(YYYYMMDD/YYMMDD), `dates.format`, `dates.fallback` (the per-cell parser)
+or `dates.failed`; `dates.native` counts typed date cells.
+"""
+
+import datetime
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+excel_epoch = pd.Timestamp('1899-12-30')
+
+# bump when the vectorized classes change meaning; invalidates cached parses
+PARSER_VERSION = 2
+
+FORMATS = ['%d/%m/%Y','%d-%m-%Y','%Y-%m-%d','%m/%d/%Y','%d %b %Y','%d %B %Y','%Y.%m.%d']
+NULL_TOKENS = ['nan','none','na']
+STEPS = ('ordinals', 'trim', 'float')
+
+# candidates for a column's dominant format; the per-cell parsers have no
+# month-first variant with dashes, so it is only ever tried as a whole column
+INFER_FORMATS = FORMATS + ['%m-%d-%Y']
+# distinct values looked at when inferring a column's format
+SAMPLE_SIZE = 500
+
+# same threshold as the per-cell parsers: numbers above it are Excel serials
+SERIAL_MIN = 29500
+# serials above this (year ~2190) are left to the per-cell parser so that
+# out-of-range values fall through exactly like they do there
+SERIAL_MAX = 106000
+
+ORDINAL_RE = r'(?<=\d)(st|nd|rd|th)\b'
+FLOAT_RE = r'^(\d+)\.0+\Z'
+
+
+def clean_strings(s, steps):
+    """Apply the per-cell cleaning steps, in order, to a string Series."""
+    for step in steps:
+        if step == 'ordinals':
+            s = s.str.replace(ORDINAL_RE, '', case=False, regex=True)
+        elif step == 'trim':
+            s = s.str.strip().str.strip(',')
+        elif step == 'float':
+            s = s.str.replace(FLOAT_RE, r'\1', regex=True)
+        else:
+            raise ValueError(f'unknown cleaning step: {step}')
+    return s
+
+
+def as_datetime(results, index):
+    """Turn per-cell parser results into a datetime Series when possible."""
+    try:
+        out = pd.to_datetime(pd.Series(list(results), index=index, dtype=object))
+        if out.dt.tz is None:
+            return out
+    except Exception:
+        pass
+    return pd.Series(list(results), index=index, dtype=object)
+
+
+def clean_values(values, steps):
+    """The non-empty values of a Series as cleaned strings."""
+    raw = values.astype(object)
+    s = raw.where(raw.isna(), raw.map(str, na_action='ignore')).str.strip()
+    todo = raw.notna() & (s != '') & ~s.str.lower().isin(NULL_TOKENS)
+    return clean_strings(s[todo], steps)
+
+
+def parse_column(values, fallback, steps, formats):
+    """Parse a Series by pattern class; leftovers go through `fallback`."""
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[us]')
+    if values.empty:
+        return out
+
+    raw = values.astype(object)
+    s = clean_values(values, steps)
+    leftover = pd.Series(False, index=values.index)
+
+    # pure numbers: Excel serials, YYYYMMDD, YYMMDD
+    numeric = s.str.fullmatch(r'\d+')
+    num = s[numeric]
+    n = pd.to_numeric(num, errors='coerce')
+    serial = (n > SERIAL_MIN) & (n <= SERIAL_MAX)
+    if serial.any():
+        days = n[serial].astype('int64')
+        out[days.index] = excel_epoch + pd.to_timedelta(days, unit='D')
+        instrument.count('dates.serial', len(days))
+    rest = num[~serial & (n <= SERIAL_MIN)]
+    for length, fmt in [(8, '%Y%m%d'), (6, '%y%m%d')]:
+        cand = rest[rest.str.len() == length]
+        if cand.empty:
+            continue
+        parsed = pd.to_datetime(cand, format=fmt, errors='coerce')
+        hit = parsed.notna()
+        out[parsed.index[hit]] = parsed[hit]
+        instrument.count('dates.digits', int(hit.sum()))
+    resolved = out[num.index].notna()
+    leftover[num.index[~resolved]] = True
+
+    # everything else: one vectorized pass per strptime format, in order
+    text = s[~numeric]
+    for fmt in formats:
+        if text.empty:
+            break
+        parsed = pd.to_datetime(text, format=fmt, errors='coerce')
+        hit = parsed.notna()
+        out[parsed.index[hit]] = parsed[hit]
+        instrument.count('dates.format', int(hit.sum()))
+        text = text[~hit]
+    leftover[text.index] = True
+
+    if leftover.any():
+        left = raw[leftover]
+        parsed = {v: fallback(v) for v in pd.unique(left)}
+        resolved = as_datetime(left.map(parsed), left.index)
+        failed = int(resolved.isna().sum())
+        instrument.count('dates.fallback', len(resolved) - failed)
+        instrument.count('dates.failed', failed)
+        if resolved.dtype == object:
+            out = out.astype(object)
+        out[left.index] = resolved
+    return out
+
+
+def parser_version(fallback, steps, formats):
+    """Cache key for a parser configuration; changes when its code does."""
+    h = hashlib.sha1()
+    h.update(str(PARSER_VERSION).encode())
+    h.update(fallback.__code__.co_code)
+    h.update(repr((fallback.__code__.co_consts, tuple(steps), list(formats))).encode())
+    return f'{fallback.__name__}-{h.hexdigest()[:12]}'
+
+
+def infer_format(values, steps=STEPS, candidates=INFER_FORMATS, sample=SAMPLE_SIZE):
+    """The format in `candidates` that parses the most of (a sample of) the
+    distinct text values of a date column, or None if none parses any.
+
+    Ties go to the earlier candidate, so a column of only ambiguous values
+    like 03/04/2025 stays day-first. Pure numbers are left out; Excel serials
+    and YYYYMMDD have their own vectorized classes.
+    """
+    s = pd.Series(pd.unique(clean_values(pd.Series(values), steps)), dtype=object)
+    s = s[~s.str.fullmatch(r'\d+')]
+    if len(s) > sample:
+        s = s.iloc[np.linspace(0, len(s) - 1, sample).astype(int)]
+    best, best_hits = None, 0
+    for fmt in candidates:
+        hits = pd.to_datetime(s, format=fmt, errors='coerce').notna().sum()
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+    return best
+
+
+def format_hits(values, fmt, steps=STEPS):
+    """(non-empty values, values `fmt` parses) of a date column."""
+    s = clean_values(pd.Series(values), steps)
+    if fmt is None or s.empty:
+        return len(s), 0
+    counts = s.value_counts()
+    ok = pd.to_datetime(pd.Series(counts.index, dtype=object), format=fmt, errors='coerce').notna()
+    return len(s), int(counts.to_numpy()[ok.to_numpy()].sum())
+
+
+def normalize_dates(values, fallback, steps=STEPS, formats=FORMATS, cache=None, fmt=None):
+    """Vectorized equivalent of `values.apply(fallback)`.
+
+    `steps` and `formats` must describe what `fallback` does before it reaches
+    dateutil; anything the vectorized classes cannot resolve is passed to
+    `fallback` once per distinct raw value.
+
+    `fmt` is the column's dominant format (see `infer_format`). It is tried
+    before `formats`, so ambiguous values follow the column's convention and
+    one vectorized pass parses nearly all of them.
+
+    Each distinct raw string is parsed once and mapped back to its rows. With
+    a `DateParseCache`, distinct values seen on earlier runs are not parsed at
+    all. Cells that already hold a date (typed Excel cells) are not parsed
+    either; they are what the parser would make of their text.
+    """
+    if fmt is not None:
+        formats = [fmt] + [f for f in formats if f != fmt]
+    values = pd.Series(values)
+    if values.dtype == object:
+        native = values.map(lambda v: isinstance(v, datetime.date), na_action='ignore').fillna(False).astype(bool)
+        if native.any():
+            instrument.count('dates.native', int(native.sum()))
+            out = normalize_dates(values.mask(native), fallback, steps, formats, cache)
+            dates = pd.to_datetime(values[native].tolist()).as_unit('us')
+            if out.dtype == object:
+                out[native] = list(dates)
+            else:
+                out[native] = dates.to_numpy()
+            return out
+    keys = values.astype(object).map(str, na_action='ignore')
+    codes, uniques = pd.factorize(keys)
+    uniques = pd.Series(uniques, dtype=object)
+
+    if cache is None:
+        parsed = parse_column(uniques, fallback, steps, formats)
+    else:
+        version = parser_version(fallback, steps, formats)
+        known = cache.lookup(uniques, version)
+        instrument.count('dates.cached', len(known))
+        missing = uniques[~uniques.isin(list(known))].reset_index(drop=True)
+        fresh = parse_column(missing, fallback, steps, formats)
+        cache.store(dict(zip(missing, fresh)), version)
+        known.update(zip(missing, fresh))
+        parsed = as_datetime(uniques.map(known), uniques.index)
+
+    out = parsed.array.take(codes, allow_fill=True)
+    out = pd.Series(out, index=values.index)
+    if out.dtype == object:
+        out[codes == -1] = pd.NaT
+    return out
@@ -0,0 +1,91 @@
+"""Dates as day numbers: days since 1970-01-01, as a nullable int32.
+
+The downstream scripts used to carry dates around as formatted strings,
+re-parsing them to sort (`pd.to_datetime(...)` on `Date_DMY`), rebuilding
+them row by row from Day/Month/Year and splitting them with `.dt`. They now
+turn a date column into day keys once, group/sort/filter on the integers and
+only format them again when the table is written:
+
+    keys = day_key.parse(df['Date_normalized'])
+    recent = df[keys >= day_key.parse_one('2025-01-01')]
+    df['Date'] = day_key.to_text(keys, '%d-%m-%Y')
+
+Parsing and formatting work on the distinct values only, so their cost
+follows the number of days, not the number of rows. A missing or
+unparsable date is <NA>.
+"""
+
+import numpy as np
+import pandas as pd
+
+DTYPE = 'Int32'
+EPOCH = pd.Timestamp('1970-01-01')
+
+
+def from_datetime(values):
+    """Day keys of a datetime Series (NaT -> <NA>)."""
+    values = pd.Series(values)
+    days = values.to_numpy(dtype='datetime64[D]').astype('int64')
+    keys = pd.array(days.astype('int32'), dtype=DTYPE)
+    keys[values.isna().to_numpy()] = pd.NA
+    return pd.Series(keys, index=values.index)
+
+
+def parse(values, fmt=None):
+    """Day keys of a string Series, as `pd.to_datetime(values, format=fmt,
+    errors='coerce')` parses it."""
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format=fmt, errors='coerce')
+    keys = from_datetime(parsed).array.take(codes, allow_fill=True)
+    return pd.Series(keys, index=values.index)
+
+
+def parse_one(value, fmt=None):
+    """Day key of a single date string or date-like value."""
+    return (pd.to_datetime(value, format=fmt) - EPOCH).days
+
+
+def week_start(keys):
+    """Day key of the Monday of each key's ISO week."""
+    # day 0 (1970-01-01) was a Thursday
+    return keys - (keys + 3) % 7
+
+
+def month_start(keys):
+    """Day key of the first day of each key's month."""
+    months = to_datetime64(keys).astype('datetime64[M]').astype('datetime64[D]')
+    return pd.Series(from_datetime(pd.Series(months)).array, index=keys.index)
+
+
+def to_datetime64(keys):
+    """numpy datetime64[D] array of `keys` (<NA> -> NaT)."""
+    days = pd.array(keys, dtype=DTYPE)
+    return days.to_numpy(dtype='float64', na_value=np.nan).astype('datetime64[D]')
+
+
+def to_text(keys, fmt):
+    """`keys` formatted with `fmt`, as `.dt.strftime(fmt)` would (<NA> -> NaN)."""
+    codes, uniques = pd.factorize(keys)
+    text = pd.DatetimeIndex(to_datetime64(uniques)).strftime(fmt).to_numpy(dtype=object)
+    # code -1 (missing) takes the appended None
+    text = np.append(text, None)
+    return pd.Series(text.take(codes), index=keys.index, dtype='str')
+
+
+def to_parts(keys):
+    """(day, month, year) Series of `keys`, nullable like the keys."""
+    days = to_datetime64(keys)
+    months = days.astype('datetime64[M]')
+    missing = pd.isna(days)
+    parts = ((days - months).astype('int64') + 1,
+             months.astype('int64') % 12 + 1,
+             days.astype('datetime64[Y]').astype('int64') + 1970)
+    return tuple(pd.Series(pd.arrays.IntegerArray(p.astype('int32'), missing), index=keys.index)
+                 for p in parts)
+
+
+def from_parts(day, month, year):
+    """Day keys of the dates with the given day, month and year numbers;
+    <NA> where a part is missing or the date does not exist."""
+    frame = pd.DataFrame({'year': year, 'month': month, 'day': day}).astype('Float64')
+    return from_datetime(pd.to_datetime(frame, errors='coerce'))
@@ -0,0 +1,147 @@
+"""Drop rows that repeat a row of an earlier source.
+
+Downloads holds several copies and versions of the same workbooks
+(`Health.xlsx` in a dozen folders, CSV exports of them), so the scanners
+pick the same rows up many times over. A `RowDeduper` is given the
+included sheets in path order, right after they are loaded and before they
+are merged, and drops every row whose content an earlier sheet already had.
+
+A row's content is its non-empty cells as (column, value) pairs: column
+names lowercased and stripped, values stripped, numbers spelled one way
+(`120` and `120.0` match) and the date as the scanner normalized it, so a
+workbook and its CSV export match. Column order and empty columns do not
+matter; source_file and source_sheet are not content. The n-th repeat of a
+content within one sheet only matches the n-th repeat in another, so a
+sheet that lists the same entry twice keeps both rows and a copy of the
+sheet loses both.
+
+The first copy of a row is the one kept. A table that takes a day's last
+value in row order, like the daily Weight, can therefore pick up a later
+sheet's value where a later copy used to come last.
+
+Each column's distinct values are hashed once and the row hash is the sum
+of its cells' hashes, so hashing is vectorized and independent of column
+order. Only the unique rows' hashes and where they were first seen are
+kept, in a few sorted runs that double in size as they merge, so a sheet's
+keys are looked up with one `searchsorted` per run and no add copies all
+the keys seen so far. `duplicates()` lists every dropped row with the row
+it repeats.
+"""
+
+import numpy as np
+import pandas as pd
+
+import day_key
+from daily_patch import PRIME
+from table_io import format_float
+
+SOURCE_COLUMNS = {'source_file', 'source_sheet'}
+DATE_COLUMN = 'Date_normalized'
+DUPLICATE_COLUMNS = ['source_file', 'source_sheet', 'row', 'kept_file', 'kept_sheet', 'kept_row']
+
+
+def canonical_text(values):
+    """Stripped text of `values` with numbers spelled one way."""
+    text = pd.Series(np.asarray(values, dtype=object)).astype(str).str.strip()
+    numbers = pd.to_numeric(text, errors='coerce')
+    numeric = numbers.notna() & np.isfinite(numbers)
+    if numeric.any():
+        text[numeric] = numbers[numeric].map(lambda v: format_float(float(v), 'short')).astype(str)
+    return text
+
+
+def cell_hashes(name, values):
+    """uint64 hash of each (name, value) cell of a column; 0 for empty cells."""
+    codes, uniques = pd.factorize(values)
+    text = canonical_text(uniques)
+    hashed = pd.util.hash_array((name + '\x1f' + text).to_numpy(dtype=object))
+    hashed[(text == '').to_numpy()] = 0
+    return np.append(hashed, np.uint64(0))[codes]
+
+
+def content_hashes(df, date_col=None):
+    """uint64 hash of each row's content; `date_col` is the raw date column,
+    replaced by DATE_COLUMN where that parsed."""
+    hashes = np.zeros(len(df), dtype='uint64')
+    normalized = DATE_COLUMN in df.columns
+    for i, name in enumerate(df.columns):
+        if name in SOURCE_COLUMNS or name == DATE_COLUMN or (normalized and name == date_col):
+            continue
+        hashes += cell_hashes(str(name).lower().strip(), df.iloc[:, i])
+    if normalized:
+        dates = day_key.to_text(day_key.from_datetime(pd.to_datetime(df[DATE_COLUMN], errors='coerce')), '%Y-%m-%d')
+        if date_col is not None:
+            # unparsed dates count with their raw text
+            dates = dates.where(dates.notna(), df[date_col])
+        hashes += cell_hashes('date', dates)
+    return hashes
+
+
+def row_keys(df, date_col=None):
+    """Content hashes of `df` combined with each row's occurrence number
+    among the rows of `df` with the same content."""
+    hashes = content_hashes(df, date_col)
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy().astype('uint64')
+    return pd.util.hash_array(hashes + occurrence * PRIME)
+
+
+class RowDeduper:
+    def __init__(self):
+        self.sources = []
+        # sorted runs of (key, first source, first row) of the unique rows, the
+        # oldest and largest first; source indexes self.sources
+        self.runs = []
+        self.dropped = []
+
+    def lookup(self, keys):
+        """(source, row) where each of `keys` was first seen; -1 if never."""
+        source = np.full(len(keys), -1, dtype='int64')
+        row = np.full(len(keys), -1, dtype='int64')
+        # sorted queries walk each run in order
+        order = np.argsort(keys)
+        keys = keys[order]
+        for run_keys, run_source, run_row in self.runs:
+            pos = np.searchsorted(run_keys, keys).clip(max=len(run_keys) - 1)
+            found = run_keys[pos] == keys
+            source[order[found]] = run_source[pos[found]]
+            row[order[found]] = run_row[pos[found]]
+        return source, row
+
+    def insert(self, keys, source, rows):
+        """Record `keys`, none of them seen before, as first seen at `rows` of `source`."""
+        order = np.argsort(keys, kind='stable')
+        run = (keys[order], np.full(len(keys), source, dtype='int32'), rows[order])
+        # merge runs while the newer one is as large, as a binary counter carries
+        while self.runs and len(self.runs[-1][0]) <= len(run[0]):
+            last = self.runs.pop()
+            merged = [np.concatenate([a, b]) for a, b in zip(last, run)]
+            order = np.argsort(merged[0], kind='stable')
+            run = tuple(m[order] for m in merged)
+        self.runs.append(run)
+
+    def add(self, df, source_file, source_sheet, date_col=None):
+        """The rows of `df` (one sheet) whose content no earlier sheet had."""
+        keys = row_keys(df, date_col)
+        kept_source, kept_row = self.lookup(keys)
+        repeat = kept_source >= 0
+        source = len(self.sources)
+        self.sources.append((source_file, source_sheet))
+        rows = np.flatnonzero(repeat)
+        if len(rows):
+            kept, which = np.unique(kept_source[repeat], return_inverse=True)
+            sources = pd.DataFrame([self.sources[i] for i in kept], columns=['kept_file', 'kept_sheet']).take(which)
+            self.dropped.append(sources.reset_index(drop=True).assign(
+                source_file=source_file, source_sheet=source_sheet, row=rows,
+                kept_row=kept_row[repeat])[DUPLICATE_COLUMNS])
+        fresh = np.flatnonzero(~repeat)
+        if len(fresh):
+            # the keys of one sheet are distinct (see row_keys)
+            self.insert(keys[fresh], source, fresh)
+        return df[~repeat] if len(rows) else df
+
+    def duplicates(self):
+        """One row per dropped row: its source and row (0-based, in the loaded
+        sheet), and the source and row it repeats."""
+        if not self.dropped:
+            return pd.DataFrame(columns=DUPLICATE_COLUMNS)
+        return pd.concat(self.dropped, ignore_index=True)
@@ -0,0 +1,183 @@
+"""Find candidate data files under a directory tree.
+
+`iter_candidates` walks with `os.scandir` instead of `Path.rglob('*')`, so
+each directory entry is classified from its name and cached `DirEntry`
+information. Extension filtering happens before anything is stat'ed;
+ignored, hidden and system directories (`node_modules`, `.git`, the
+recycle bin, ...) are never descended into. Candidates are yielded as they
+are found, so loading can start before the walk ends.
+"""
+
+import fnmatch
+import os
+import stat
+from pathlib import Path
+
+MB = 1024 * 1024
+
+DEFAULT_ROOT = Path.home() / 'Downloads'
+DEFAULT_EXTENSIONS = ['.csv', '.xls', '.xlsx', '.xlsm', '.xlsb']
+# matched against entry names and against paths relative to the root;
+# `~$*` are Office lock files
+DEFAULT_IGNORE = ['node_modules', '__pycache__', '$RECYCLE.BIN', 'System Volume Information', '~$*']
+
+HIDDEN_ATTRS = getattr(stat, 'FILE_ATTRIBUTE_HIDDEN', 0) | getattr(stat, 'FILE_ATTRIBUTE_SYSTEM', 0)
+
+
+def is_hidden(entry):
+    if entry.name.startswith('.'):
+        return True
+    if HIDDEN_ATTRS:
+        try:
+            return bool(entry.stat(follow_symlinks=False).st_file_attributes & HIDDEN_ATTRS)
+        except (OSError, AttributeError):
+            return False
+    return False
+
+
+def is_ignored(name, rel, ignore):
+    return any(fnmatch.fnmatch(name, pat) or fnmatch.fnmatch(rel, pat) for pat in ignore)
+
+
+def iter_candidates(root=None, extensions=DEFAULT_EXTENSIONS, ignore=DEFAULT_IGNORE,
+                    max_depth=None, max_bytes=None, skip_hidden=True):
+    """Yield Paths of files under `root` with one of `extensions`.
+
+    `max_depth` counts directory levels below `root` (0 = only `root`
+    itself); files larger than `max_bytes` are reported and skipped.
+    """
+    root = Path(root) if root is not None else DEFAULT_ROOT
+    extensions = {e.lower() if e.startswith('.') else '.' + e.lower() for e in extensions}
+    stack = [(str(root), 0)]
+    while stack:
+        top, depth = stack.pop()
+        try:
+            with os.scandir(top) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            if is_ignored(entry.name, rel, ignore):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    if skip_hidden and is_hidden(entry):
+                        continue
+                    subdirs.append((entry.path, depth + 1))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            if skip_hidden and is_hidden(entry):
+                continue
+            if max_bytes is not None:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if size > max_bytes:
+                    print('Skipped (over size budget):', entry.path, 'bytes=', size)
+                    continue
+            yield Path(entry.path)
+        # depth-first, visiting subdirectories in name order
+        stack.extend(reversed(subdirs))
+
+
+def iter_directories(root=None, ignore=DEFAULT_IGNORE, max_depth=None, skip_hidden=True, **_):
+    """Yield `root` and every directory under it that `iter_candidates`
+    would descend into."""
+    root = Path(root) if root is not None else DEFAULT_ROOT
+    stack = [(str(root), 0)]
+    while stack:
+        top, depth = stack.pop()
+        yield Path(top)
+        if max_depth is not None and depth >= max_depth:
+            continue
+        try:
+            with os.scandir(top) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            try:
+                if not entry.is_dir(follow_symlinks=False) or is_ignored(entry.name, rel, ignore):
+                    continue
+            except OSError:
+                continue
+            if skip_hidden and is_hidden(entry):
+                continue
+            subdirs.append((entry.path, depth + 1))
+        stack.extend(reversed(subdirs))
+
+
+def is_candidate(path, root=None, extensions=DEFAULT_EXTENSIONS, ignore=DEFAULT_IGNORE,
+                 max_depth=None, max_bytes=None, skip_hidden=True):
+    """Whether `iter_candidates` with the same options would yield `path`,
+    checked from the path alone (for files reported by a watcher).
+
+    Hidden directories are recognized by their leading dot only.
+    """
+    root = Path(root) if root is not None else DEFAULT_ROOT
+    path = Path(path)
+    try:
+        parts = path.relative_to(root).parts
+    except ValueError:
+        return False
+    if not parts or (max_depth is not None and len(parts) - 1 > max_depth):
+        return False
+    extensions = {e.lower() if e.startswith('.') else '.' + e.lower() for e in extensions}
+    if path.suffix.lower() not in extensions:
+        return False
+    for i, name in enumerate(parts):
+        if is_ignored(name, '/'.join(parts[:i + 1]), ignore):
+            return False
+        if skip_hidden and name.startswith('.'):
+            return False
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    if not stat.S_ISREG(st.st_mode):
+        return False
+    if skip_hidden and HIDDEN_ATTRS and getattr(st, 'st_file_attributes', 0) & HIDDEN_ATTRS:
+        return False
+    if max_bytes is not None and st.st_size > max_bytes:
+        print('Skipped (over size budget):', path, 'bytes=', st.st_size)
+        return False
+    return True
+
+
+def add_discovery_args(parser):
+    parser.add_argument('--root', default=None,
+                        help=f'directory to scan (default: {DEFAULT_ROOT})')
+    parser.add_argument('--ext', action='append', default=None,
+                        help='file extension to consider, repeatable (default: %s)' % ' '.join(DEFAULT_EXTENSIONS))
+    parser.add_argument('--ignore', action='append', default=[],
+                        help='glob of names or root-relative paths to skip, repeatable (added to the defaults)')
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help='do not descend more than this many directory levels')
+    parser.add_argument('--max-file-mb', type=float, default=None,
+                        help='skip files larger than this many MB')
+    parser.add_argument('--include-hidden', action='store_true',
+                        help='also walk hidden and system directories and files')
+
+
+def discovery_options(args):
+    """Keyword arguments for `iter_candidates` from `add_discovery_args` options."""
+    return {
+        'root': args.root,
+        'extensions': args.ext or DEFAULT_EXTENSIONS,
+        'ignore': DEFAULT_IGNORE + args.ignore,
+        'max_depth': args.max_depth,
+        'max_bytes': None if args.max_file_mb is None else int(args.max_file_mb * MB),
+        'skip_hidden': not args.include_hidden,
+    }
@@ -0,0 +1,155 @@
+"""Split the Nutrition and Exercise entries into (quantity, unit, item) tokens.
+
+Reads `data/nutrition_events_dmy.csv` and writes:
+- data/entry_tokens.csv: one row per entry of a Nutrition or Exercise cell
+  (`event` is the row of the events file, `position` the entry's place in
+  its cell), with its quantity, unit and item_id
+- data/entry_vocabulary.csv: item_id, item (its first spelling) and the
+  number of entries of each item
+
+A cell holds one entry, or several joined with ' | ' (as in
+final_daily_nutrition_exercise.csv). An entry is an optional leading
+number with an optional unit after it, glued or not, then the item:
+`2 Electrolyte Drink`, `4L water` (4, l, water), `1.5 kg rice`,
+`2x Black Coffee`, `99% Cocoa`, `100 Bicep Curls`; `7 up Zero` is an item
+with no number. Items are interned case-insensitively with their
+spaces collapsed, so `Pumpkin seeds` and `Pumpkin Seeds` share an id; ids
+are given in order of first appearance and are only meaningful together
+with the vocabulary of the same run.
+
+Cells are split and entries matched once per distinct value, then taken
+back to the rows by their codes, so the regex work follows the number of
+distinct entries. `items(tokens, vocabulary)` returns the items as a
+Categorical on the ids for groupbys and counts.
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from table_io import read_table, write_table
+
+ROOT = Path(__file__).resolve().parents[1]
+IN_FILE = ROOT / 'data' / 'nutrition_events_dmy.csv'
+OUT_TOKENS = ROOT / 'data' / 'entry_tokens.csv'
+OUT_VOCABULARY = ROOT / 'data' / 'entry_vocabulary.csv'
+
+COLUMNS = ['Nutrition', 'Exercise']
+SEPARATOR = ' | '
+# a unit is a whole word after the number, glued or not (`4L water`,
+# `500 ml milk`); `7 up Zero` is a drink, not seven of them
+ENTRY = re.compile(r'^(?:(?P<quantity>\d+(?:\.\d+)?)(?!\s*up\b)(?:\s*(?P<unit>x|%|kg|g|ml|l)(?=\s|$))?(?:\s+|$))?(?P<item>.*)$',
+                   re.IGNORECASE)
+TOKEN_COLUMNS = ['event', 'Date', 'column', 'position', 'quantity', 'unit', 'item_id']
+
+
+def split_cells(values):
+    """(row, position, entry) for the non-empty ' | '-separated entries of
+    the string Series `values`: `entry` indexes the returned distinct
+    entries."""
+    codes, uniques = pd.factorize(values)
+    parts = pd.Series(uniques, dtype='str').str.split(SEPARATOR, regex=False).explode()
+    parts = parts.str.strip()
+    parts = parts[parts.notna() & (parts != '')]
+    entry, distinct = pd.factorize(parts)
+    entries = pd.DataFrame({'code': parts.index.to_numpy(), 'entry': entry})
+    entries['position'] = entries.groupby('code').cumcount()
+    # every entry of its cell for each row, rows in order
+    rows = pd.DataFrame({'row': np.arange(len(codes)), 'code': codes})
+    out = rows.merge(entries, on='code', sort=False).sort_values(['row', 'position'], kind='stable')
+    return out['row'].to_numpy(), out['position'].to_numpy(), out['entry'].to_numpy(), distinct
+
+
+def parse_entries(entries):
+    """(quantity, unit, item) frame of distinct entry strings."""
+    parts = pd.Series(entries, dtype='str').str.extract(ENTRY)
+    item = parts['item'].str.strip()
+    return pd.DataFrame({
+        'quantity': pd.to_numeric(parts['quantity'], errors='coerce'),
+        'unit': parts['unit'].str.lower(),
+        'item': item.where(item != ''),
+    })
+
+
+def item_key(items):
+    """The spelling items are interned by: lowercased, spaces collapsed."""
+    return pd.Series(items, dtype='str').str.lower().str.split().str.join(' ')
+
+
+def intern(items):
+    """(ids, vocabulary) for an array of item strings: int32 ids (-1 for a
+    missing item) and the distinct items in order of first appearance."""
+    items = pd.Series(items, dtype='str')
+    ids, keys = pd.factorize(item_key(items))
+    first = pd.Series(np.arange(len(ids))[ids >= 0]).groupby(ids[ids >= 0]).first().to_numpy()
+    vocabulary = pd.DataFrame({'item_id': np.arange(len(keys), dtype='int32'),
+                               'item': items.to_numpy(dtype=object)[first]})
+    return ids.astype('int32'), vocabulary
+
+
+def tokenize(df, columns=COLUMNS):
+    """Return (tokens, vocabulary) for the entry columns of the events frame `df`."""
+    pieces = []
+    distinct = []
+    offset = 0
+    for name in [c for c in columns if c in df.columns]:
+        rows, position, entry, uniques = split_cells(df[name])
+        pieces.append(pd.DataFrame({'event': rows, 'column': name, 'position': position, 'entry': entry + offset}))
+        distinct.append(pd.Series(uniques, dtype='str'))
+        offset += len(uniques)
+    if not pieces:
+        return pd.DataFrame(columns=TOKEN_COLUMNS), pd.DataFrame(columns=['item_id', 'item', 'entries'])
+    tokens = pd.concat(pieces, ignore_index=True)
+    # match each distinct entry once
+    codes, uniques = pd.factorize(pd.concat(distinct, ignore_index=True))
+    parsed = parse_entries(uniques)
+    ids, vocabulary = intern(parsed['item'])
+    entry = codes[tokens.pop('entry').to_numpy()]
+    rows = tokens['event'].to_numpy()
+    tokens['Date'] = df['Date'].array.take(rows) if 'Date' in df.columns else None
+    tokens['quantity'] = parsed['quantity'].to_numpy()[entry]
+    tokens['unit'] = parsed['unit'].array.take(entry)
+    item_id = ids[entry]
+    tokens['item_id'] = pd.array(item_id, dtype='Int32')
+    tokens.loc[item_id < 0, 'item_id'] = pd.NA
+    vocabulary['entries'] = np.bincount(item_id[item_id >= 0], minlength=len(vocabulary))
+    return tokens[TOKEN_COLUMNS], vocabulary
+
+
+def items(tokens, vocabulary):
+    """The tokens' items as a Categorical whose codes are their item ids."""
+    codes = tokens['item_id'].astype('Int32').fillna(-1).to_numpy(dtype='int32')
+    return pd.Categorical.from_codes(codes, categories=pd.Index(vocabulary['item'], dtype=object))
+
+
+def build(df):
+    """Return (tokens, vocabulary) for the events frame, or None without
+    Nutrition and Exercise columns."""
+    if not any(name in df.columns for name in COLUMNS):
+        print('No Nutrition or Exercise column found')
+        return None
+    return tokenize(df)
+
+
+def save(tokens, vocabulary, formats=('csv',)):
+    for path in write_table(tokens, OUT_TOKENS, formats):
+        print('Saved entry tokens to', path, 'shape=', tokens.shape)
+    for path in write_table(vocabulary, OUT_VOCABULARY, formats):
+        print('Saved entry vocabulary to', path, 'items=', len(vocabulary))
+
+
+def main():
+    if not IN_FILE.exists():
+        print('Input not found:', IN_FILE)
+        return
+    print('Loading', IN_FILE)
+    df = read_table(IN_FILE)
+    out = build(df)
+    if out is not None:
+        save(*out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Open a workbook once and read headers and sheets from that one handle.
+
+The scanners used to open every workbook three or four times: `pd.ExcelFile`
+for the sheet names, `pd.read_excel(nrows=0)` per sheet for the header and
+`pd.read_excel` again for each chosen sheet. `Workbook` keeps a single
+`pd.ExcelFile` open instead. For xlsx/xlsm files pandas opens it with
+openpyxl in read-only (streaming) mode, so `header()` only pulls the first
+non-blank row of a sheet and `read()` streams just the chosen sheets into
+frames, with that row as the header.
+
+Sheets are read as strings, like `read_csv(dtype=str)`. `read(sheet,
+native=...)` keeps the cells of some columns as the engine returns them
+instead: real Excel dates stay datetimes and numbers stay numbers, so the
+date scanner does not have to print them and parse them back.
+
+Usage:
+    with Workbook(path) as wb:
+        for s in wb.sheet_names:
+            if header_has_expected(wb.header(s)):
+                df = wb.read(s)
+"""
+
+import pandas as pd
+
+
+class Workbook:
+    def __init__(self, path):
+        self.path = path
+        self.xls = pd.ExcelFile(path)
+        self.sheet_names = self.xls.sheet_names
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def first_row(self, sheet):
+        """(number of blank rows above it, values) of the first non-blank row
+        of an openpyxl `sheet`; values are [] for an empty sheet."""
+        for i, row in enumerate(self.xls.book[sheet].iter_rows(values_only=True)):
+            if any(cell is not None and cell != '' for cell in row):
+                return i, list(row)
+        return 0, []
+
+    def header(self, sheet):
+        """Values of the header row of `sheet`: its first non-blank row."""
+        if self.xls.engine == 'openpyxl':
+            return self.first_row(sheet)[1]
+        return list(self.xls.parse(sheet, nrows=0).columns)
+
+    def read(self, sheet, native=None, **kwargs):
+        """Read `sheet` as strings; None if it cannot be read.
+
+        The columns `native(columns)` picks keep their cells as they are
+        (datetime, int, float or str) in an object column.
+        """
+        kwargs.setdefault('dtype', str if native is None else object)
+        if self.xls.engine == 'openpyxl' and 'skiprows' not in kwargs:
+            # the header is the first non-blank row, as header() reads it
+            kwargs['skiprows'] = self.first_row(sheet)[0] or None
+        try:
+            df = self.xls.parse(sheet, **kwargs)
+        except Exception:
+            try:
+                df = pd.read_excel(self.path, sheet_name=sheet, engine='openpyxl', **kwargs)
+            except Exception:
+                return None
+        if native is not None:
+            keep = set(native(df.columns))
+            for i, c in enumerate(df.columns):
+                if c not in keep:
+                    s = df.iloc[:, i]
+                    df.isetitem(i, s.astype(str).where(s.notna()))
+        return df
+
+    def close(self):
+        self.xls.close()
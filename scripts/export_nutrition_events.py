@@ -3,27 +3,31 @@
 Reads `data/merged_health_from_downloads_dates_fixed.csv` (uses `Date_normalized`)
 and writes `data/nutrition_events_dmy.csv` containing one row per source row
 where `Nutrition` or `Exercise` is present. Date is formatted as DD-MM-YYYY.
+With `--from` / `--to`, only the months of that range are read from the
+month partitions of the merged file (see month_partitions.py), and the rows
+go to a file named after the range, e.g.
+`nutrition_events_dmy_2025-06_to_2025-07.csv`.
 """
 
+import argparse
 from pathlib import Path
 import pandas as pd
 
+import day_key
+from month_partitions import add_range_args, dataset_dir, has_dataset, range_path, read_range
+from table_io import read_table, write_table
+
 ROOT = Path(__file__).resolve().parents[1]
 IN_FILE = ROOT / 'data' / 'merged_health_from_downloads_dates_fixed.csv'
 OUT_FILE = ROOT / 'data' / 'nutrition_events_dmy.csv'
 
-def main():
-    if not IN_FILE.exists():
-        print('Input not found:', IN_FILE)
-        return
-    print('Loading', IN_FILE)
-    df = pd.read_csv(IN_FILE, dtype=str, low_memory=False)
-
+def build(df):
+    """Return the event rows of the merged frame, or None without a date column."""
     # pick normalized date
     date_col = 'Date_normalized' if 'Date_normalized' in df.columns else ('Date' if 'Date' in df.columns else None)
     if date_col is None:
         print('No date column found')
-        return
+        return None
 
     # find nutrition/exercise columns (case-insensitive)
     cols_lower = {c.lower(): c for c in df.columns}
@@ -48,8 +52,7 @@ def main():
     events = df[mask].copy()
 
     # parse date and format DMY
-    events['_dt'] = pd.to_datetime(events[date_col], errors='coerce')
-    events['Date'] = events['_dt'].dt.strftime('%d-%m-%Y')
+    events['Date'] = day_key.to_text(day_key.parse(events[date_col]), '%d-%m-%Y')
 
     # build output columns
     out = pd.DataFrame()
@@ -63,8 +66,28 @@ def main():
         out['source_sheet'] = events['source_sheet']
 
     # keep order as in file; do not aggregate or dedupe
-    out.to_csv(OUT_FILE, index=False)
-    print('Saved events to', OUT_FILE, 'shape=', out.shape)
+    return out
+
+def save(out, formats=('csv',), out_file=None):
+    for path in write_table(out, out_file or OUT_FILE, formats):
+        print('Saved events to', path, 'shape=', out.shape)
+
+def main(start=None, end=None):
+    # with a range, only the month partitions of the range are read
+    ranged = start is not None or end is not None
+    source = dataset_dir(IN_FILE) if ranged else IN_FILE
+    if not (has_dataset(IN_FILE) if ranged else IN_FILE.exists()):
+        print('Input not found:', source)
+        return
+    print('Loading', source)
+    df = read_range(IN_FILE, start, end) if ranged else read_table(IN_FILE)
+    out = build(df)
+    if out is not None:
+        # a range never replaces the full-history output
+        save(out, out_file=range_path(OUT_FILE, start, end))
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_range_args(parser)
+    args = parser.parse_args()
+    main(args.start, args.end)
@@ -2,42 +2,48 @@
 - `nutrition_full_rows.csv`: all source rows with normalized dates preserved (no collapsing)
 - `nutrition_aggregated.csv`: one row per date with all Nutrition and Exercise entries joined
 
-Reads `data/merged_health_from_downloads_dates_fixed.csv` (contains `Date_normalized`).
+Reads `data/merged_health_from_downloads_dates_fixed.csv` (contains `Date_normalized`),
+or with `--from` / `--to` only the months of that range from its month
+partitions (see month_partitions.py); the outputs of a range have it in
+their name, e.g. `nutrition_aggregated_2025-06_to_2025-07.csv`.
 """
 
+import argparse
 from pathlib import Path
 import pandas as pd
 
+import daily_agg
+import day_key
+from daily_patch import DailyPatch, code_version
+from month_partitions import add_range_args, dataset_dir, has_dataset, iter_range, range_path, read_range
+from table_io import TableWriter, iter_table, read_table, write_table
+
 ROOT = Path(__file__).resolve().parents[1]
 IN_FILE = ROOT / 'data' / 'merged_health_from_downloads_dates_fixed.csv'
 OUT_FULL = ROOT / 'data' / 'nutrition_full_rows.csv'
 OUT_AGG = ROOT / 'data' / 'nutrition_aggregated.csv'
+PATCH = ROOT / 'data' / 'cache' / 'patch_nutrition_aggregated.pkl'
 
-def safe_str(x):
-    if pd.isna(x):
-        return ''
-    s = str(x).strip()
-    return s
-
-def main():
-    if not IN_FILE.exists():
-        print('Input not found:', IN_FILE)
-        return
-    print('Loading', IN_FILE)
-    df = pd.read_csv(IN_FILE, dtype=str, low_memory=False)
+# Weight, Nutrition and Exercise values treated as empty
+EMPTY = ['', 'nan', 'None']
 
+def find_columns(columns):
+    """Return (date_col, weight_col, nutrition_col, exercise_col), or None
+    without a date column."""
     # prefer Date_normalized if present
-    date_col = 'Date_normalized' if 'Date_normalized' in df.columns else ('Date' if 'Date' in df.columns else None)
+    date_col = 'Date_normalized' if 'Date_normalized' in columns else ('Date' if 'Date' in columns else None)
     if date_col is None:
         print('No date column found')
-        return
+        return None
 
     # Ensure we have Nutrition and Exercise columns or find approximations
-    cols = {c.lower(): c for c in df.columns}
+    cols = {c.lower(): c for c in columns}
     nutrition_col = cols.get('nutrition') or None
     exercise_col = cols.get('exercise') or None
     weight_col = cols.get('weight') or None
+    return date_col, weight_col, nutrition_col, exercise_col
 
+def full_rows(df, date_col, weight_col, nutrition_col, exercise_col):
     # Full rows: keep Date (normalized), Weight, Nutrition, Exercise, source_file, source_sheet
     full = pd.DataFrame()
     full['Date'] = df[date_col]
@@ -50,35 +56,113 @@ def main():
         full['source_sheet'] = df['source_sheet']
 
     # drop rows without a parsed date
-    full = full[full['Date'].notna() & (full['Date'].astype(str) != '')]
-    # save full rows
-    full.to_csv(OUT_FULL, index=False)
-    print('Wrote full rows to', OUT_FULL, 'shape=', full.shape)
-
-    # Aggregated: group by Date, join non-empty Nutrition and Exercise entries preserving order
-    def join_nonempty(series):
-        vals = [safe_str(x) for x in series if str(x).strip() not in ['', 'nan', 'None']]
-        # keep original order and deduplicate while preserving order
-        seen = set()
-        out = []
-        for v in vals:
-            if v and v not in seen:
-                out.append(v)
-                seen.add(v)
-        return ' | '.join(out)
-
-    agg = full.groupby('Date').agg({
-        'Weight': lambda s: next((x for x in s[::-1] if str(x).strip() not in ['', 'nan', 'None']), ''),
-        'Nutrition': join_nonempty,
-        'Exercise': join_nonempty,
-    }).reset_index()
-
-    # sort by date descending (try parse)
-    agg['_dt'] = pd.to_datetime(agg['Date'], errors='coerce')
-    agg = agg.sort_values('_dt', ascending=False).drop(columns=['_dt'])
-
-    agg.to_csv(OUT_AGG, index=False)
-    print('Wrote aggregated file to', OUT_AGG, 'shape=', agg.shape)
+    return full[full['Date'].notna() & (full['Date'].astype(str) != '')]
+
+def aggregate(full, keys):
+    # Aggregated: group by day key, join non-empty Nutrition and Exercise
+    # entries preserving order, keep the last non-empty Weight
+    return daily_agg.aggregate(keys, full, joined=['Nutrition', 'Exercise'], last=['Weight'],
+                               empty=EMPTY, key_name='Date')
+
+def date_format(date_col):
+    """Format to parse `date_col` with: Date_normalized is always YYYY-MM-DD,
+    a raw Date column is parsed value by value."""
+    return '%Y-%m-%d' if date_col == 'Date_normalized' else 'mixed'
+
+def sort_newest_first(agg, unparsed=None):
+    # sort by day key descending, then format it as YYYY-MM-DD; days whose
+    # Date did not parse come last, under their own text
+    agg = agg.sort_values('Date', ascending=False, kind='stable')
+    agg['Date'] = day_key.to_text(agg['Date'], '%Y-%m-%d')
+    if unparsed is not None and len(unparsed):
+        agg = pd.concat([agg, unparsed])
+    return agg
+
+def daily_patch(enabled=True):
+    """The DailyPatch that lets `build` re-aggregate only the changed days."""
+    return DailyPatch(PATCH, code_version([daily_agg.__file__, day_key.__file__, __file__]), enabled)
+
+def build(df, patch=None):
+    """Return (full, agg) from the merged frame, or None without a date column.
+
+    With a `patch` (see daily_patch.py), only the days whose rows changed
+    since its last build are aggregated again.
+    """
+    cols = find_columns(df.columns)
+    if cols is None:
+        return None
+    full = full_rows(df, *cols)
+    keys = day_key.parse(full['Date'], date_format(cols[0]))
+    # rows whose Date does not parse are grouped by its text
+    rows = keys.isna().to_numpy()
+    unparsed = aggregate(full[rows], full['Date'][rows])
+    if patch is None:
+        return full, sort_newest_first(aggregate(full, keys), unparsed)
+    agg = patch.build(keys, full[['Weight', 'Nutrition', 'Exercise']],
+                      lambda keys, rows: aggregate(rows, keys), 'Date')
+    return full, sort_newest_first(agg, unparsed)
+
+def build_streaming(chunks, formats=('csv',), out_full=None):
+    """Write the full rows of `chunks` of the merged file to `out_full`
+    (OUT_FULL) as they come and return the aggregated frame, or None without a date column.
+
+    Only one chunk and the per-date accumulators are held in memory.
+    """
+    acc = daily_agg.DailyAccumulator(joined=['Nutrition', 'Exercise'], last=['Weight'], empty=EMPTY)
+    # rows whose Date does not parse, by its text
+    acc_unparsed = daily_agg.DailyAccumulator(joined=['Nutrition', 'Exercise'], last=['Weight'], empty=EMPTY)
+    cols = None
+    with TableWriter(out_full or OUT_FULL, formats) as writer:
+        for chunk in chunks:
+            if cols is None:
+                cols = find_columns(chunk.columns)
+                if cols is None:
+                    return None
+            full = full_rows(chunk, *cols)
+            writer.write(full)
+            keys = day_key.parse(full['Date'], date_format(cols[0]))
+            acc.add(keys, full)
+            rows = keys.isna().to_numpy()
+            acc_unparsed.add(full['Date'][rows], full[rows])
+    if cols is None:
+        print('No rows in input')
+        return None
+    for path in writer.paths:
+        print('Wrote full rows to', path, 'rows=', writer.rows)
+    return sort_newest_first(acc.result('Date'), acc_unparsed.result('Date'))
+
+def save(full, agg, formats=('csv',), out_full=None, out_agg=None):
+    if full is not None:
+        for path in write_table(full, out_full or OUT_FULL, formats):
+            print('Wrote full rows to', path, 'shape=', full.shape)
+    for path in write_table(agg, out_agg or OUT_AGG, formats):
+        print('Wrote aggregated file to', path, 'shape=', agg.shape)
+
+def main(chunksize=None, start=None, end=None):
+    # with a range, only the month partitions of the range are read
+    ranged = start is not None or end is not None
+    source = dataset_dir(IN_FILE) if ranged else IN_FILE
+    if not (has_dataset(IN_FILE) if ranged else IN_FILE.exists()):
+        print('Input not found:', source)
+        return
+    print('Loading', source)
+    # a range never replaces the full-history outputs
+    out_full, out_agg = range_path(OUT_FULL, start, end), range_path(OUT_AGG, start, end)
+    if chunksize:
+        chunks = iter_range(IN_FILE, chunksize, start, end) if ranged else iter_table(IN_FILE, chunksize)
+        agg = build_streaming(chunks, out_full=out_full)
+        if agg is not None:
+            save(None, agg, out_agg=out_agg)
+        return
+    df = read_range(IN_FILE, start, end) if ranged else read_table(IN_FILE)
+    out = build(df)
+    if out is not None:
+        save(*out, out_full=out_full, out_agg=out_agg)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the input in chunks of this many rows (memory bounded by the number of dates)')
+    add_range_args(parser)
+    args = parser.parse_args()
+    main(args.chunksize, args.start, args.end)
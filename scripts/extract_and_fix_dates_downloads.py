@@ -5,19 +5,39 @@ concatenation. It handles Excel serials, numeric float serials, YYYYMMDD,
 and common textual formats using dateutil.
 
 Outputs:
-- data/merged_health_from_downloads_dates_fixed.csv
+- data/merged_health_from_downloads_dates_fixed.csv, and the same rows
+  partitioned by month under data/merged_health_from_downloads_dates_fixed/
+  (see month_partitions.py)
 - data/merged_health_clean_subset_dates_fixed_source.csv (subset)
 - data/bad_dates_by_source.csv
+- data/date_formats_by_source.csv (date format inferred per sheet, and its
+  hit rate)
+- data/duplicate_rows_by_source.csv (rows dropped as repeats of an earlier
+  source's rows, and the row each one repeats; see dedup.py)
 """
 
+import argparse
 import json
+import time
 from pathlib import Path
 import pandas as pd
 import re
-import traceback
 from dateutil.parser import parse
 
-DOWNLOADS = Path.home() / 'Downloads'
+import instrument
+
+from csv_reader import read_header, try_read_csv
+from date_cache import DateParseCache
+from dedup import RowDeduper
+from date_engine import FORMATS, format_hits, infer_format, normalize_dates, parser_version
+from discover import DEFAULT_ROOT, add_discovery_args, discovery_options, iter_candidates
+from excel_reader import Workbook
+from month_partitions import write_dataset
+from parallel_scan import add_scan_args, scan_files, scan_options
+from scan_manifest import ScanManifest
+from table_io import encode_sources, write_table
+
+DOWNLOADS = DEFAULT_ROOT
 REPO_ROOT = Path(__file__).resolve().parents[1]
 OUT_DIR = REPO_ROOT / 'data'
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -25,7 +45,13 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 OUT_MERGED = OUT_DIR / 'merged_health_from_downloads_dates_fixed.csv'
 OUT_CLEAN = OUT_DIR / 'merged_health_clean_subset_dates_fixed_source.csv'
 OUT_BAD = OUT_DIR / 'bad_dates_by_source.csv'
+OUT_FORMATS = OUT_DIR / 'date_formats_by_source.csv'
+OUT_DUPLICATES = OUT_DIR / 'duplicate_rows_by_source.csv'
+OUT_REPORT = OUT_DIR / 'run_report.json'
 FOUND_JSON = OUT_DIR / 'found_health_files_from_downloads.json'
+DATE_CACHE = OUT_DIR / 'cache' / 'date_parse.sqlite'
+MANIFEST = OUT_DIR / 'cache' / 'scan_manifest_dates.json'
+EXTRACT_DIR = OUT_DIR / 'cache' / 'extracts_dates'
 
 EXPECTED = ['date','weight','nutrition','exercise','sleep','hygiene','food']
 
@@ -38,24 +64,6 @@ def header_has_expected(cols):
             return True
     return False
 
-def try_read_excel(path, sheet_name=None):
-    try:
-        return pd.read_excel(path, sheet_name=sheet_name, dtype=str)
-    except Exception:
-        try:
-            return pd.read_excel(path, sheet_name=sheet_name, engine='openpyxl', dtype=str)
-        except Exception:
-            return None
-
-def try_read_csv(path):
-    try:
-        return pd.read_csv(path, dtype=str, encoding='utf-8', low_memory=False)
-    except Exception:
-        try:
-            return pd.read_csv(path, dtype=str, encoding='latin-1', low_memory=False)
-        except Exception:
-            return None
-
 def normalize_date_value(v):
     if pd.isna(v):
         return pd.NaT
@@ -104,119 +112,226 @@ def normalize_date_value(v):
         except Exception:
             return pd.NaT
 
-def find_and_process():
-    sources = []
-    rows = []
-    bad_rows = []
-    if not DOWNLOADS.exists():
-        print('Downloads path not found:', DOWNLOADS)
-        return sources, rows, bad_rows
-
-    for p in DOWNLOADS.rglob('*'):
-        if not p.is_file():
+def date_column(columns):
+    for c in columns:
+        if c == 'Date_normalized':
             continue
-        lowname = p.name.lower()
-        try:
-            if p.suffix.lower() == '.csv':
-                include = False
-                reason = None
-                if 'health' in lowname:
+        if 'date' == str(c).lower().strip() or 'date' in str(c).lower():
+            return c
+    return None
+
+def find_date_col(df):
+    return date_column(df.columns)
+
+def native_columns(columns):
+    """Columns whose Excel cells are read typed: the date column and weight."""
+    date_col = date_column(columns)
+    return [c for c in columns if c == date_col or str(c).lower().strip() == 'weight']
+
+def load_file(p):
+    """Classify one file and load the sheets to include.
+
+    Returns a list of (sheet, reason, df); empty when the file is skipped.
+    Runs in worker processes in parallel mode, so it only reads the file.
+    """
+    lowname = p.name.lower()
+    loaded = []
+    if p.suffix.lower() == '.csv':
+        include = False
+        reason = None
+        if 'health' in lowname:
+            include = True
+            reason = 'filename contains health'
+        else:
+            # quick header check
+            try:
+                if header_has_expected(read_header(p) or []):
                     include = True
-                    reason = 'filename contains health'
-                else:
-                    # quick header check
+                    reason = 'header matched expected columns'
+            except Exception:
+                include = False
+        if include:
+            df = try_read_csv(p)
+            if df is not None:
+                loaded.append(('', reason, df))
+
+    elif p.suffix.lower() in ['.xls', '.xlsx', '.xlsm', '.xlsb']:
+        try:
+            wb = Workbook(p)
+        except Exception:
+            return loaded
+        with wb:
+            # prefer sheet names with 'health'
+            target_sheets = []
+            for s in wb.sheet_names:
+                if 'health' in s.lower():
+                    target_sheets.append(s)
+            # else check headers
+            if not target_sheets:
+                for s in wb.sheet_names:
                     try:
-                        head = pd.read_csv(p, nrows=0, dtype=str)
-                        if header_has_expected(head.columns):
-                            include = True
-                            reason = 'header matched expected columns'
-                    except Exception:
-                        include = False
-                if include:
-                    df = try_read_csv(p)
-                    if df is None:
-                        continue
-                    df['source_file'] = str(p)
-                    df['source_sheet'] = ''
-                    # normalize date column if present
-                    date_col = None
-                    for c in df.columns:
-                        if 'date' == str(c).lower().strip() or 'date' in str(c).lower():
-                            date_col = c
+                        if header_has_expected(wb.header(s)):
+                            target_sheets.append(s)
                             break
-                    if date_col is not None:
-                        df['Date_normalized'] = df[date_col].apply(normalize_date_value)
-                    else:
-                        df['Date_normalized'] = pd.NaT
-                    # record rows
-                    for _, r in df.iterrows():
-                        rows.append(r.to_dict())
-                        if pd.isna(r['Date_normalized']):
-                            bad_rows.append({'source_file': str(p), 'source_sheet': '', 'date_raw': r.get(date_col, '')})
-                    sources.append({'path': str(p), 'reason': reason, 'sheet': ''})
-
-            elif p.suffix.lower() in ['.xls', '.xlsx', '.xlsm', '.xlsb']:
-                try:
-                    xls = pd.ExcelFile(p)
-                except Exception:
-                    continue
-                # prefer sheet names with 'health'
-                target_sheets = []
-                for s in xls.sheet_names:
-                    if 'health' in s.lower():
-                        target_sheets.append(s)
-                # else check headers
-                if not target_sheets:
-                    for s in xls.sheet_names:
-                        try:
-                            head = pd.read_excel(p, sheet_name=s, nrows=0)
-                            if header_has_expected(head.columns):
-                                target_sheets.append(s)
-                                break
-                        except Exception:
-                            continue
-                # if still empty, skip
-                for s in target_sheets:
-                    df = try_read_excel(p, sheet_name=s)
-                    if df is None:
+                    except Exception:
                         continue
-                    df['source_file'] = str(p)
-                    df['source_sheet'] = s
-                    date_col = None
-                    for c in df.columns:
-                        if 'date' == str(c).lower().strip() or 'date' in str(c).lower():
-                            date_col = c
-                            break
-                    if date_col is not None:
-                        df['Date_normalized'] = df[date_col].apply(normalize_date_value)
-                    else:
-                        df['Date_normalized'] = pd.NaT
-                    for _, r in df.iterrows():
-                        rows.append(r.to_dict())
-                        if pd.isna(r['Date_normalized']):
-                            bad_rows.append({'source_file': str(p), 'source_sheet': s, 'date_raw': r.get(date_col, '')})
-                    sources.append({'path': str(p), 'reason': 'sheet matched', 'sheet': s})
-        except Exception:
-            print('Error processing', p)
-            traceback.print_exc()
+            # if still empty, skip
+            for s in target_sheets:
+                df = wb.read(s, native=native_columns)
+                if df is not None:
+                    loaded.append((s, 'sheet matched', df))
+    return loaded
+
+def timed_load_file(p):
+    """(load_file(p), seconds it took); runs in the workers too."""
+    start = time.perf_counter()
+    loaded = load_file(p)
+    return loaded, time.perf_counter() - start
+
+def file_size(p):
+    try:
+        return p.stat().st_size
+    except OSError:
+        return None
+
+def normalize_loaded(p, loaded, cache=None):
+    """Add source_file, source_sheet and Date_normalized to the frames
+    `load_file(p)` returned; return `loaded`."""
+    for s, reason, df in loaded:
+        df['source_file'] = str(p)
+        df['source_sheet'] = s
+        # normalize date column if present
+        date_col = find_date_col(df)
+        if date_col is not None:
+            with instrument.timer('normalize_dates.seconds'):
+                fmt = infer_format(df[date_col])
+                df['Date_normalized'] = normalize_dates(df[date_col], normalize_date_value, cache=cache, fmt=fmt)
+        else:
+            df['Date_normalized'] = pd.NaT
+    return loaded
+
+def iter_loaded(cache=None, workers=1, timeout=None, manifest=None, root=None, **discover):
+    """Yield (path, [(sheet, reason, df)]) for every candidate file, in path order.
+
+    Each df carries source_file, source_sheet and Date_normalized; files
+    that were skipped yield an empty list.
+    """
+    root = Path(root) if root else DOWNLOADS
+    if not root.exists():
+        print('Downloads path not found:', root)
+        return
+
+    # unchanged files are served from the manifest's cached extracts
+    paths = []
+    cached = {}
 
-    return sources, rows, bad_rows
+    def todo():
+        for p in instrument.timed(iter_candidates(root, **discover), 'walk.seconds'):
+            instrument.count('walk.candidates')
+            paths.append(p)
+            entry = manifest.lookup(p) if manifest is not None else None
+            if entry is None:
+                yield p
+            else:
+                cached[p] = entry
 
-def save_outputs(sources, rows, bad_rows):
+    fresh = {}
+    for p, (loaded, seconds) in scan_files(timed_load_file, todo(), workers, timeout):
+        size = file_size(p)
+        instrument.count('load.seconds', round(seconds, 6))
+        instrument.count('bytes_read', size or 0)
+        instrument.source(p, bytes=size, seconds=round(seconds, 4), cached=False,
+                          sheets=len(loaded), rows=sum(len(df) for _, _, df in loaded))
+        fresh[p] = normalize_loaded(p, loaded, cache)
+        if manifest is not None:
+            manifest.record(p, loaded)
+
+    for p in sorted(set(cached) | set(fresh), key=str):
+        if p in cached:
+            loaded = manifest.load(p, cached[p])
+            instrument.source(p, bytes=file_size(p), cached=True,
+                              sheets=len(loaded), rows=sum(len(df) for _, _, df in loaded))
+            yield p, loaded
+        else:
+            yield p, fresh[p]
+
+    if manifest is not None:
+        manifest.prune(paths)
+
+def collect(entries):
+    """Return (sources, frames, bad_frames, duplicates, formats_by_source)
+    from `iter_loaded` entries: one frame per included sheet without the
+    rows an earlier sheet already had (see dedup.py), one frame of
+    unparseable dates per sheet that has any, the dropped rows with the
+    rows they repeat, and the date format row of every non-empty sheet,
+    taken before its repeats are dropped."""
+    sources = []
+    frames = []
+    bad_frames = []
+    formats_by_source = []
+    deduper = RowDeduper()
+    for p, loaded in entries:
+        for s, reason, df in loaded:
+            rows = len(df)
+            if rows:
+                formats_by_source.append(date_format_stats(df))
+            df = deduper.add(df, str(p), s, find_date_col(df))
+            sources.append({'path': str(p), 'reason': reason, 'sheet': s, 'rows': rows,
+                            'duplicate_rows': rows - len(df)})
+            # an empty sheet contributes no rows, and so no columns
+            if df.empty:
+                continue
+            frames.append(df)
+            bad = df['Date_normalized'].isna()
+            if bad.any():
+                date_col = find_date_col(df)
+                date_raw = df.loc[bad, date_col] if date_col is not None else pd.Series('', index=df.index[bad])
+                bad_frames.append(pd.DataFrame({'source_file': str(p), 'source_sheet': s, 'date_raw': date_raw}))
+    return sources, encode_sources(frames, sources), bad_frames, deduper.duplicates(), formats_by_source
+
+def date_format_stats(df):
+    """Return the date format row of one included sheet for OUT_FORMATS."""
+    date_col = find_date_col(df)
+    fmt = infer_format(df[date_col]) if date_col is not None else None
+    values, hits = format_hits(df[date_col], fmt) if date_col is not None else (0, 0)
+    parsed = int(df['Date_normalized'].notna().sum())
+    return {'source_file': df['source_file'].iat[0], 'source_sheet': df['source_sheet'].iat[0],
+            'date_column': date_col, 'format': fmt, 'values': values, 'format_hits': hits,
+            'hit_rate': round(hits / values, 4) if fmt else None,
+            'other_parsed': parsed - hits, 'unparsed': values - parsed}
+
+def find_and_process(cache=None, workers=1, timeout=None, manifest=None, root=None, **discover):
+    return collect(iter_loaded(cache, workers, timeout, manifest, root, **discover))
+
+def save_outputs(sources, frames, bad_frames, duplicates=None, formats_by_source=None, formats=('csv',)):
+    """Write the outputs; return the (merged, cleaned subset) frames written.
+
+    Without `formats_by_source` (see collect) the date format rows are taken
+    from `frames`.
+    """
     # write sources
     with open(FOUND_JSON, 'w', encoding='utf-8') as f:
         json.dump(sources, f, indent=2)
 
-    if not rows:
+    if duplicates is not None:
+        duplicates.to_csv(OUT_DUPLICATES, index=False)
+        instrument.output(OUT_DUPLICATES, len(duplicates))
+        print('Wrote duplicate rows to', OUT_DUPLICATES, 'count=', len(duplicates))
+
+    if not frames:
         print('No rows collected')
-        return
-    df_all = pd.DataFrame(rows)
+        return None, None
+    # union of columns in first-seen order
+    df_all = pd.concat(frames, axis=0, ignore_index=True, sort=False)
     # coerce Date_normalized to datetime then iso
     if 'Date_normalized' in df_all.columns:
         df_all['Date_normalized'] = pd.to_datetime(df_all['Date_normalized'], errors='coerce')
         df_all['Date_normalized'] = df_all['Date_normalized'].dt.strftime('%Y-%m-%d')
-    df_all.to_csv(OUT_MERGED, index=False)
-    print('Wrote merged (with source-normalized dates):', OUT_MERGED, 'shape=', df_all.shape)
+    for path in write_table(df_all, OUT_MERGED, formats):
+        print('Wrote merged (with source-normalized dates):', path, 'shape=', df_all.shape)
+    if 'Date_normalized' in df_all.columns:
+        # one file per month as well, for readers of a date range
+        write_dataset(df_all, OUT_MERGED, formats)
 
     # cleaned subset
     col_map = {str(c).lower().strip(): c for c in df_all.columns}
@@ -250,17 +365,48 @@ def save_outputs(sources, rows, bad_rows):
         if extra in df_all.columns:
             clean[extra] = df_all[extra]
 
-    clean.to_csv(OUT_CLEAN, index=False)
-    print('Wrote cleaned subset:', OUT_CLEAN, 'shape=', clean.shape)
+    for path in write_table(clean, OUT_CLEAN, formats):
+        print('Wrote cleaned subset:', path, 'shape=', clean.shape)
+
+    # chosen date format per sheet; a falling hit rate means a source changed
+    if formats_by_source is None:
+        formats_by_source = [date_format_stats(df) for df in frames]
+    formats_by_source = pd.DataFrame(formats_by_source)
+    formats_by_source.to_csv(OUT_FORMATS, index=False)
+    instrument.output(OUT_FORMATS, len(formats_by_source))
+    print('Wrote date formats by source to', OUT_FORMATS, 'count=', len(formats_by_source))
 
     # bad rows
-    if bad_rows:
-        pd.DataFrame(bad_rows).to_csv(OUT_BAD, index=False)
-        print('Wrote bad date rows to', OUT_BAD, 'count=', len(bad_rows))
+    if bad_frames:
+        bad = pd.concat(bad_frames, axis=0, ignore_index=True)
+        bad.to_csv(OUT_BAD, index=False)
+        instrument.output(OUT_BAD, len(bad))
+        print('Wrote bad date rows to', OUT_BAD, 'count=', len(bad))
+    return df_all, clean
 
 if __name__ == '__main__':
-    print('Scanning and normalizing dates from', DOWNLOADS)
-    sources, rows, bad_rows = find_and_process()
-    print('Found', len(sources), 'sources; rows collected=', len(rows))
-    save_outputs(sources, rows, bad_rows)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_discovery_args(parser)
+    add_scan_args(parser)
+    parser.add_argument('--full', action='store_true', help='ignore the scan manifest and re-read every file')
+    parser.add_argument('--profile', type=Path, default=None, metavar='DIR',
+                        help='write a cProfile .prof file per stage into DIR')
+    args = parser.parse_args()
+    print('Scanning and normalizing dates from', args.root or DOWNLOADS)
+    # extracts hold normalized dates, so they are only valid for this parser
+    manifest = ScanManifest(MANIFEST, EXTRACT_DIR, parser_version(normalize_date_value, ('ordinals', 'trim', 'float'), FORMATS), reset=args.full)
+    with instrument.RunReport('extract_and_fix_dates_downloads', args.profile) as report:
+        with instrument.stage('find_and_process') as st:
+            with DateParseCache(DATE_CACHE) as cache:
+                sources, frames, bad_frames, duplicates, formats_by_source = find_and_process(cache, manifest=manifest, **scan_options(args), **discovery_options(args))
+            manifest.save()
+            st['rows_out'] = sum(len(f) for f in frames)
+        print('Date cache hits=', cache.hits, 'misses=', cache.misses)
+        print('Manifest reused=', manifest.reused, 'files; re-read=', manifest.recorded)
+        print('Found', len(sources), 'sources; rows collected=', sum(len(f) for f in frames))
+        with instrument.stage('save_outputs') as st:
+            st['rows_in'] = sum(len(f) for f in frames)
+            df_all, _ = save_outputs(sources, frames, bad_frames, duplicates, formats_by_source)
+            st['rows_out'] = 0 if df_all is None else len(df_all)
+    print('Wrote run report to', report.save(OUT_REPORT))
     print('Done')
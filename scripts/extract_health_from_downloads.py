@@ -7,18 +7,26 @@ Behavior:
 - Expected columns (case-insensitive): Date, Weight, Nutrition, Exercise, Sleep, Hygiene, Food
 - Saves:
   - data/found_health_files_from_downloads.json  (list of sources)
-  - data/merged_health_from_downloads.csv
+  - data/merged_health_from_downloads.csv (rows repeated from an earlier source dropped)
   - data/merged_health_clean_subset.csv (subset with canonical columns)
 
 Run: python .\scripts\extract_health_from_downloads.py
 """
 
+import argparse
 import json
 from pathlib import Path
 import pandas as pd
-import traceback
 
-DOWNLOADS = Path.home() / 'Downloads'
+from csv_reader import read_header, try_read_csv
+from dedup import RowDeduper
+from discover import DEFAULT_ROOT, add_discovery_args, discovery_options, iter_candidates
+from excel_reader import Workbook
+from parallel_scan import add_scan_args, scan_files, scan_options
+from scan_manifest import ScanManifest
+from table_io import encode_sources, write_table
+
+DOWNLOADS = DEFAULT_ROOT
 REPO_ROOT = Path(__file__).resolve().parents[1]
 OUT_DIR = REPO_ROOT / 'data'
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -26,6 +34,10 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 FOUND_JSON = OUT_DIR / 'found_health_files_from_downloads.json'
 MERGED_CSV = OUT_DIR / 'merged_health_from_downloads.csv'
 MERGED_CLEAN = OUT_DIR / 'merged_health_clean_subset.csv'
+MANIFEST = OUT_DIR / 'cache' / 'scan_manifest_raw.json'
+EXTRACT_DIR = OUT_DIR / 'cache' / 'extracts_raw'
+# bump when load_file changes what it extracts
+MANIFEST_VERSION = 'raw-1'
 
 EXPECTED = ['date','weight','nutrition','exercise','sleep','hygiene','food']
 
@@ -37,123 +49,136 @@ def header_has_expected(cols):
     # also accept partial matches like 'wt' or 'sleep_hours' could be noisy, so keep simple
     return False
 
-def try_read_excel(path, sheet_name=None):
-    try:
-        return pd.read_excel(path, sheet_name=sheet_name, dtype=str)
-    except Exception:
+def load_file(p):
+    """Classify one file and load the sheet to include.
+
+    Returns a list of (sheet, reason, df); empty when the file is skipped.
+    Runs in worker processes in parallel mode, so it only reads the file.
+    """
+    lowname = p.name.lower()
+    if p.suffix.lower() in ['.csv']:
+        if 'health' in lowname:
+            df = try_read_csv(p)
+            if df is not None:
+                return [('', 'filename contains health', df)]
+            return []
+        # else inspect header
+        head = None
         try:
-            # try engine fallback
-            return pd.read_excel(path, sheet_name=sheet_name, engine='openpyxl', dtype=str)
+            head = read_header(p)
         except Exception:
-            return None
-
-def try_read_csv(path):
-    try:
-        return pd.read_csv(path, dtype=str, encoding='utf-8', low_memory=False)
-    except Exception:
+            pass
+        if head is not None and header_has_expected(head):
+            df = try_read_csv(p)
+            if df is not None:
+                return [('', 'header matched expected columns', df)]
+
+    elif p.suffix.lower() in ['.xls', '.xlsx', '.xlsm', '.xlsb']:
+        # if filename contains health, try to read all sheets or prefer sheet named health
         try:
-            return pd.read_csv(path, dtype=str, encoding='latin-1', low_memory=False)
+            wb = Workbook(p)
         except Exception:
-            return None
+            # skip unreadable
+            return []
+
+        with wb:
+            # sheet name match
+            matched_sheet = None
+            for s in wb.sheet_names:
+                if 'health' == s.lower().strip() or 'health' in s.lower():
+                    matched_sheet = s
+                    break
 
-def find_and_load():
+            if matched_sheet is not None:
+                df = wb.read(matched_sheet)
+                if df is not None:
+                    return [(matched_sheet, 'sheet name contains health', df)]
+                return []
+
+            # else inspect each sheet header for expected columns
+            for s in wb.sheet_names:
+                try:
+                    head = wb.header(s)
+                except Exception:
+                    head = None
+                if head is not None and header_has_expected(head):
+                    df = wb.read(s)
+                    if df is not None:
+                        return [(s, 'sheet header matched expected columns', df)]
+    return []
+
+def find_and_load(workers=1, timeout=None, manifest=None, root=None, **discover):
     sources = []
     frames = []
-    if not DOWNLOADS.exists():
-        print('Downloads folder not found at', DOWNLOADS)
+    root = Path(root) if root else DOWNLOADS
+    if not root.exists():
+        print('Downloads folder not found at', root)
         return sources, frames
 
-    for p in DOWNLOADS.rglob('*'):
-        if p.is_file():
-            lowname = p.name.lower()
-            try:
-                if p.suffix.lower() in ['.csv']:
-                    if 'health' in lowname:
-                        df = try_read_csv(p)
-                        if df is not None:
-                            df['source_file'] = str(p)
-                            df['source_sheet'] = ''
-                            frames.append(df)
-                            sources.append({'path': str(p), 'reason': 'filename contains health', 'sheet': ''})
-                            print('Included (filename match):', p)
-                        continue
-                    # else inspect header
-                    head = None
-                    try:
-                        head = pd.read_csv(p, nrows=0, dtype=str)
-                    except Exception:
-                        pass
-                    if head is not None and header_has_expected(head.columns):
-                        df = try_read_csv(p)
-                        if df is not None:
-                            df['source_file'] = str(p)
-                            df['source_sheet'] = ''
-                            frames.append(df)
-                            sources.append({'path': str(p), 'reason': 'header matched expected columns', 'sheet': ''})
-                            print('Included (header match):', p)
-
-                elif p.suffix.lower() in ['.xls', '.xlsx', '.xlsm', '.xlsb']:
-                    # if filename contains health, try to read all sheets or prefer sheet named health
-                    try:
-                        xls = pd.ExcelFile(p)
-                    except Exception:
-                        # skip unreadable
-                        continue
-
-                    # sheet name match
-                    matched_sheet = None
-                    for s in xls.sheet_names:
-                        if 'health' == s.lower().strip() or 'health' in s.lower():
-                            matched_sheet = s
-                            break
-
-                    if matched_sheet is not None:
-                        df = try_read_excel(p, sheet_name=matched_sheet)
-                        if df is not None:
-                            df['source_file'] = str(p)
-                            df['source_sheet'] = matched_sheet
-                            frames.append(df)
-                            sources.append({'path': str(p), 'reason': 'sheet name contains health', 'sheet': matched_sheet})
-                            print('Included (sheet name match):', p, '->', matched_sheet)
-                        continue
-
-                    # else inspect each sheet header for expected columns
-                    for s in xls.sheet_names:
-                        try:
-                            head = pd.read_excel(p, sheet_name=s, nrows=0)
-                        except Exception:
-                            head = None
-                        if head is not None and header_has_expected(head.columns):
-                            df = try_read_excel(p, sheet_name=s)
-                            if df is not None:
-                                df['source_file'] = str(p)
-                                df['source_sheet'] = s
-                                frames.append(df)
-                                sources.append({'path': str(p), 'reason': 'sheet header matched expected columns', 'sheet': s})
-                                print('Included (sheet header match):', p, '->', s)
-                                break
-            except Exception:
-                print('Error processing', p)
-                traceback.print_exc()
-
-    return sources, frames
-
-def normalize_and_save(sources, frames):
+    # unchanged files are served from the manifest's cached extracts
+    paths = []
+    cached = {}
+
+    def todo():
+        for p in iter_candidates(root, **discover):
+            paths.append(p)
+            entry = manifest.lookup(p) if manifest is not None else None
+            if entry is None:
+                yield p
+            else:
+                cached[p] = entry
+
+    fresh = {}
+    for p, loaded in scan_files(load_file, todo(), workers, timeout):
+        for s, reason, df in loaded:
+            df['source_file'] = str(p)
+            df['source_sheet'] = s
+        fresh[p] = loaded
+        if manifest is not None:
+            manifest.record(p, loaded)
+
+    entries = [(p, manifest.load(p, cached[p]) if p in cached else fresh[p])
+               for p in sorted(set(cached) | set(fresh), key=str)]
+    if manifest is not None:
+        manifest.prune(paths)
+    return collect(entries)
+
+def collect(entries):
+    """Return (sources, frames) from (path, [(sheet, reason, df)]) entries,
+    without the rows an earlier sheet already had (see dedup.py)."""
+    sources = []
+    frames = []
+    deduper = RowDeduper()
+    for p, loaded in entries:
+        for s, reason, df in loaded:
+            rows = len(df)
+            df = deduper.add(df, str(p), s)
+            frames.append(df)
+            sources.append({'path': str(p), 'reason': reason, 'sheet': s, 'rows': rows,
+                            'duplicate_rows': rows - len(df)})
+            if s:
+                print('Included (' + reason + '):', p, '->', s)
+            else:
+                print('Included (' + reason + '):', p)
+    return sources, encode_sources(frames, sources)
+
+def normalize_and_save(sources, frames, formats=('csv',)):
+    """Write the outputs; return the (merged, cleaned subset) frames written."""
     # save sources metadata
     with open(FOUND_JSON, 'w', encoding='utf-8') as f:
         json.dump(sources, f, indent=2)
 
     if not frames:
         print('No health-like data found')
-        return
+        return None, None
 
     # standard concat with union of columns
     combined = pd.concat(frames, axis=0, ignore_index=True, sort=False)
     # drop completely empty rows
     combined.dropna(how='all', inplace=True)
     # write merged raw
-    combined.to_csv(MERGED_CSV, index=False)
-    print('Wrote merged file:', MERGED_CSV, 'shape=', combined.shape)
+    for path in write_table(combined, MERGED_CSV, formats):
+        print('Wrote merged file:', path, 'shape=', combined.shape)
 
     # produce cleaned subset with canonical column names (case-insensitive mapping)
     col_map = {str(c).lower().strip(): c for c in combined.columns}
@@ -190,13 +215,22 @@ def normalize_and_save(sources, frames):
     if 'source_sheet' in combined.columns:
         clean['source_sheet'] = combined['source_sheet']
 
-    clean.to_csv(MERGED_CLEAN, index=False)
-    print('Wrote cleaned subset:', MERGED_CLEAN, 'shape=', clean.shape)
+    for path in write_table(clean, MERGED_CLEAN, formats):
+        print('Wrote cleaned subset:', path, 'shape=', clean.shape)
+    return combined, clean
 
 
 if __name__ == '__main__':
-    print('Scanning', DOWNLOADS)
-    sources, frames = find_and_load()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_discovery_args(parser)
+    add_scan_args(parser)
+    parser.add_argument('--full', action='store_true', help='ignore the scan manifest and re-read every file')
+    args = parser.parse_args()
+    print('Scanning', args.root or DOWNLOADS)
+    manifest = ScanManifest(MANIFEST, EXTRACT_DIR, MANIFEST_VERSION, reset=args.full)
+    sources, frames = find_and_load(manifest=manifest, **scan_options(args), **discovery_options(args))
+    manifest.save()
+    print('Manifest reused=', manifest.reused, 'files; re-read=', manifest.recorded)
     print('Found', len(sources), 'candidate sheets/files')
     normalize_and_save(sources, frames)
     print('Done')
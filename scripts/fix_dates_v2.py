@@ -3,12 +3,17 @@ import re
 from pathlib import Path
 from dateutil.parser import parse
 
+from csv_reader import read_csv
+from date_cache import DateParseCache
+from date_engine import FORMATS, normalize_dates
+
 IN = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/merged_health.csv")
 OUT = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/merged_health_clean_v2.csv")
 BAD = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/bad_date_rows.csv")
+DATE_CACHE = IN.parent / 'cache' / 'date_parse.sqlite'
 
 print('Loading', IN)
-df = pd.read_csv(IN, dtype=str, encoding='utf-8', low_memory=False)
+df = read_csv(IN)
 keep_cols = ['Date','Weight','Nutrition','Exercise','Sleep','Hygiene','Food']
 # map present columns case-insensitive
 cols_lower = {c.lower(): c for c in df.columns}
@@ -106,7 +111,10 @@ def try_parse_any(s):
     return pd.NaT
 
 print('Attempting robust date parsing...')
-df_sub['Date_parsed'] = df_sub['Date_raw'].apply(try_parse_any)
+with DateParseCache(DATE_CACHE) as cache:
+    df_sub['Date_parsed'] = normalize_dates(df_sub['Date_raw'], try_parse_any,
+                                           steps=('ordinals', 'float', 'trim'),
+                                           formats=FORMATS + ['%d.%m.%Y','%H:%M:%S'], cache=cache)
 # Count failures
 fail_mask = df_sub['Date_parsed'].isna()
 num_fail = int(fail_mask.sum())
@@ -155,12 +163,17 @@ import re
 from pathlib import Path
 from dateutil.parser import parse
 
+from csv_reader import read_csv
+from date_cache import DateParseCache
+from date_engine import FORMATS, normalize_dates
+
 IN = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/merged_health.csv")
 OUT = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/merged_health_clean_v2.csv")
 BAD = Path(r"C:/Users/anbal/Documents/GitHub/ML-projects/data/bad_date_rows.csv")
+DATE_CACHE = IN.parent / 'cache' / 'date_parse.sqlite'
 
 print('Loading', IN)
-df = pd.read_csv(IN, dtype=str, encoding='utf-8', low_memory=False)
+df = read_csv(IN)
 keep_cols = ['Date','Weight','Nutrition','Exercise','Sleep','Hygiene','Food']
 # map present columns case-insensitive
 cols_lower = {c.lower(): c for c in df.columns}
@@ -254,7 +267,9 @@ def try_parse_any(s):
     return pd.NaT
 
 print('Attempting robust date parsing...')
-df_sub['Date_parsed'] = df_sub['Date_raw'].apply(try_parse_any)
+with DateParseCache(DATE_CACHE) as cache:
+    df_sub['Date_parsed'] = normalize_dates(df_sub['Date_raw'], try_parse_any,
+                                           steps=('ordinals',), formats=FORMATS + ['%d.%m.%Y'], cache=cache)
 # Count failures
 fail_mask = df_sub['Date_parsed'].isna()
 num_fail = fail_mask.sum()
@@ -10,10 +10,15 @@ from pathlib import Path
 from dateutil.parser import parse
 import re
 
+from date_cache import DateParseCache
+from date_engine import normalize_dates
+from table_io import read_table, write_table
+
 ROOT = Path(__file__).resolve().parents[1]
 IN_FILE = ROOT / 'data' / 'merged_health_clean_subset.csv'
 OUT_FILE = ROOT / 'data' / 'merged_health_clean_subset_dates_fixed.csv'
 BAD_FILE = ROOT / 'data' / 'bad_date_rows_from_subset.csv'
+DATE_CACHE = ROOT / 'data' / 'cache' / 'date_parse.sqlite'
 
 excel_epoch = pd.Timestamp('1899-12-30')
 
@@ -65,37 +70,48 @@ def parse_date_value(v):
         except Exception:
             return pd.NaT
 
-def main():
-    if not IN_FILE.exists():
-        print('Input file not found:', IN_FILE)
-        return
-    print('Loading', IN_FILE)
-    df = pd.read_csv(IN_FILE, dtype=str, encoding='utf-8', low_memory=False)
-    if 'Date' not in df.columns:
-        print('No `Date` column found in', IN_FILE)
-        return
-
-    df['Date_parsed'] = df['Date'].apply(parse_date_value)
+def fix_dates(df, cache=None):
+    """Return (fixed, bad) for a frame with a raw `Date` column."""
+    df = df.copy()
+    df['Date_parsed'] = normalize_dates(df['Date'], parse_date_value, steps=('float',), cache=cache)
     # coerce to datetime and format
     df['Date_fixed'] = pd.to_datetime(df['Date_parsed'], errors='coerce')
     df['Date_fixed'] = df['Date_fixed'].dt.strftime('%Y-%m-%d')
 
     # rows where Date_fixed is NA or 'NaT'
     bad = df[df['Date_fixed'].isna()].copy()
-    if not bad.empty:
-        print('Found', len(bad), 'rows with unparseable dates; saving to', BAD_FILE)
-        bad.to_csv(BAD_FILE, index=False)
-    else:
-        print('All dates parsed successfully')
 
     # replace Date with Date_fixed, keep Date_raw for traceability
     df['Date_raw'] = df['Date']
     df['Date'] = df['Date_fixed']
     # drop helper cols
     df.drop(columns=['Date_parsed','Date_fixed'], inplace=True)
+    return df, bad
+
+def save(df, bad, formats=('csv',)):
+    if not bad.empty:
+        print('Found', len(bad), 'rows with unparseable dates; saving to', BAD_FILE)
+        bad.to_csv(BAD_FILE, index=False)
+    else:
+        print('All dates parsed successfully')
+
+    for path in write_table(df, OUT_FILE, formats):
+        print('Saved fixed file to', path)
+
+def main():
+    if not IN_FILE.exists():
+        print('Input file not found:', IN_FILE)
+        return
+    print('Loading', IN_FILE)
+    df = read_table(IN_FILE)
+    if 'Date' not in df.columns:
+        print('No `Date` column found in', IN_FILE)
+        return
 
-    df.to_csv(OUT_FILE, index=False)
-    print('Saved fixed file to', OUT_FILE)
+    with DateParseCache(DATE_CACHE) as cache:
+        df, bad = fix_dates(df, cache)
+    print('Date cache hits=', cache.hits, 'misses=', cache.misses)
+    save(df, bad)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,216 @@
+"""Keep the normalized rows in a local SQLite database and query it by date.
+
+`load` upserts the rows of `data/merged_health_from_downloads_dates_fixed.csv`
+into `data/health.sqlite`, one row per source row keyed by
+(source_file, source_sheet, row), where `row` is the row's position in its
+sheet. Rows of a sheet that shrank and sheets that are gone are deleted,
+so the table always mirrors the last scan. Each row carries its day key
+(days since 1970-01-01, see day_key.py), indexed, so a date range is an
+index range scan instead of a reload of the whole CSV.
+
+Run `python scripts/pipeline.py --store` to refresh the database with the
+other outputs, or load it directly:
+
+    python scripts/health_store.py load
+    python scripts/health_store.py query --from 2025-09-01 --to 2025-09-30
+    python scripts/health_store.py query --from 2025-10-01 --exercise '%curl%' --daily
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+import daily_agg
+import day_key
+from export_nutrition_full_and_agg import EMPTY, find_columns
+from table_io import read_table
+
+ROOT = Path(__file__).resolve().parents[1]
+IN_FILE = ROOT / 'data' / 'merged_health_from_downloads_dates_fixed.csv'
+STORE = ROOT / 'data' / 'health.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS health_rows (
+    source_file TEXT NOT NULL,
+    source_sheet TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    day INTEGER,
+    date TEXT,
+    weight REAL,
+    weight_raw TEXT,
+    nutrition TEXT,
+    exercise TEXT,
+    -- also the index on source: rows are stored in this order
+    PRIMARY KEY (source_file, source_sheet, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS health_rows_day ON health_rows (day);
+"""
+
+DATE_FORMAT = '%Y-%m-%d'
+
+COLUMNS = ['source_file', 'source_sheet', 'row', 'day', 'date', 'weight', 'weight_raw', 'nutrition', 'exercise']
+
+UPSERT = f"""
+INSERT INTO health_rows ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})
+ON CONFLICT (source_file, source_sheet, row) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[3:])}
+"""
+
+
+def connect(path=STORE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def store_rows(df):
+    """The merged frame as store rows (a DataFrame with COLUMNS), or None
+    without a date column."""
+    cols = find_columns(df.columns)
+    if cols is None:
+        return None
+    date_col, weight_col, nutrition_col, exercise_col = cols
+
+    def column(name):
+        return df[name] if name else pd.Series(None, index=df.index, dtype=object)
+
+    out = pd.DataFrame({
+        'source_file': df['source_file'].astype('str') if 'source_file' in df.columns else '',
+        'source_sheet': df['source_sheet'].astype('str') if 'source_sheet' in df.columns else '',
+    }, index=df.index).fillna('')
+    out['row'] = out.groupby(['source_file', 'source_sheet']).cumcount()
+    keys = day_key.parse(df[date_col], DATE_FORMAT)
+    out['day'] = keys
+    out['date'] = day_key.to_text(keys, '%Y-%m-%d')
+    weight = column(weight_col)
+    out['weight'] = pd.to_numeric(weight, errors='coerce')
+    out['weight_raw'] = weight
+    out['nutrition'] = column(nutrition_col)
+    out['exercise'] = column(exercise_col)
+    return out.reset_index(drop=True)
+
+
+def records(rows):
+    """Rows as tuples of plain Python values (None for missing)."""
+    rows = rows.astype(object).where(rows.notna(), None)
+    return list(rows.itertuples(index=False, name=None))
+
+
+def load(df, path=STORE):
+    """Upsert the merged frame into the store; return the number of rows."""
+    rows = store_rows(df)
+    if rows is None:
+        return 0
+    counts = rows.groupby(['source_file', 'source_sheet']).size()
+    conn = connect(path)
+    try:
+        with conn:
+            conn.executemany(UPSERT, records(rows))
+            # sheets that shrank or are gone
+            conn.execute('CREATE TEMP TABLE seen (source_file TEXT, source_sheet TEXT, n INTEGER, '
+                         'PRIMARY KEY (source_file, source_sheet))')
+            conn.executemany('INSERT INTO seen VALUES (?, ?, ?)',
+                             [(f, s, int(n)) for (f, s), n in counts.items()])
+            conn.execute('DELETE FROM health_rows WHERE NOT EXISTS (SELECT 1 FROM seen '
+                         'WHERE seen.source_file = health_rows.source_file '
+                         'AND seen.source_sheet = health_rows.source_sheet AND health_rows.row < seen.n)')
+            conn.execute('DROP TABLE seen')
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def query(path=STORE, start=None, end=None, exercise=None, nutrition=None):
+    """Rows with start <= date <= end (YYYY-MM-DD strings or day keys) whose
+    exercise / nutrition match the given LIKE patterns, in date order."""
+    where = []
+    params = []
+    if start is not None:
+        where.append('day >= ?')
+        params.append(start if isinstance(start, int) else day_key.parse_one(start, DATE_FORMAT))
+    if end is not None:
+        where.append('day <= ?')
+        params.append(end if isinstance(end, int) else day_key.parse_one(end, DATE_FORMAT))
+    if exercise is not None:
+        where.append('exercise LIKE ?')
+        params.append(exercise)
+    if nutrition is not None:
+        where.append('nutrition LIKE ?')
+        params.append(nutrition)
+    sql = f'SELECT {", ".join(COLUMNS)} FROM health_rows'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY day, source_file, source_sheet, row'
+    conn = sqlite3.connect(f'file:{Path(path)}?mode=ro', uri=True)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def daily(rows):
+    """One row per day of `rows`, like nutrition_aggregated.csv: Nutrition and
+    Exercise items joined in order, the last Weight, newest first."""
+    rows = rows[rows['day'].notna()]
+    keys = pd.Series(rows['day'].astype('int64'), dtype=day_key.DTYPE)
+    frame = rows.rename(columns={'weight_raw': 'Weight', 'nutrition': 'Nutrition', 'exercise': 'Exercise'})
+    agg = daily_agg.aggregate(keys, frame, joined=['Nutrition', 'Exercise'], last=['Weight'],
+                              empty=EMPTY, key_name='Date')
+    agg = agg.sort_values('Date', ascending=False, kind='stable')
+    agg['Date'] = day_key.to_text(agg['Date'], '%Y-%m-%d')
+    return agg
+
+
+def day_arg(value):
+    """argparse type of --from / --to: the day key of a YYYY-MM-DD date."""
+    try:
+        return day_key.parse_one(value, DATE_FORMAT)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'not a YYYY-MM-DD date: {value!r}') from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', type=Path, default=STORE, help='database file (default: data/health.sqlite)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('load', help=f'upsert the rows of {IN_FILE.name}')
+    q = commands.add_parser('query', help='print the rows (or days) in a date range')
+    q.add_argument('--from', dest='start', type=day_arg, help='first date, inclusive (YYYY-MM-DD)')
+    q.add_argument('--to', dest='end', type=day_arg, help='last date, inclusive (YYYY-MM-DD)')
+    q.add_argument('--exercise', help="LIKE pattern on Exercise, e.g. '%%curl%%'")
+    q.add_argument('--nutrition', help='LIKE pattern on Nutrition')
+    q.add_argument('--daily', action='store_true', help='one row per day, items joined')
+    q.add_argument('--csv', action='store_true', help='print CSV instead of a table')
+    args = parser.parse_args(argv)
+
+    if args.command == 'load':
+        if not IN_FILE.exists():
+            print('Input not found:', IN_FILE)
+            return
+        df = read_table(IN_FILE)
+        n = load(df, args.db)
+        print('Stored', n, 'rows in', args.db)
+        return
+
+    if not args.db.exists():
+        print('No database at', args.db, '- run: python scripts/health_store.py load')
+        return
+    rows = query(args.db, args.start, args.end, args.exercise, args.nutrition)
+    if args.daily:
+        out = daily(rows)
+    else:
+        out = rows[['date', 'weight_raw', 'nutrition', 'exercise', 'source_file', 'source_sheet']].rename(
+            columns={'date': 'Date', 'weight_raw': 'Weight', 'nutrition': 'Nutrition', 'exercise': 'Exercise'})
+    if args.csv:
+        out.to_csv(sys.stdout, index=False)
+    else:
+        print(out.fillna('').to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
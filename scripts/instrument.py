@@ -0,0 +1,186 @@
+"""Timers and counters for one run, written out as a JSON report.
+
+A `RunReport` is made active with `with`; while it is, the scripts record
+into it through the module-level helpers, which do nothing when no report
+is active (worker processes, library use):
+
+- `stage(name)` times a block and collects what happens inside it; stages
+  nest, and the dict it yields takes extra fields such as rows in/out,
+- `count(name, n)` adds to a counter of the innermost stage of the current
+  thread (of the report outside any stage); `timer(name)` and `timed(...)`
+  add elapsed seconds to one,
+- `source(path, **fields)` records one source file, `output(path, rows)`
+  one file written.
+
+Each stage also gets the process's peak RSS when it ends. With
+`profile_dir`, every top-level stage runs under cProfile and its stats are
+dumped to `<profile_dir>/<stage>.prof` (read them with `python -m pstats`
+or snakeviz). Only one profiler can be enabled at a time, so a top-level
+stage that starts on another thread while one is being profiled is not
+profiled; run stages one at a time to profile each of them.
+
+Usage:
+    with RunReport('extract_and_fix_dates_downloads', profile_dir=args.profile) as report:
+        with stage('find_and_process') as st:
+            ...
+            st['rows_out'] = rows
+    report.save(OUT_REPORT)
+"""
+
+import cProfile
+import datetime
+import json
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_active = None
+_local = threading.local()
+# held while a stage is being profiled
+_profiling = threading.Lock()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB; None where the
+    `resource` module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunReport:
+    def __init__(self, name, profile_dir=None):
+        self.name = name
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.seconds = None
+        self.stages = []
+        self.counters = {}
+        self.sources = []
+        self.outputs = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        global _active
+        self.previous = _active
+        _active = self
+        self.start = time.perf_counter()
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self.previous
+        self.seconds = round(time.perf_counter() - self.start, 4)
+
+    def to_dict(self):
+        return {'name': self.name, 'started': self.started, 'seconds': self.seconds,
+                'peak_rss_mb': peak_rss_mb(), 'counters': self.counters, 'stages': self.stages,
+                'sources': self.sources, 'outputs': self.outputs}
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def stage(name):
+    """Time the block as stage `name`; yields the stage's record."""
+    report = _active
+    if report is None:
+        yield {}
+        return
+    stack = _stack()
+    record = {'name': name, 'seconds': None, 'counters': {}, 'stages': []}
+    with report.lock:
+        (stack[-1]['stages'] if stack else report.stages).append(record)
+    stack.append(record)
+    profiler = None
+    if report.profile_dir is not None and len(stack) == 1 and _profiling.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            path = report.profile_dir / (re.sub(r'[^\w.-]+', '_', name) + '.prof')
+            profiler.dump_stats(path)
+            record['profile'] = str(path)
+        record['peak_rss_mb'] = peak_rss_mb()
+        stack.pop()
+
+
+def count(name, n=1):
+    report = _active
+    if report is None:
+        return
+    stack = _stack()
+    counters = stack[-1]['counters'] if stack else report.counters
+    with report.lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+@contextmanager
+def timer(name):
+    """Add the seconds spent in the block to counter `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        count(name, round(time.perf_counter() - start, 6))
+
+
+def timed(iterable, name):
+    """Yield from `iterable`, adding the time spent producing items to
+    counter `name` (for lazy walks interleaved with other work)."""
+    it = iter(iterable)
+    while True:
+        with timer(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def source(path, **fields):
+    report = _active
+    if report is None:
+        return
+    with report.lock:
+        report.sources.append(dict({'path': str(path)}, **fields))
+
+
+def output(path, rows=None):
+    """Record a file just written: its size goes to the `bytes_written` counter."""
+    report = _active
+    if report is None:
+        return
+    try:
+        size = Path(path).stat().st_size
+    except OSError:
+        size = None
+    with report.lock:
+        report.outputs.append({'path': str(path), 'rows': rows, 'bytes': size})
+    count('bytes_written', size or 0)
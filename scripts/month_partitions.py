@@ -0,0 +1,247 @@
+"""Keep a table as a dataset partitioned by month, and read date ranges of it.
+
+The merged table is one flat file, so a question about one month reads all
+of history. `write_dataset` also writes it as one file per month of its
+normalized date, next to the flat file:
+
+    data/merged_health_from_downloads_dates_fixed/year=2025/month=09/part.csv
+    data/merged_health_from_downloads_dates_fixed/year=__HIVE_DEFAULT_PARTITION__/month=.../part.csv
+
+(rows without a date go to the last one). `read_range(path, start, end)`
+opens only the partitions of the months that overlap the range and returns
+their rows on those days; `iter_range` streams them in chunks. A partition
+keeps the rows of its month in table order, and partitions are read in
+month order.
+
+`_partitions.json` in the dataset directory keeps the columns and formats
+of the last write and a digest of every month's rows (see
+daily_patch.day_digests). A rewrite after new data only writes the months
+whose digest changed and deletes the months that are gone; a change of
+columns or formats rewrites every month.
+
+Usage:
+    write_dataset(df, OUT_MERGED, formats=('csv',))
+    df = read_range(OUT_MERGED, '2025-06', '2025-06')
+
+The exports take the range as `--from` / `--to` (add_range_args) and write
+what they build from it next to their usual output, with the range in the
+name (range_path), so a ranged run never replaces the full-history table.
+"""
+
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import day_key
+from daily_patch import changed_keys, day_digests
+from table_io import DICTIONARY_COLUMNS, iter_table, read_table, table_path, write_table
+
+DATE_COLUMN = 'Date_normalized'
+MANIFEST_NAME = '_partitions.json'
+# partition name of rows without a date, as hive-style readers spell it
+UNDATED = '__HIVE_DEFAULT_PARTITION__'
+UNDATED_KEY = np.iinfo('int32').min
+
+
+def dataset_dir(path):
+    """Directory of the dataset kept for the flat table at `path`."""
+    return path.with_suffix('')
+
+
+def has_dataset(path):
+    """Whether the dataset of `path` has been written."""
+    return (dataset_dir(path) / MANIFEST_NAME).exists()
+
+
+def load_manifest(directory):
+    try:
+        with open(directory / MANIFEST_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def month_keys(df, date_col):
+    """Day key of the first day of each row's month; UNDATED_KEY without a date."""
+    keys = day_key.month_start(day_key.parse(df[date_col]))
+    return keys.fillna(UNDATED_KEY)
+
+
+def partition_names(keys):
+    """Directory names (`year=2025/month=09`) of the month keys `keys`."""
+    keys = pd.Series(keys, dtype=day_key.DTYPE)
+    undated = (keys == UNDATED_KEY).to_numpy()
+    names = day_key.to_text(keys.mask(undated), 'year=%Y/month=%m')
+    return names.where(~undated, f'year={UNDATED}/month={UNDATED}').tolist()
+
+
+def write_dataset(df, path, formats=('csv',), date_col=DATE_COLUMN):
+    """Write `df` as the month-partitioned dataset of `path`, only the months
+    that changed since the last write; return the number of partitions written."""
+    directory = dataset_dir(path)
+    previous = load_manifest(directory)
+    if previous is not None and (previous.get('columns') != [str(c) for c in df.columns]
+                                 or previous.get('formats') != list(formats)):
+        previous = None
+    if previous is None and directory.exists():
+        shutil.rmtree(directory)
+
+    keys = month_keys(df, date_col)
+    digests = day_digests(keys, df)
+    digests.index = pd.Index(partition_names(digests.index))
+    if previous is None:
+        changed = digests.index
+    else:
+        old = pd.Series({name: np.uint64(int(p['digest'], 16)) for name, p in previous['partitions'].items()},
+                        dtype='uint64')
+        changed = changed_keys(old, digests)
+    changed = set(changed)
+
+    # the rows sorted by month once, each month then a slice of them
+    keys = keys.to_numpy(dtype='int64')
+    order = np.argsort(keys, kind='stable')
+    months, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    rows = dict(zip(partition_names(months), zip(starts, starts + counts)))
+    stale = [name for name in rows if name in changed
+             or not all(table_path(directory / name / 'part', fmt).exists() for fmt in formats)]
+    ordered = df.take(order) if stale else df
+    for name in stale:
+        start, stop = rows[name]
+        part = directory / name / 'part'
+        part.parent.mkdir(parents=True, exist_ok=True)
+        write_table(ordered.iloc[start:stop], part, formats)
+    gone = [name for name in (previous or {}).get('partitions', {}) if name not in digests.index]
+    for name in gone:
+        shutil.rmtree(directory / name, ignore_errors=True)
+        year = (directory / name).parent
+        if year.exists() and not any(year.iterdir()):
+            year.rmdir()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        'date_column': date_col,
+        'columns': [str(c) for c in df.columns],
+        'formats': list(formats),
+        'partitions': {name: {'digest': f'{int(digests[name]):016x}', 'rows': int(stop - start)}
+                       for name, (start, stop) in sorted(rows.items())},
+    }
+    with open(directory / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print('Wrote', len(stale), 'of', len(rows), 'month partitions to', directory, 'removed=', len(gone))
+    return len(stale)
+
+
+def day_range(start=None, end=None):
+    """(first, last) day keys of the range from `start` to `end` inclusive,
+    each a date, month or year (`2025-06-15`, `2025-06`, `2025`) or None."""
+    first = None if start is None else day_key.parse_one(pd.Period(start).start_time)
+    last = None if end is None else day_key.parse_one(pd.Period(end).end_time.normalize())
+    return first, last
+
+
+def partitions(path, start=None, end=None, fmt=None):
+    """Files of the partitions of `path`'s dataset whose month overlaps the
+    range (all of them, undated last, without one), in month order."""
+    directory = dataset_dir(path)
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return []
+    fmt = fmt or manifest['formats'][0]
+    first, last = day_range(start, end)
+    files = []
+    for name in sorted(manifest['partitions']):
+        if UNDATED in name:
+            continue
+        month = name.replace('year=', '').replace('/month=', '-')
+        month_first, month_last = day_range(month, month)
+        if (first is None or month_last >= first) and (last is None or month_first <= last):
+            files.append(table_path(directory / name / 'part', fmt))
+    if start is None and end is None:
+        files += [table_path(directory / name / 'part', fmt) for name in manifest['partitions'] if UNDATED in name]
+    return files
+
+
+def in_range(df, date_col, first, last):
+    """The rows of `df` whose date is within [first, last]."""
+    if first is None and last is None:
+        return df
+    keys = day_key.parse(df[date_col])
+    keep = keys.notna()
+    if first is not None:
+        keep &= keys >= first
+    if last is not None:
+        keep &= keys <= last
+    return df[keep.to_numpy(dtype=bool)]
+
+
+def read_range(path, start=None, end=None, columns=None, fmt=None):
+    """The rows of `path`'s dataset dated from `start` to `end` (see
+    day_range), as `read_table` reads a table; None without a dataset.
+
+    Only the partitions of the overlapping months are opened.
+    """
+    manifest = load_manifest(dataset_dir(path))
+    if manifest is None:
+        return None
+    date_col = manifest['date_column']
+    files = partitions(path, start, end, fmt)
+    if callable(columns):
+        columns = columns(manifest['columns'])
+    wanted = None if columns is None else [c for c in manifest['columns'] if c in set(columns) | {date_col}]
+    first, last = day_range(start, end)
+    frames = [in_range(read_table(p, wanted), date_col, first, last) for p in files]
+    if not frames:
+        df = pd.DataFrame({name: pd.Series(dtype='str') for name in wanted or manifest['columns']})
+    else:
+        df = pd.concat(frames, ignore_index=True)
+    # partitions with different sources concatenate to plain strings
+    for name in DICTIONARY_COLUMNS:
+        if name in df.columns and not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype('str').astype('category')
+    if columns is not None and date_col not in set(columns):
+        df = df.drop(columns=date_col)
+    return df.reset_index(drop=True)
+
+
+def add_range_args(parser):
+    parser.add_argument('--from', dest='start', default=None,
+                        help='first day, month or year to read (e.g. 2025-06-01, 2025-06); '
+                             'reads only the month partitions of the range and writes to a '
+                             'file named after it (e.g. nutrition_aggregated_2025-06_to_2025-07.csv)')
+    parser.add_argument('--to', dest='end', default=None, help='last day, month or year to read, inclusive')
+
+
+def range_path(path, start=None, end=None):
+    """Where a run over the range from `start` to `end` writes the table it
+    writes to `path` over all of history: `path` itself without a range, else
+    `path` with the range in its name (`nutrition_aggregated_2025-06_to_2025-07.csv`)."""
+    if start is None and end is None:
+        return path
+    if start is None:
+        tag = f'to_{end}'
+    elif end is None:
+        tag = f'from_{start}'
+    else:
+        tag = f'{start}_to_{end}'
+    return path.with_name(f'{path.stem}_{tag}{path.suffix}')
+
+
+def iter_range(path, chunksize, start=None, end=None, columns=None, fmt=None):
+    """Yield the frames of `read_range` in chunks of at most `chunksize` rows,
+    reading one partition at a time."""
+    manifest = load_manifest(dataset_dir(path))
+    if manifest is None:
+        return
+    date_col = manifest['date_column']
+    if callable(columns):
+        columns = columns(manifest['columns'])
+    wanted = None if columns is None else [c for c in manifest['columns'] if c in set(columns) | {date_col}]
+    first, last = day_range(start, end)
+    for p in partitions(path, start, end, fmt):
+        for chunk in iter_table(p, chunksize, wanted):
+            chunk = in_range(chunk, date_col, first, last)
+            if columns is not None and date_col not in set(columns):
+                chunk = chunk.drop(columns=date_col)
+            yield chunk
@@ -0,0 +1,135 @@
+"""Run a per-file loader over many files, optionally in a process pool.
+
+Both Downloads scanners open every candidate workbook; openpyxl parsing is
+CPU-bound, so `scan_files` can farm the per-file work out to worker
+processes. Results are always yielded in sorted-path order, so a parallel
+run produces exactly the same output as a serial one.
+
+`paths` may be a generator (see discover.iter_candidates): in parallel mode
+each file is sent to the pool as soon as it is discovered.
+
+Budget: with `timeout`, every file is loaded in a process of its own, at
+most `workers` at a time, and a file still loading `timeout` seconds after
+its process started is skipped and its process killed, so the files queued
+behind a hung one still get their turn. File size budgets are applied
+during discovery.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import traceback
+
+
+def call_loader(loader, path):
+    """Run `loader(path)` and return (result, error text)."""
+    try:
+        return loader(path), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def send_result(loader, path, conn):
+    """Run `loader(path)` in a worker process and send back call_loader's result."""
+    conn.send(call_loader(loader, path))
+    conn.close()
+
+
+def resolve_workers(workers):
+    """0 or None means one worker per CPU."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def add_scan_args(parser):
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes for loading files (0 = one per CPU, 1 = serial)')
+    parser.add_argument('--file-timeout', type=float, default=None,
+                        help='in parallel mode, skip files that take longer than this many seconds')
+
+
+def scan_options(args):
+    """Keyword arguments for the scanners from `add_scan_args` options."""
+    return {'workers': args.workers, 'timeout': args.file_timeout}
+
+
+def scan_files(loader, paths, workers=1, timeout=None):
+    """Yield (path, result) for every file loaded, in sorted-path order.
+
+    `loader` must be a module-level function so it can be sent to workers.
+    Files that fail or time out are reported and left out.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        results = [(p, call_loader(loader, p)) for p in paths]
+    elif timeout is not None:
+        results = list(collect_timed(loader, paths, workers, timeout))
+    else:
+        pool = multiprocessing.Pool(workers)
+        pending = [(p, pool.apply_async(call_loader, (loader, p))) for p in paths]
+        results = list(collect(pool, pending))
+
+    for p, (result, error) in sorted(results, key=lambda item: str(item[0])):
+        if error:
+            print('Error processing', p)
+            print(error, end='')
+            continue
+        yield p, result
+
+
+def collect(pool, pending):
+    try:
+        for p, job in pending:
+            yield p, job.get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def collect_timed(loader, paths, workers, timeout):
+    """Yield (path, (result, error)) as files finish, each loaded in its own
+    process that is killed `timeout` seconds after it started."""
+    paths = iter(paths)
+    # receiving end of each running process's pipe: (path, process, deadline)
+    running = {}
+    more = True
+    try:
+        while True:
+            while more and len(running) < workers:
+                p = next(paths, None)
+                if p is None:
+                    more = False
+                    break
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                proc = multiprocessing.Process(target=send_result, args=(loader, p, sender), daemon=True)
+                proc.start()
+                sender.close()
+                running[receiver] = (p, proc, time.monotonic() + timeout)
+            if not running:
+                return
+            first_deadline = min(deadline for _, _, deadline in running.values())
+            for receiver in multiprocessing.connection.wait(list(running), max(0, first_deadline - time.monotonic())):
+                p, proc, _ = running.pop(receiver)
+                try:
+                    out = receiver.recv()
+                except EOFError:
+                    proc.join()
+                    out = None, f'worker exited with code {proc.exitcode}\n'
+                receiver.close()
+                proc.join()
+                yield p, out
+            now = time.monotonic()
+            for receiver, (p, proc, deadline) in list(running.items()):
+                if deadline <= now:
+                    print('Skipped (over time budget):', p, 'seconds=', timeout)
+                    del running[receiver]
+                    proc.terminate()
+                    proc.join()
+                    receiver.close()
+    finally:
+        for receiver, (_, proc, _) in running.items():
+            proc.terminate()
+            proc.join()
+            receiver.close()
@@ -0,0 +1,509 @@
+"""Rebuild every output under data/ in one run.
+
+The scripts in this directory form a chain in which each one re-reads the
+CSV the one before it wrote. This runner declares them as stages of a DAG
+instead: a stage's inputs are the files it reads and its dependencies are
+the stages that write them. Frames are handed from stage to stage in
+memory (the CSVs are still written), independent stages run concurrently,
+and the Downloads sources are opened and parsed once for both scanners.
+
+A stage is skipped when its fingerprint -- the source of the code it runs
+plus the content of its inputs (for the scan, the size and mtime of every
+candidate file) -- matches the last run and its outputs exist. Fingerprints
+are kept in data/cache/pipeline_state.json; `--force` ignores them.
+
+`--format parquet` (or feather) keeps the tables as typed columnar files
+(see table_io.py) that later stages read back with only the columns they
+need; `--export-csv` also writes the CSVs. With `--chunksize` the daily
+rollups stream their input instead of loading it whole (see daily_agg.py).
+Otherwise they re-aggregate only the days whose rows changed since their
+last run (see daily_patch.py); `--force` and `--full` rebuild them whole.
+
+Every run writes data/run_report.json (see instrument.py): time, rows in
+and out and peak memory per stage, one entry per source file and output,
+and the date-parse tier counters. `--profile DIR` also dumps a cProfile
+file per stage, and runs one stage at a time (one profiler per process).
+
+Stages:
+    scan                 extract_and_fix_dates_downloads + extract_health_from_downloads
+    fix_subset           fix_subset_dates
+    nutrition_full_agg   export_nutrition_full_and_agg
+    nutrition_events     export_nutrition_events
+    entry_tokens         entry_tokens
+    rollup_cube          rollup_cube
+    final_daily          create_final_daily_csv
+    nutrition            create_nutrition_csv
+    nutrition_dmy        create_nutrition_dmy
+    store                health_store (only with --store)
+
+fix_dates_v2.py is not a stage: its input is not produced by any of these.
+
+Run: python scripts/pipeline.py [--workers N] [--jobs N] [--force] [--format parquet]
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import create_final_daily_csv as final_daily
+import create_nutrition_csv as nutrition
+import create_nutrition_dmy as nutrition_dmy
+import daily_agg
+import daily_patch
+import date_engine
+import day_key
+import discover
+import entry_tokens
+import excel_reader
+import export_nutrition_events as events
+import export_nutrition_full_and_agg as full_agg
+import extract_and_fix_dates_downloads as dates
+import extract_health_from_downloads as raw
+import fix_subset_dates
+import health_store
+import instrument
+import month_partitions
+import parallel_scan
+import rollup_cube
+import scan_manifest
+import table_io
+from date_cache import DateParseCache
+from date_engine import FORMATS, parser_version
+from discover import add_discovery_args, discovery_options, iter_candidates
+from parallel_scan import add_scan_args, scan_options
+from scan_manifest import ScanManifest, file_sha1
+from table_io import FORMATS as TABLE_FORMATS, as_read, iter_table, read_columns, read_table, table_path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+STATE = REPO_ROOT / 'data' / 'cache' / 'pipeline_state.json'
+REPORT = REPO_ROOT / 'data' / 'run_report.json'
+
+class Stage:
+    def __init__(self, name, run, inputs=(), outputs=(), code=(), sources=False, files=()):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # other files the stage writes (not tables)
+        self.files = list(files)
+        # modules whose source is part of the fingerprint
+        self.code = list(code)
+        # whether the stage reads the Downloads sources
+        self.sources = sources
+
+
+class Context:
+    """Options and the frames produced so far in this run."""
+
+    def __init__(self, discover=None, scan=None, full=False, fmt='csv', export_csv=False, chunksize=None,
+                 patch=True):
+        self.discover = discover or {}
+        self.scan = scan or {}
+        self.full = full
+        # re-aggregate only the changed days of the daily tables (see daily_patch.py)
+        self.patch = patch
+        self.fmt = fmt
+        # stream the daily rollups in chunks of this many rows
+        self.chunksize = chunksize
+        # formats every table is written in
+        self.formats = (fmt, 'csv') if export_csv and fmt != 'csv' else (fmt,)
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def path(self, path):
+        """Where the table a script writes to `path` is kept in this run."""
+        return table_path(path, self.fmt)
+
+    def put(self, outputs):
+        for path, df in outputs.items():
+            if df is not None:
+                df = as_read(df)
+                with self.lock:
+                    self.frames[path] = df
+
+    def frame(self, path, columns=None):
+        """The frame for `path`: from this run if a stage produced it, else read
+        from disk; None if the file does not exist.
+
+        `columns` is passed to `read_table` to read only some columns.
+        """
+        with self.lock:
+            df = self.frames.get(path)
+        if df is not None:
+            if callable(columns):
+                columns = columns(list(df.columns))
+            if columns is not None:
+                df = df[[c for c in df.columns if c in set(columns)]]
+            # stages add helper columns to the frames they are given
+            df = df.copy(deep=False)
+        else:
+            path = self.path(path)
+            if not path.exists():
+                return None
+            print('Loading', path)
+            df = read_table(path, columns)
+        instrument.count('rows_in', len(df))
+        return df
+
+    def columns(self, path):
+        """Column names of the table for `path`, or None if it does not exist."""
+        with self.lock:
+            df = self.frames.get(path)
+        if df is not None:
+            return list(df.columns)
+        path = self.path(path)
+        if not path.exists():
+            return None
+        return read_columns(path)
+
+    def chunks(self, path, columns=None):
+        """Yield the frame for `path` in chunks of `self.chunksize` rows."""
+        with self.lock:
+            df = self.frames.get(path)
+        if df is None:
+            print('Streaming', self.path(path))
+            for chunk in iter_table(self.path(path), self.chunksize, columns):
+                instrument.count('rows_in', len(chunk))
+                yield chunk
+            return
+        if callable(columns):
+            columns = columns(list(df.columns))
+        if columns is not None:
+            df = df[[c for c in df.columns if c in set(columns)]]
+        for start in range(0, max(len(df), 1), self.chunksize):
+            chunk = df.iloc[start:start + self.chunksize].copy(deep=False)
+            instrument.count('rows_in', len(chunk))
+            yield chunk
+
+    def source_signature(self):
+        h = hashlib.sha1(repr(sorted(self.discover.items())).encode())
+        for p in iter_candidates(**self.discover):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            h.update(f'{p}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode())
+        return h.hexdigest()
+
+
+def run_scan(ctx):
+    manifest = ScanManifest(dates.MANIFEST, dates.EXTRACT_DIR,
+                            parser_version(dates.normalize_date_value, ('ordinals', 'trim', 'float'), FORMATS),
+                            reset=ctx.full)
+    with instrument.stage('find_and_process'), DateParseCache(dates.DATE_CACHE) as cache:
+        entries = list(dates.iter_loaded(cache, manifest=manifest, **ctx.scan, **ctx.discover))
+    manifest.save()
+    print('Date cache hits=', cache.hits, 'misses=', cache.misses)
+    print('Manifest reused=', manifest.reused, 'files; re-read=', manifest.recorded)
+    return save_scan(ctx, entries)
+
+
+def save_scan(ctx, entries):
+    """Write both scanners' outputs from `iter_loaded` entries; return the
+    scan stage's frames."""
+    with instrument.stage('save_outputs'):
+        merged, clean = dates.save_outputs(*dates.collect(entries), formats=ctx.formats)
+    with instrument.stage('normalize_and_save'):
+        raw_entries = [(p, raw_view(loaded)) for p, loaded in entries]
+        merged_raw, clean_raw = raw.normalize_and_save(*raw.collect(raw_entries), ctx.formats)
+    return {dates.OUT_MERGED: merged, dates.OUT_CLEAN: clean,
+            raw.MERGED_CSV: merged_raw, raw.MERGED_CLEAN: clean_raw}
+
+
+def raw_view(loaded):
+    """What extract_health_from_downloads keeps of a file the dates scanner
+    loaded: its first matching sheet, without Date_normalized.
+
+    Only a workbook whose first matching sheet cannot be read comes out
+    differently from running that script.
+    """
+    for s, reason, df in loaded[:1]:
+        if reason == 'sheet matched':
+            reason = 'sheet name contains health' if 'health' in s.lower() else 'sheet header matched expected columns'
+        return [(s, reason, df.drop(columns=['Date_normalized']))]
+    return []
+
+
+def run_fix_subset(ctx):
+    df = ctx.frame(fix_subset_dates.IN_FILE)
+    if df is None or 'Date' not in df.columns:
+        print('No `Date` column found in', fix_subset_dates.IN_FILE)
+        return {}
+    with DateParseCache(fix_subset_dates.DATE_CACHE) as cache:
+        df, bad = fix_subset_dates.fix_dates(df, cache)
+    fix_subset_dates.save(df, bad, ctx.formats)
+    return {fix_subset_dates.OUT_FILE: df}
+
+
+def nutrition_columns(names):
+    """The columns of the merged file the nutrition exports look at."""
+    lows = {c.lower(): c for c in names}
+    if 'nutrition' not in lows and 'exercise' not in lows:
+        # export_nutrition_events then looks at every column
+        return None
+    wanted = {'Date_normalized', 'Date', 'source_file', 'source_sheet'}
+    wanted |= {lows[k] for k in ('weight', 'nutrition', 'exercise') if k in lows}
+    return [c for c in names if c in wanted]
+
+
+def run_full_agg(ctx):
+    if ctx.chunksize:
+        if ctx.columns(full_agg.IN_FILE) is None:
+            return {}
+        agg = full_agg.build_streaming(ctx.chunks(full_agg.IN_FILE, nutrition_columns), ctx.formats)
+        if agg is None:
+            return {}
+        full_agg.save(None, agg, ctx.formats)
+        return {full_agg.OUT_AGG: agg}
+    df = ctx.frame(full_agg.IN_FILE, nutrition_columns)
+    patch = full_agg.daily_patch(ctx.patch)
+    out = full_agg.build(df, patch) if df is not None else None
+    if out is None:
+        return {}
+    full_agg.save(*out, ctx.formats)
+    patch.save()
+    return {full_agg.OUT_FULL: out[0], full_agg.OUT_AGG: out[1]}
+
+
+def run_events(ctx):
+    df = ctx.frame(events.IN_FILE, nutrition_columns)
+    out = events.build(df) if df is not None else None
+    if out is None:
+        return {}
+    events.save(out, ctx.formats)
+    return {events.OUT_FILE: out}
+
+
+def run_entry_tokens(ctx):
+    df = ctx.frame(events.OUT_FILE, ['Date'] + entry_tokens.COLUMNS)
+    out = entry_tokens.build(df) if df is not None else None
+    if out is None:
+        return {}
+    entry_tokens.save(*out, ctx.formats)
+    return {entry_tokens.OUT_TOKENS: out[0], entry_tokens.OUT_VOCABULARY: out[1]}
+
+
+def run_rollup_cube(ctx):
+    df = ctx.frame(rollup_cube.IN_FILE)
+    patches = rollup_cube.level_patches(ctx.patch)
+    cube = rollup_cube.build(df, patches) if df is not None else None
+    if cube is None:
+        return {}
+    rollup_cube.save(cube, ctx.formats)
+    for patch in patches.values():
+        patch.save()
+    return {rollup_cube.OUT_FILE: cube}
+
+
+def run_final_daily(ctx):
+    if ctx.chunksize:
+        found = final_daily.find_input(ctx.columns)
+        if found is None:
+            return {}
+        path, (date_col, food_col, ex_col, fmt) = found
+        chunks = ctx.chunks(path, [date_col, food_col, ex_col])
+        agg = final_daily.build_streaming(chunks, date_col, food_col, ex_col, fmt)
+    else:
+        loaded = final_daily.load(ctx.frame, ctx.columns)
+        if loaded is None:
+            return {}
+        df, date_col, food_col, ex_col, fmt = loaded
+        patch = final_daily.daily_patch(food_col, ex_col, ctx.patch)
+        agg = final_daily.build(df, date_col, food_col, ex_col, fmt, patch)
+        patch.save()
+    final_daily.save(agg, ctx.formats)
+    return {final_daily.OUT: agg}
+
+
+def run_nutrition(ctx):
+    df = ctx.frame(nutrition.IN_FILE)
+    out = nutrition.build(df) if df is not None else None
+    if out is None:
+        return {}
+    nutrition.save(out, ctx.formats)
+    return {nutrition.OUT_FILE: out}
+
+
+def run_nutrition_dmy(ctx):
+    df = ctx.frame(nutrition_dmy.IN_FILE)
+    out = nutrition_dmy.build(df) if df is not None else None
+    if out is None:
+        return {}
+    nutrition_dmy.save(out, ctx.formats)
+    return {nutrition_dmy.OUT_FILE: out}
+
+
+SCAN_CODE = [dates, raw, date_engine, discover, excel_reader, month_partitions, parallel_scan, scan_manifest]
+
+STAGES = [
+    Stage('scan', run_scan,
+          outputs=[dates.OUT_MERGED, dates.OUT_CLEAN, raw.MERGED_CSV, raw.MERGED_CLEAN],
+          files=[month_partitions.dataset_dir(dates.OUT_MERGED) / month_partitions.MANIFEST_NAME],
+          code=SCAN_CODE, sources=True),
+    Stage('fix_subset', run_fix_subset,
+          inputs=[fix_subset_dates.IN_FILE], outputs=[fix_subset_dates.OUT_FILE],
+          code=[fix_subset_dates, date_engine]),
+    Stage('nutrition_full_agg', run_full_agg,
+          inputs=[full_agg.IN_FILE], outputs=[full_agg.OUT_FULL, full_agg.OUT_AGG],
+          code=[full_agg, daily_agg, daily_patch, day_key]),
+    Stage('nutrition_events', run_events,
+          inputs=[events.IN_FILE], outputs=[events.OUT_FILE],
+          code=[events, day_key]),
+    Stage('entry_tokens', run_entry_tokens,
+          inputs=[events.OUT_FILE], outputs=[entry_tokens.OUT_TOKENS, entry_tokens.OUT_VOCABULARY],
+          code=[entry_tokens]),
+    Stage('rollup_cube', run_rollup_cube,
+          inputs=[rollup_cube.IN_FILE], outputs=[rollup_cube.OUT_FILE],
+          code=[rollup_cube, entry_tokens, daily_agg, daily_patch, day_key]),
+    # BACK1/BACK2 are only read when there are no events
+    Stage('final_daily', run_final_daily,
+          inputs=[final_daily.PRIM, final_daily.BACK1, final_daily.BACK2], outputs=[final_daily.OUT],
+          code=[final_daily, daily_agg, daily_patch, day_key]),
+    Stage('nutrition', run_nutrition,
+          inputs=[nutrition.IN_FILE], outputs=[nutrition.OUT_FILE],
+          code=[nutrition, day_key]),
+    Stage('nutrition_dmy', run_nutrition_dmy,
+          inputs=[nutrition_dmy.IN_FILE], outputs=[nutrition_dmy.OUT_FILE],
+          code=[nutrition_dmy, day_key]),
+]
+
+
+def run_store(ctx):
+    df = ctx.frame(dates.OUT_MERGED)
+    if df is None:
+        print('Input not found:', dates.OUT_MERGED)
+        return {}
+    print('Stored', health_store.load(df), 'rows in', health_store.STORE)
+    return {}
+
+
+# only with --store
+STORE_STAGE = Stage('store', run_store, inputs=[dates.OUT_MERGED], files=[health_store.STORE],
+                    code=[health_store, full_agg, day_key, daily_agg])
+
+
+def dependencies(stages):
+    """{stage name: names of the stages that write its inputs}"""
+    producers = {p: s.name for s in stages for p in s.outputs}
+    return {s.name: {producers[p] for p in s.inputs if p in producers and producers[p] != s.name}
+            for s in stages}
+
+
+def fingerprint(stage, ctx):
+    h = hashlib.sha1(repr((stage.name, ctx.formats)).encode())
+    # the stage wrappers live here
+    for path in [m.__file__ for m in stage.code] + [table_io.__file__, __file__]:
+        h.update(Path(path).read_bytes())
+    for p in map(ctx.path, stage.inputs):
+        h.update(str(p).encode())
+        h.update(file_sha1(p).encode() if p.exists() else b'missing')
+    if stage.sources:
+        h.update(ctx.source_signature().encode())
+    return h.hexdigest()
+
+
+def load_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+
+def run_stage(stage, ctx, previous, force):
+    """Run `stage` unless it is up to date; return (fingerprint, ran)."""
+    fp = fingerprint(stage, ctx)
+    if (not force and previous == fp and all(table_path(p, f).exists() for p in stage.outputs for f in ctx.formats)
+            and all(p.exists() for p in stage.files)):
+        print(f'Up to date: {stage.name}')
+        return fp, False
+    print(f'Running: {stage.name}')
+    with instrument.stage(stage.name) as st:
+        outputs = stage.run(ctx)
+        st['rows_out'] = {p.name: len(df) for p, df in outputs.items() if df is not None}
+    ctx.put(outputs)
+    return fp, True
+
+
+def run(stages, ctx, state, jobs=None, force=False):
+    """Run `stages` as their dependencies complete; update `state` in place.
+
+    Returns {stage name: 'ran' | 'up to date' | 'failed' | 'skipped'}.
+    """
+    deps = dependencies(stages)
+    pending = {s.name: s for s in stages}
+    status = {}
+    running = {}
+    with ThreadPoolExecutor(jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                if any(status.get(d) in ('failed', 'skipped') for d in deps[name]):
+                    print('Skipped (dependency failed):', name)
+                    status[name] = 'skipped'
+                    del pending[name]
+                elif all(d in status for d in deps[name]):
+                    stage = pending.pop(name)
+                    running[pool.submit(run_stage, stage, ctx, state.get(name), force)] = name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    fp, ran = future.result()
+                except Exception:
+                    print('Stage failed:', name)
+                    traceback.print_exc()
+                    status[name] = 'failed'
+                    state.pop(name, None)
+                    continue
+                state[name] = fp
+                status[name] = 'ran' if ran else 'up to date'
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_discovery_args(parser)
+    add_scan_args(parser)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='stages to run at the same time (default: as many as are ready)')
+    parser.add_argument('--force', action='store_true', help='run every stage even if it is up to date')
+    parser.add_argument('--full', action='store_true', help='ignore the scan manifest and re-read every file')
+    parser.add_argument('--format', choices=TABLE_FORMATS, default='csv',
+                        help='format of the tables written under data/ (default: csv)')
+    parser.add_argument('--export-csv', action='store_true',
+                        help='with a columnar --format, also write every table as CSV')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the daily rollups in chunks of this many rows')
+    parser.add_argument('--profile', type=Path, default=None, metavar='DIR',
+                        help='write a cProfile .prof file per stage into DIR (implies --jobs 1)')
+    parser.add_argument('--store', action='store_true',
+                        help='also load the rows into data/health.sqlite (see health_store.py)')
+    args = parser.parse_args()
+    discover_opts = discovery_options(args)
+    discover_opts['root'] = discover_opts['root'] or dates.DOWNLOADS
+    ctx = Context(discover_opts, scan_options(args), full=args.full, fmt=args.format, export_csv=args.export_csv,
+                  chunksize=args.chunksize, patch=not (args.force or args.full))
+    state = load_state(STATE)
+    with instrument.RunReport('pipeline', args.profile) as report:
+        stages = STAGES + [STORE_STAGE] if args.store else STAGES
+        # only one cProfile profiler can be enabled at a time
+        jobs = 1 if args.profile else args.jobs
+        status = run(stages, ctx, state, jobs=jobs, force=args.force)
+    save_state(STATE, state)
+    print('Wrote run report to', report.save(REPORT))
+    for name, result in status.items():
+        print(f'{name}: {result}')
+    if any(result in ('failed', 'skipped') for result in status.values()):
+        raise SystemExit(1)
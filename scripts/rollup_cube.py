@@ -0,0 +1,181 @@
+"""Roll the nutrition and exercise entries up by day, ISO week and month.
+
+Reads `data/nutrition_full_rows.csv` and writes `data/rollup_cube.csv`, one
+row per (level, period, column, item, unit):
+
+- level: day, week or month; period: `2025-09-24`, `2025-W39` or `2025-09`;
+  start: the first day of the period (YYYY-MM-DD)
+- column: Nutrition or Exercise; item: the entry's item as interned by
+  entry_tokens.py (lowercased, spaces collapsed); unit: `l`, `x`, ... or empty
+- quantity: sum of the entries' quantities (`100 Bicep Curls` counts 100;
+  entries without a number are left out), NaN if none had one
+- entries: number of entries
+- weight: the last non-empty Weight of the period's latest day that has
+  one (the last in file order within that day)
+
+Each period also has a total row with an empty column and item: all its
+entries and its weight, so periods with a weight and no entries are there
+too. "Bicep curls per week" is then a lookup of the rows for one item:
+
+    python scripts/rollup_cube.py query --level week --item 'bicep curls'
+    python scripts/rollup_cube.py query --level month --item 'electrolyte drink' --from 2025-06
+
+Every level is a per-period table kept up to date by a DailyPatch (see
+daily_patch.py) keyed by the period's first day: when the rows change,
+only the days, weeks and months they fall in are tokenized and
+aggregated again.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import daily_agg
+import day_key
+import entry_tokens
+from daily_patch import DailyPatch, code_version
+from export_nutrition_full_and_agg import EMPTY
+from table_io import read_table, write_table
+
+ROOT = Path(__file__).resolve().parents[1]
+IN_FILE = ROOT / 'data' / 'nutrition_full_rows.csv'
+OUT_FILE = ROOT / 'data' / 'rollup_cube.csv'
+PATCH_DIR = ROOT / 'data' / 'cache'
+
+# level: (label format, day key of the period's first day)
+LEVELS = {
+    'day': ('%Y-%m-%d', lambda keys: keys),
+    'week': ('%G-W%V', day_key.week_start),
+    'month': ('%Y-%m', day_key.month_start),
+}
+COLUMNS = ['Weight', 'Nutrition', 'Exercise']
+CUBE_COLUMNS = ['level', 'period', 'start', 'column', 'item', 'unit', 'quantity', 'entries', 'weight']
+
+
+def aggregate(keys, rows):
+    """Cube rows of `rows` by the period keys `keys` (NA keys are dropped),
+    sorted by period, then total row first, column, item and unit."""
+    valid = keys.notna().to_numpy()
+    keys = keys[valid].reset_index(drop=True)
+    rows = rows[valid].reset_index(drop=True)
+    periods = daily_agg.aggregate(keys, rows, last=['Weight'], empty=EMPTY, key_name='Period')
+    tokens, vocabulary = entry_tokens.tokenize(rows, [c for c in entry_tokens.COLUMNS if c in rows.columns])
+    tokens['Period'] = keys.array.take(tokens['event'].to_numpy())
+    totals = tokens.groupby('Period').size()
+    tokens = tokens[tokens['item_id'].notna()]
+    tokens['unit'] = tokens['unit'].fillna('')
+    groups = tokens.groupby(['Period', 'column', 'item_id', 'unit'], sort=False)
+    cells = groups['quantity'].sum(min_count=1).to_frame()
+    cells['entries'] = groups.size()
+    cells = cells.reset_index()
+    cells['item'] = entry_tokens.item_key(vocabulary['item']).array.take(cells['item_id'].to_numpy(dtype='int64'))
+    total = pd.DataFrame({'Period': periods['Period'], 'column': '', 'item': '', 'unit': '', 'quantity': np.nan,
+                          'entries': periods['Period'].map(totals).fillna(0).astype('int64').to_numpy()})
+    cube = pd.concat([total, cells.drop(columns='item_id')], ignore_index=True)
+    cube = cube.astype({'column': 'str', 'item': 'str', 'unit': 'str', 'quantity': 'float64', 'entries': 'int64'})
+    cube['weight'] = cube['Period'].map(periods.set_index('Period')['Weight'])
+    return cube.sort_values(['Period', 'column', 'item', 'unit'], kind='stable', ignore_index=True)
+
+
+def level_patches(enabled=True):
+    """{level: the DailyPatch that lets `build` re-aggregate only its changed periods}"""
+    version = code_version([daily_agg.__file__, day_key.__file__, entry_tokens.__file__, __file__])
+    return {level: DailyPatch(PATCH_DIR / f'patch_rollup_{level}.pkl', version, enabled) for level in LEVELS}
+
+
+def build(full, patches=None):
+    """Return the cube of the full rows frame, or None without a Date column.
+
+    With `patches` (see level_patches), only the periods whose rows changed
+    since their last build are aggregated again.
+    """
+    if 'Date' not in full.columns:
+        print('No Date column found')
+        return None
+    keys = day_key.parse(full['Date'], '%Y-%m-%d')
+    undated = int(keys.isna().sum())
+    if undated:
+        print('Left out', undated, 'rows whose Date is not YYYY-MM-DD')
+    # rows in date order (stable within a day), so a period's last weight is
+    # the one of its latest day, not of whichever source file came last
+    order = np.argsort(keys.to_numpy(dtype='float64', na_value=np.inf), kind='stable')
+    keys = keys.take(order).reset_index(drop=True)
+    frame = full[[c for c in COLUMNS if c in full.columns]].take(order).reset_index(drop=True)
+    levels = []
+    for level, (fmt, start) in LEVELS.items():
+        period_keys = start(keys)
+        if patches is None:
+            cube = aggregate(period_keys, frame)
+        else:
+            cube = patches[level].build(period_keys, frame, aggregate, 'Period')
+        cube = cube.copy()
+        cube['start'] = day_key.to_text(cube['Period'], '%Y-%m-%d')
+        cube['period'] = day_key.to_text(cube.pop('Period'), fmt)
+        cube['level'] = level
+        levels.append(cube)
+    return pd.concat(levels, ignore_index=True)[CUBE_COLUMNS]
+
+
+def save(cube, formats=('csv',)):
+    for path in write_table(cube, OUT_FILE, formats):
+        print('Saved rollup cube to', path, 'shape=', cube.shape)
+
+
+def load_cube(path=OUT_FILE):
+    """The cube at `path`, indexed by (level, item, period) for lookups."""
+    cube = read_table(path)
+    cube[['column', 'item', 'unit']] = cube[['column', 'item', 'unit']].fillna('')
+    for name in ('quantity', 'entries'):
+        cube[name] = pd.to_numeric(cube[name])
+    return cube.set_index(['level', 'item', 'period']).sort_index()
+
+
+def lookup(cube, level, item=None, start=None, end=None):
+    """The cube rows of `level` for `item` (None: the period totals) with
+    periods from `start` to `end` inclusive, given as period labels."""
+    item = '' if item is None else entry_tokens.item_key([item])[0]
+    try:
+        rows = cube.loc[(level, item)]
+    except KeyError:
+        return cube.iloc[:0].reset_index()[CUBE_COLUMNS]
+    rows = rows.loc[start:end] if start or end else rows
+    return rows.reset_index().assign(level=level, item=item)[CUBE_COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help=f'build {OUT_FILE.name} from {IN_FILE.name}')
+    q = commands.add_parser('query', help='print the rows of one item (or the period totals) at one level')
+    q.add_argument('--level', choices=list(LEVELS), default='day')
+    q.add_argument('--item', default=None, help="item, any case, e.g. 'bicep curls' (default: period totals)")
+    q.add_argument('--from', dest='start', help='first period, inclusive (e.g. 2025-09-01, 2025-W36, 2025-09)')
+    q.add_argument('--to', dest='end', help='last period, inclusive')
+    q.add_argument('--csv', action='store_true', help='print CSV instead of a table')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        if not IN_FILE.exists():
+            print('Input not found:', IN_FILE)
+            return
+        print('Loading', IN_FILE)
+        cube = build(read_table(IN_FILE))
+        if cube is not None:
+            save(cube)
+        return
+
+    if not OUT_FILE.exists():
+        print('No cube at', OUT_FILE, '- run: python scripts/rollup_cube.py build')
+        return
+    out = lookup(load_cube(), args.level, args.item, args.start, args.end)
+    if args.csv:
+        out.to_csv(sys.stdout, index=False)
+    else:
+        print(out.fillna('').to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Persistent manifest of scanned source files.
+
+For every candidate file under Downloads the manifest records its size,
+mtime and content hash, whether it was included, and for each included
+sheet the reason it matched and a cached extract (the frame the scanner
+built from it, pickled under the cache directory). On the next run a file
+whose size and mtime are unchanged -- or whose content hash is unchanged
+after a touch -- is served from its extracts instead of being reopened.
+
+The manifest is a JSON file next to the extracts:
+
+    {"version": "...", "files": {"<path>": {"size": ..., "mtime_ns": ...,
+      "sha1": "...", "include": true, "reason": "...",
+      "sheets": [{"sheet": "Health", "reason": "sheet matched",
+                  "extract": "<sha1>-0.pkl"}]}}}
+
+`version` identifies the code that produced the extracts; a different
+version discards every entry.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+
+def file_sha1(path, block=1024 * 1024):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ScanManifest:
+    def __init__(self, path, extract_dir, version='', reset=False):
+        self.path = Path(path)
+        self.extract_dir = Path(extract_dir)
+        self.version = version
+        self.files = {}
+        self.reused = 0
+        self.recorded = 0
+        if self.path.exists() and not reset:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == version:
+                    self.files = data.get('files', {})
+            except Exception:
+                print('Ignoring unreadable manifest', self.path)
+
+    def lookup(self, p):
+        """Return the manifest entry for `p` if the file is unchanged, else None."""
+        entry = self.files.get(str(p))
+        if entry is None:
+            return None
+        st = p.stat()
+        if entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry if self.extracts_present(entry) else None
+        if entry['size'] != st.st_size or file_sha1(p) != entry['sha1']:
+            return None
+        # touched but identical content
+        entry['mtime_ns'] = st.st_mtime_ns
+        return entry if self.extracts_present(entry) else None
+
+    def extracts_present(self, entry):
+        return all((self.extract_dir / s['extract']).exists() for s in entry['sheets'])
+
+    def load(self, p, entry):
+        """Return [(sheet, reason, df)] from the cached extracts of `p`."""
+        self.reused += 1
+        loaded = []
+        for s in entry['sheets']:
+            df = pd.read_pickle(self.extract_dir / s['extract'])
+            if 'source_file' in df.columns:
+                df['source_file'] = str(p)
+            loaded.append((s['sheet'], s['reason'], df))
+        return loaded
+
+    def record(self, p, loaded, skip_reason='no matching sheet or header'):
+        """Store the classification of `p` and an extract per included sheet."""
+        st = p.stat()
+        digest = file_sha1(p)
+        self.extract_dir.mkdir(parents=True, exist_ok=True)
+        sheets = []
+        for i, (sheet, reason, df) in enumerate(loaded):
+            name = f'{digest}-{i}.pkl'
+            df.to_pickle(self.extract_dir / name)
+            sheets.append({'sheet': sheet, 'reason': reason, 'extract': name})
+        self.files[str(p)] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha1': digest,
+            'include': bool(sheets),
+            'reason': sheets[0]['reason'] if sheets else skip_reason,
+            'sheets': sheets,
+        }
+        self.recorded += 1
+
+    def prune(self, seen):
+        """Forget files that were not seen on this run and unused extracts."""
+        seen = {str(p) for p in seen}
+        for key in [k for k in self.files if k not in seen]:
+            del self.files[key]
+        used = {s['extract'] for e in self.files.values() for s in e['sheets']}
+        if self.extract_dir.exists():
+            for f in self.extract_dir.glob('*.pkl'):
+                if f.name not in used:
+                    f.unlink()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'files': self.files}, f, indent=2)
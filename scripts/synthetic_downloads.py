@@ -0,0 +1,161 @@
+"""Build a synthetic Downloads tree for benchmarking the scanners.
+
+The tree looks like the real one the scanners are pointed at:
+
+- `health_*.csv` files (included by name) and `log_*.csv` files with a
+  Date/Weight/Nutrition/Exercise header (included by header),
+- `notes_*.csv` files without any expected column (skipped),
+- workbooks with `Health` and `Health 2` sheets (included by sheet name),
+  workbooks whose only match is a `Log` sheet header, and filler `Misc`
+  sheets,
+
+spread over a few nested directories. Date cells mix the encodings the
+date scripts handle: real Excel dates, serials (`45909`, `45909.0`),
+ordinals (`24th Sep 2025`), ISO, day-first and month-first text. Each sheet
+sticks to one text convention, as real sheets do.
+
+Usage:
+    python scripts/synthetic_downloads.py /tmp/downloads --rows 100000
+"""
+
+import argparse
+import csv
+import datetime
+import random
+from pathlib import Path
+
+ROWS_PER_FILE = 2000
+START = datetime.date(2019, 1, 1)
+
+FOODS = ['Oats with milk', '2 Eggs', 'Electrolyte Drink', '2 Electrolyte Drink', 'Chicken Rice',
+         'Greek Yogurt', 'Banana', 'Apple', 'Protein Shake', 'Dal and Roti', 'Paneer Tikka',
+         'Salad', 'Black Coffee', 'Almonds 30g', 'Idli Sambar', 'Dosa', 'Fish Curry', 'Curd Rice']
+EXERCISES = ['10000 steps', '100 Bicep Curls', '80 Shoulder Press', '60 Bicep Curls', '5k run',
+             '30 min cycling', '50 Push ups', 'Yoga 20 min', '3x12 Squats', 'Swim 1km']
+HEADER = ['Date', 'Weight', 'Nutrition', 'Exercise', 'Sleep', 'Notes']
+
+# text conventions a sheet can use for its dates
+TEXT_STYLES = ['dmy', 'mdy', 'iso', 'ordinal', 'dmy_dash', 'long']
+EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+
+def ordinal(n):
+    if 10 <= n % 100 <= 20:
+        return f'{n}th'
+    return f'{n}' + {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+
+
+def date_text(d, style):
+    if style == 'dmy':
+        return d.strftime('%d/%m/%Y')
+    if style == 'mdy':
+        return d.strftime('%m/%d/%Y')
+    if style == 'iso':
+        return d.isoformat()
+    if style == 'ordinal':
+        return f'{ordinal(d.day)} {d.strftime("%b %Y")}'
+    if style == 'dmy_dash':
+        return d.strftime('%d-%m-%Y')
+    return d.strftime('%d %B %Y')
+
+
+def date_cell(rng, d, style, excel):
+    """One date cell: mostly the sheet's text style, some serials, and real
+    dates in workbooks."""
+    r = rng.random()
+    serial = (d - EXCEL_EPOCH).days
+    if r < 0.03:
+        return None
+    if r < 0.13:
+        return serial if excel else str(serial)
+    if r < 0.18:
+        return f'{serial}.0'
+    if excel and r < 0.6:
+        return datetime.datetime(d.year, d.month, d.day)
+    return date_text(d, style)
+
+
+def rows_for(rng, n, excel):
+    style = rng.choice(TEXT_STYLES)
+    day = START + datetime.timedelta(days=rng.randrange(0, 2000))
+    rows = []
+    for _ in range(n):
+        # a few entries per day, days mostly in order
+        if rng.random() < 0.4:
+            day += datetime.timedelta(days=1)
+        food = ' | '.join(rng.sample(FOODS, rng.randint(1, 3))) if rng.random() < 0.7 else None
+        exercise = rng.choice(EXERCISES) if rng.random() < 0.4 else None
+        weight = round(rng.uniform(118, 135), 1) if rng.random() < 0.3 else None
+        sleep = rng.choice(['7h', '6.5', '8', None, None])
+        rows.append([date_cell(rng, day, style, excel), weight, food, exercise, sleep, None])
+    return rows
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+def write_workbook(path, sheets):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    for name, header, rows in sheets:
+        ws = wb.create_sheet(name)
+        ws.append(header)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+
+def generate(root, rows=10000, rows_per_file=ROWS_PER_FILE, seed=0):
+    """Write a tree with about `rows` data rows under `root`; return a
+    summary dict (files written, included data rows)."""
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    files = 0
+    written = 0
+    i = 0
+    while written < rows:
+        i += 1
+        n = min(rows_per_file, rows - written)
+        folder = root / f'dir{i % 7}' / ('archive' if i % 5 == 0 else '')
+        folder.mkdir(parents=True, exist_ok=True)
+        kind = i % 5
+        if kind == 0:
+            write_csv(folder / f'health_{i}.csv', HEADER[:4], [r[:4] for r in rows_for(rng, n, False)])
+        elif kind == 1:
+            write_csv(folder / f'log_{i}.csv', HEADER, rows_for(rng, n, False))
+        elif kind == 2:
+            first = n * 3 // 4
+            write_workbook(folder / f'Tracker_{i}.xlsx', [
+                ('Health', HEADER, rows_for(rng, first, True)),
+                ('Health 2', HEADER[:4], [r[:4] for r in rows_for(rng, n - first, True)]),
+                ('Misc', ['a', 'b'], [[j, j * 2] for j in range(20)]),
+            ])
+        elif kind == 3:
+            write_workbook(folder / f'Hobby_{i}.xlsx', [
+                ('Misc', ['Title', 'Author'], [['Book', 'Someone']] * 20),
+                ('Log', HEADER, rows_for(rng, n, True)),
+            ])
+        else:
+            write_csv(folder / f'health_log_{i}.csv', HEADER, rows_for(rng, n, False))
+        # files the scanners look at and skip
+        if i % 3 == 0:
+            write_csv(folder / f'notes_{i}.csv', ['title', 'text'], [['note', 'x']] * 50)
+        files += 1 + (i % 3 == 0)
+        written += n
+    return {'files': files, 'rows': written}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', type=Path, help='directory to write the tree into')
+    parser.add_argument('--rows', type=int, default=10000, help='total data rows across all files')
+    parser.add_argument('--rows-per-file', type=int, default=ROWS_PER_FILE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.root, args.rows, args.rows_per_file, args.seed))
@@ -0,0 +1,332 @@
+"""Read and write the data/ tables as CSV, Parquet or Feather.
+
+The CSVs under data/ are read back as strings (see csv_reader.py) and every
+reader re-parses the dates in them. `write_table` can store a table in a
+typed columnar format instead (via pyarrow):
+
+- columns named like a date whose values are all `%Y-%m-%d` or
+  `%d-%m-%Y` strings are stored as dates (date32),
+- numeric columns (Weight, Day/Month/Year, ...) are stored as float64,
+- `source_file` / `source_sheet` are dictionary encoded,
+- everything else is stored as strings.
+
+A column is only typed when its strings can be reproduced exactly; the
+format of each typed column is kept in the file's schema metadata, so
+`read_table(path)` returns the same string frame for every format, and
+`read_table(path, typed=True)` the typed one. `columns` reads only some
+of the columns. CSV stays the export format.
+
+`source_file` and `source_sheet` are categoricals in memory as well: every
+row names one of a few dozen sources by a small integer code instead of
+repeating a full path, and the strings are only written out with the
+table. The scanners encode their frames over the paths and sheets of their
+`sources` list (`encode_sources`), so the merged frame is one categorical
+per column; `as_read` and `read_table` keep them categorical.
+
+Large tables can be streamed: `iter_table` reads one in chunks and
+`TableWriter` writes one chunk by chunk. A columnar table written in
+chunks keeps every column as strings, since a column's type is only
+known once its last chunk has been seen.
+
+Usage:
+    for path in write_table(df, OUT_FILE, ('parquet', 'csv')):
+        print('Wrote', path)
+    df = read_table(table_path(OUT_FILE, 'parquet'), columns=['Date', 'Weight'])
+"""
+
+import io
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import csv_reader
+import instrument
+from csv_reader import NA_STRINGS
+
+FORMATS = ['csv', 'parquet', 'feather']
+SUFFIXES = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y']
+DICTIONARY_COLUMNS = ['source_file', 'source_sheet']
+META_KEY = b'table_io'
+
+# read_csv dtypes for streamed reads: strings, and categoricals for the dictionary columns
+CSV_DTYPE = defaultdict(lambda: str, {name: 'category' for name in DICTIONARY_COLUMNS})
+
+
+def table_path(path, fmt):
+    """`path` with the suffix of `fmt`."""
+    return path.with_suffix(SUFFIXES[fmt])
+
+
+def csv_columns(df):
+    """Column names of `df` as read_csv reads them back (strings, de-duplicated)."""
+    return pd.read_csv(io.StringIO(df.head(0).to_csv(index=False)), nrows=0).columns
+
+
+def as_read(df):
+    """`df` as `read_table` loads the CSV written from it.
+
+    Values become strings (categoricals of strings in DICTIONARY_COLUMNS),
+    NA-like strings become NaN and column names are de-duplicated the way
+    read_csv does.
+    """
+    if df.shape[1] == 0:
+        return df.reset_index(drop=True)
+    columns = csv_columns(df)
+    data = {}
+    for i, name in enumerate(columns):
+        s = df.iloc[:, i].reset_index(drop=True)
+        if name in DICTIONARY_COLUMNS:
+            data[name] = dictionary(s)
+            continue
+        s = s.astype(str).where(s.notna())
+        data[name] = s.mask(s.isin(NA_STRINGS))
+    return pd.DataFrame(data, columns=columns)
+
+
+def dictionary(s):
+    """`s` as a categorical of its values' strings, NA-like strings missing.
+    Only the categories are converted, not every row."""
+    values = s.astype('category')
+    text, uniques = pd.factorize(pd.Index(values.cat.categories.astype(str), dtype=object))
+    keep = ~pd.Index(uniques).isin(NA_STRINGS)
+    # new code of each category; code -1 (missing) takes the appended -1
+    codes = np.where(keep, np.cumsum(keep) - 1, -1)
+    codes = np.append(codes[text], -1)[values.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=pd.Index(uniques[keep], dtype='str')),
+                     index=s.index, name=s.name)
+
+
+def encode_sources(frames, sources):
+    """`frames` with source_file and source_sheet as categoricals over the
+    paths and sheets of the scanner's `sources` list (dicts with 'path' and
+    'sheet'), so that they concatenate without decoding."""
+    categories = {
+        'source_file': pd.Index(pd.unique(pd.Series([s['path'] for s in sources], dtype='str')), dtype='str'),
+        'source_sheet': pd.Index(pd.unique(pd.Series([s['sheet'] for s in sources], dtype='str')), dtype='str'),
+    }
+    encoded = []
+    for df in frames:
+        columns = {name: pd.Categorical(df[name], categories=cats)
+                   for name, cats in categories.items() if name in df.columns}
+        encoded.append(df.assign(**columns) if columns else df)
+    return encoded
+
+
+def format_float(value, style):
+    if style == 'short' and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def infer_type(name, s):
+    """Return ({'kind': ...} description, typed values) for a string column."""
+    codes, uniques = pd.factorize(s)
+    uniques = pd.Series(uniques, dtype=object)
+    if len(uniques):
+        if 'date' in str(name).lower():
+            for fmt in DATE_FORMATS:
+                parsed = pd.to_datetime(uniques, format=fmt, errors='coerce')
+                if parsed.notna().all() and (parsed.dt.strftime(fmt) == uniques).all():
+                    values = pd.Series(parsed.array.take(codes, allow_fill=True))
+                    return {'kind': 'date', 'format': fmt}, values
+        numbers = pd.to_numeric(uniques, errors='coerce').astype('float64')
+        if numbers.notna().all():
+            for style in ('repr', 'short'):
+                if all(format_float(n, style) == u for n, u in zip(numbers, uniques)):
+                    values = pd.Series(numbers.to_numpy().take(codes), dtype='float64').where(codes >= 0)
+                    return {'kind': 'float', 'style': style}, values
+    if name in DICTIONARY_COLUMNS:
+        return {'kind': 'dictionary'}, s.astype('category')
+    return {'kind': 'string'}, s
+
+
+def to_arrow(df, typed=True):
+    import pyarrow as pa
+
+    df = as_read(df)
+    arrays = []
+    kinds = {}
+    for name in df.columns:
+        if typed:
+            kind, values = infer_type(name, df[name])
+        else:
+            kind, values = {'kind': 'string'}, df[name]
+        kinds[name] = kind
+        if kind['kind'] == 'date':
+            arrays.append(pa.array(values.to_numpy().astype('datetime64[D]'), type=pa.date32()))
+        elif kind['kind'] == 'string':
+            arrays.append(pa.array(values.astype(object), type=pa.string(), from_pandas=True))
+        else:
+            arrays.append(pa.array(values, from_pandas=True))
+    table = pa.Table.from_arrays(arrays, names=list(df.columns))
+    return table.replace_schema_metadata({META_KEY: json.dumps(kinds).encode()})
+
+
+def from_arrow(table, typed=False):
+    kinds = json.loads((table.schema.metadata or {}).get(META_KEY, b'{}'))
+    df = table.to_pandas(date_as_object=False)
+    if typed:
+        return df
+    for name in df.columns:
+        kind = kinds.get(name, {'kind': 'string'})
+        s = df[name]
+        if kind['kind'] == 'date':
+            codes, uniques = pd.factorize(s)
+            text = pd.Series(pd.DatetimeIndex(uniques).strftime(kind['format'])).to_numpy(dtype=object)
+            df[name] = pd.Series(text.take(codes), dtype='str').where(codes >= 0)
+        elif kind['kind'] == 'float':
+            codes, uniques = pd.factorize(s)
+            text = pd.Series([format_float(u, kind['style']) for u in uniques], dtype=object).to_numpy()
+            df[name] = pd.Series(text.take(codes), dtype='str').where(codes >= 0)
+        elif name in DICTIONARY_COLUMNS:
+            df[name] = dictionary(s)
+        else:
+            df[name] = s.astype('str')
+    return df
+
+
+def write_table(df, path, formats=('csv',)):
+    """Write `df` to `path` in each of `formats`; return the paths written."""
+    written = []
+    for fmt in formats:
+        out = table_path(path, fmt)
+        if fmt == 'csv':
+            df.to_csv(out, index=False)
+        elif fmt == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(to_arrow(df), out, compression='zstd')
+        elif fmt == 'feather':
+            import pyarrow.feather as feather
+            feather.write_feather(to_arrow(df), out, compression='zstd')
+        else:
+            raise ValueError(f'unknown table format: {fmt}')
+        instrument.output(out, len(df))
+        written.append(out)
+    return written
+
+
+def read_columns(path):
+    """Column names of the table at `path`, without reading its rows."""
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        return csv_reader.read_header(path) or []
+    import pyarrow as pa
+    if suffix == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if suffix == '.feather':
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).schema.names
+    raise ValueError(f'unknown table format: {path}')
+
+
+def read_table(path, columns=None, typed=False):
+    """Read a table written by `write_table`; the format follows the suffix.
+
+    `columns` is a list of names or a function picking names from the
+    available ones; unknown names are ignored.
+    """
+    suffix = path.suffix.lower()
+    if callable(columns):
+        columns = columns(read_columns(path))
+    instrument.count('bytes_read', path.stat().st_size)
+    if suffix == '.csv':
+        return csv_reader.read_csv(path, columns, categorical=DICTIONARY_COLUMNS)
+    if columns is not None:
+        columns = [c for c in read_columns(path) if c in set(columns)]
+    if suffix == '.parquet':
+        import pyarrow.parquet as pq
+        return from_arrow(pq.read_table(path, columns=columns), typed=typed)
+    if suffix == '.feather':
+        import pyarrow.feather as feather
+        return from_arrow(feather.read_table(path, columns=columns, memory_map=True), typed=typed)
+    raise ValueError(f'unknown table format: {path}')
+
+
+def iter_table(path, chunksize, columns=None):
+    """Yield the frames `read_table(path, columns)` would return, in chunks
+    of at most `chunksize` rows (one empty frame for an empty table)."""
+    if callable(columns):
+        columns = columns(read_columns(path))
+    instrument.count('bytes_read', path.stat().st_size)
+    empty = True
+    for chunk in iter_chunks(path, chunksize, columns):
+        empty = False
+        yield chunk
+    if empty:
+        yield read_table(path, columns)
+
+
+def iter_chunks(path, chunksize, columns):
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        usecols = None if columns is None else set(columns).__contains__
+        with pd.read_csv(path, dtype=CSV_DTYPE, encoding='utf-8', usecols=usecols, chunksize=chunksize) as reader:
+            yield from reader
+        return
+    import pyarrow as pa
+    if columns is not None:
+        columns = [c for c in read_columns(path) if c in set(columns)]
+    if suffix == '.parquet':
+        import pyarrow.parquet as pq
+        source = pq.ParquetFile(path)
+        metadata = source.schema_arrow.metadata
+        batches = source.iter_batches(batch_size=chunksize, columns=columns)
+    elif suffix == '.feather':
+        source = pa.ipc.open_file(pa.memory_map(str(path)))
+        metadata = source.schema.metadata
+        batches = (b.slice(start, chunksize)
+                   for b in (source.get_batch(i) for i in range(source.num_record_batches))
+                   for start in range(0, b.num_rows, chunksize))
+        if columns is not None:
+            batches = (b.select(columns) for b in batches)
+    else:
+        raise ValueError(f'unknown table format: {path}')
+    for batch in batches:
+        yield from_arrow(pa.Table.from_batches([batch]).replace_schema_metadata(metadata))
+
+
+class TableWriter:
+    """Write a table chunk by chunk to `path` in each of `formats`."""
+
+    def __init__(self, path, formats=('csv',)):
+        self.paths = [table_path(path, fmt) for fmt in formats]
+        self.writers = {}
+        self.rows = 0
+        self.started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, df):
+        for path in self.paths:
+            if path.suffix == '.csv':
+                df.to_csv(path, mode='a' if self.started else 'w', header=not self.started, index=False)
+                continue
+            table = to_arrow(df, typed=False)
+            if path not in self.writers:
+                import pyarrow as pa
+                if path.suffix == '.parquet':
+                    import pyarrow.parquet as pq
+                    self.writers[path] = pq.ParquetWriter(path, table.schema, compression='zstd')
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression='zstd')
+                    self.writers[path] = pa.ipc.new_file(str(path), table.schema, options=options)
+            self.writers[path].write_table(table)
+        self.rows += len(df)
+        self.started = True
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        if self.started:
+            for path in self.paths:
+                instrument.output(path, self.rows)
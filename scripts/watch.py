@@ -0,0 +1,295 @@
+"""Keep the outputs under data/ up to date while files land in Downloads.
+
+The first pass loads every candidate file (unchanged ones come from the
+scan manifest's extracts) and keeps the loaded sheets in memory. After
+that only the files that changed are read again: each batch of changes
+replaces the entries of those files, re-writes the scanners' merged
+outputs from the entries in memory and runs the pipeline stages after the
+scan (see pipeline.py), which are skipped when their input came out the
+same. A new export is in final_daily_nutrition_exercise.csv a couple of
+seconds after it is written, without a rescan of the tree.
+
+Changes come from inotify when the `inotify_simple` package is installed
+(Linux); otherwise, or with `--poll`, the candidate files' sizes and mtimes
+are compared every `--interval` seconds. Changes are debounced: a batch is
+ingested once nothing has changed for `--settle` seconds, so a file still
+being copied or saved is read once, whole.
+
+A file is included by the same rules as the scanners (`load_file` in
+extract_and_fix_dates_downloads.py): a "health" file name, a "health"
+sheet name or a header with an expected column. Each batch writes
+data/run_report.json.
+
+Run: python scripts/watch.py [--root DIR] [--settle 2] [--poll] [--store]
+"""
+
+import argparse
+import time
+import traceback
+from pathlib import Path
+
+import extract_and_fix_dates_downloads as dates
+import instrument
+import pipeline
+from date_cache import DateParseCache
+from date_engine import FORMATS, parser_version
+from discover import add_discovery_args, discovery_options, is_candidate, iter_candidates, iter_directories
+from parallel_scan import add_scan_args, scan_options
+from pipeline import STAGES, STORE_STAGE, Context, Stage
+from scan_manifest import ScanManifest
+from table_io import FORMATS as TABLE_FORMATS
+
+POLL_SECONDS = 1.0
+SETTLE_SECONDS = 2.0
+
+SCAN_STAGE = STAGES[0]
+
+
+class PollingSource:
+    """Changes found by comparing the size and mtime of every candidate file
+    with the previous walk."""
+
+    def __init__(self, discover, interval=POLL_SECONDS):
+        # the size budget is applied when a file is ingested
+        self.discover = dict(discover, max_bytes=None)
+        self.interval = interval
+        self.snapshot = self.take()
+
+    def take(self):
+        snapshot = {}
+        for p in iter_candidates(**self.discover):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            snapshot[p] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def changes(self, timeout=None):
+        """Paths added, changed or removed; waits up to `timeout` seconds
+        (forever with None) and returns an empty set if there are none."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.take()
+            changed = {p for p in snapshot.keys() | self.snapshot.keys() if snapshot.get(p) != self.snapshot.get(p)}
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return set()
+            time.sleep(wait)
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """Changes reported by inotify on every directory the scanners walk.
+
+    `changes` returns None among the paths when the kernel queue overflowed
+    or a directory went away, since the files affected are then unknown.
+    """
+
+    def __init__(self, discover):
+        from inotify_simple import INotify, flags
+
+        self.flags = flags
+        self.discover = discover
+        self.inotify = INotify()
+        self.mask = (flags.CREATE | flags.CLOSE_WRITE | flags.MODIFY | flags.MOVED_TO | flags.MOVED_FROM
+                     | flags.DELETE | flags.DELETE_SELF)
+        self.dirs = {}
+        for d in iter_directories(**discover):
+            self.add(d)
+
+    def add(self, directory):
+        try:
+            self.dirs[self.inotify.add_watch(str(directory), self.mask)] = Path(directory)
+        except OSError as e:
+            # e.g. the per-user watch limit (fs.inotify.max_user_watches)
+            print('Cannot watch', directory, '-', e)
+
+    def changes(self, timeout=None):
+        flags = self.flags
+        events = self.inotify.read(timeout=None if timeout is None else int(timeout * 1000))
+        changed = set()
+        for e in events:
+            if e.mask & flags.Q_OVERFLOW:
+                changed.add(None)
+                continue
+            parent = self.dirs.get(e.wd)
+            if parent is None:
+                continue
+            if e.mask & flags.IGNORED:
+                del self.dirs[e.wd]
+                continue
+            path = parent / e.name if e.name else parent
+            if not e.mask & flags.ISDIR:
+                changed.add(path)
+            elif e.mask & (flags.CREATE | flags.MOVED_TO):
+                # a new directory may arrive with files already in it
+                sub = dict(self.discover, root=path, max_depth=None)
+                for d in iter_directories(**sub):
+                    self.add(d)
+                changed.update(iter_candidates(**sub))
+            elif e.mask & (flags.DELETE | flags.MOVED_FROM):
+                changed.add(None)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+def event_source(discover, interval=POLL_SECONDS, poll=False):
+    """An InotifySource where inotify is available, else a PollingSource."""
+    if not poll:
+        try:
+            return InotifySource(discover)
+        except ImportError:
+            print('inotify_simple is not installed; polling every', interval, 's')
+        except OSError as e:
+            print('inotify is not available (', e, '); polling every', interval, 's')
+    return PollingSource(discover, interval)
+
+
+class Watcher:
+    """The loaded sources in memory, and the runs that bring the outputs in
+    line with them."""
+
+    def __init__(self, context_options, stages=STAGES, jobs=None, full=False):
+        self.context_options = context_options
+        self.discover = context_options['discover']
+        self.scan = context_options.get('scan', {})
+        # the stages after the scan; the scan itself is save_scan on the entries
+        self.stages = [s for s in stages if s.name != SCAN_STAGE.name]
+        self.jobs = jobs
+        self.manifest = ScanManifest(dates.MANIFEST, dates.EXTRACT_DIR,
+                                     parser_version(dates.normalize_date_value, ('ordinals', 'trim', 'float'), FORMATS),
+                                     reset=full)
+        self.entries = {}
+
+    def load_all(self):
+        """Load every candidate file, reusing the manifest's extracts."""
+        with DateParseCache(dates.DATE_CACHE) as cache:
+            self.entries = dict(dates.iter_loaded(cache, manifest=self.manifest, **self.scan, **self.discover))
+        self.manifest.save()
+        print('Watching', len(self.entries), 'files; manifest reused=', self.manifest.reused,
+              'files; re-read=', self.manifest.recorded)
+
+    def ingest(self, paths):
+        """Re-read the files in `paths` (None = every file); return the number
+        of entries added, replaced or dropped."""
+        if None in paths:
+            paths = set(iter_candidates(**dict(self.discover, max_bytes=None))) | set(self.entries)
+        changed = 0
+        with DateParseCache(dates.DATE_CACHE) as cache:
+            for p in sorted(paths, key=str):
+                if not is_candidate(p, **self.discover):
+                    if self.entries.pop(p, None) is not None:
+                        print('Removed:', p)
+                        instrument.count('files_removed')
+                        changed += 1
+                    continue
+                try:
+                    # a touch, or an event for a write that changed nothing
+                    if p in self.entries and self.manifest.lookup(p) is not None:
+                        continue
+                    loaded = dates.normalize_loaded(p, dates.load_file(p), cache)
+                    self.manifest.record(p, loaded)
+                except Exception:
+                    print('Could not read', p, '- it is retried on its next change')
+                    traceback.print_exc()
+                    continue
+                print('Loaded:' if p not in self.entries else 'Reloaded:', p, 'sheets=', len(loaded))
+                self.entries[p] = loaded
+                instrument.count('files_loaded')
+                changed += 1
+        if changed:
+            self.manifest.prune(self.entries)
+            self.manifest.save()
+        return changed
+
+    def rebuild(self, state):
+        """Write the scan outputs from the entries and run the later stages;
+        return their status."""
+        entries = sorted(self.entries.items(), key=lambda e: str(e[0]))
+        scan = Stage(SCAN_STAGE.name, lambda ctx: pipeline.save_scan(ctx, entries),
+                     outputs=SCAN_STAGE.outputs, code=SCAN_STAGE.code)
+        # the scan always runs; its fingerprint here does not cover the sources
+        state.pop(scan.name, None)
+        status = pipeline.run([scan] + self.stages, Context(**self.context_options), state, jobs=self.jobs)
+        state.pop(scan.name, None)
+        pipeline.save_state(pipeline.STATE, state)
+        return status
+
+    def update(self, paths, state, since=None, profile=None, force=False):
+        """Ingest `paths` and rebuild if anything changed (or with `force`)."""
+        with instrument.RunReport('watch', profile) as report:
+            with instrument.stage('ingest') as st:
+                st['files_in'] = len(paths)
+                changed = self.ingest(paths) if paths else 0
+            status = self.rebuild(state) if changed or force else None
+        if status is None:
+            return None
+        report.save(pipeline.REPORT)
+        latency = f' ({time.monotonic() - since:.1f}s after the first change)' if since is not None else ''
+        print(f'Updated{latency}:', ', '.join(f'{name} {result}' for name, result in status.items()))
+        return status
+
+    def run(self, source, settle=SETTLE_SECONDS, profile=None):
+        """Ingest batches of changes from `source` until interrupted."""
+        state = pipeline.load_state(pipeline.STATE)
+        self.update(set(), state, profile=profile, force=True)
+        pending = set()
+        since = None
+        while True:
+            changed = source.changes(settle if pending else None)
+            if changed:
+                if not pending:
+                    since = time.monotonic()
+                pending |= changed
+                continue
+            self.update(pending, state, since, profile)
+            pending = set()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_discovery_args(parser)
+    add_scan_args(parser)
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help='ingest a batch once nothing changed for this many seconds (default: %(default)s)')
+    parser.add_argument('--poll', action='store_true', help='poll even if inotify is available')
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS,
+                        help='seconds between polls (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='stages to run at the same time (default: as many as are ready)')
+    parser.add_argument('--full', action='store_true', help='ignore the scan manifest on the first pass')
+    parser.add_argument('--format', choices=TABLE_FORMATS, default='csv',
+                        help='format of the tables written under data/ (default: csv)')
+    parser.add_argument('--export-csv', action='store_true',
+                        help='with a columnar --format, also write every table as CSV')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the daily rollups in chunks of this many rows')
+    parser.add_argument('--profile', type=Path, default=None, metavar='DIR',
+                        help='write a cProfile .prof file per stage into DIR')
+    parser.add_argument('--store', action='store_true',
+                        help='also keep data/health.sqlite up to date (see health_store.py)')
+    args = parser.parse_args()
+    discover_opts = discovery_options(args)
+    discover_opts['root'] = discover_opts['root'] or dates.DOWNLOADS
+    options = {'discover': discover_opts, 'scan': scan_options(args), 'fmt': args.format,
+               'export_csv': args.export_csv, 'chunksize': args.chunksize}
+    watcher = Watcher(options, STAGES + [STORE_STAGE] if args.store else STAGES, jobs=args.jobs, full=args.full)
+    print('Watching', discover_opts['root'], '(Ctrl+C to stop)')
+    watcher.load_all()
+    source = event_source(discover_opts, args.interval, args.poll)
+    try:
+        watcher.run(source, args.settle, args.profile)
+    except KeyboardInterrupt:
+        print('Stopped')
+    finally:
+        source.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the scripts import each other by module name
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
@@ -0,0 +1,68 @@
+"""csv_reader.read_csv against plain pd.read_csv(dtype=str)."""
+
+import pandas as pd
+import pytest
+
+from csv_reader import read_csv, read_header
+
+
+def plain_read(path, columns=None):
+    """How the scripts read a CSV before csv_reader: UTF-8, else latin-1."""
+    usecols = None if columns is None else set(columns).__contains__
+    try:
+        return pd.read_csv(path, dtype=str, low_memory=False, usecols=usecols)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, dtype=str, low_memory=False, usecols=usecols, encoding='latin-1')
+
+
+FILES = {
+    'plain': ('Date,Weight,Nutrition\n01-05-2020,70,egg | toast\n02-05-2020,,rice\n', 'utf-8'),
+    'ragged': ('Date,Weight,Nutrition\n01-05-2020,70\n02-05-2020\n03-05-2020,71,soup\n', 'utf-8'),
+    'duplicate_header': ('a,a,,a.1,Date,Date\n1,2,3,4,5,6\n7,8,9,10,11,12\n', 'utf-8'),
+    'bom': ('Date,Nutrition\n01-05-2020,café\n', 'utf-8-sig'),
+    'latin1': ('Date,Nutrition\n01-05-2020,crème brûlée\n02-05-2020,piña\n', 'latin-1'),
+    'na_strings': ('Date,Weight\n01-05-2020,NA\n02-05-2020,null\n,\n', 'utf-8'),
+    'quoted': ('Date,Nutrition\n01-05-2020,"egg, toast"\n02-05-2020,"two\nlines"\n', 'utf-8'),
+    'header_only': ('Date,Weight\n', 'utf-8'),
+}
+
+
+@pytest.fixture(params=sorted(FILES))
+def csv_file(request, tmp_path):
+    text, encoding = FILES[request.param]
+    path = tmp_path / f'{request.param}.csv'
+    path.write_bytes(text.encode(encoding))
+    return path
+
+
+def test_read_csv_matches_pandas(csv_file):
+    pd.testing.assert_frame_equal(read_csv(csv_file), plain_read(csv_file))
+
+
+def test_read_header_matches_pandas(csv_file):
+    assert read_header(csv_file) == list(plain_read(csv_file).columns)
+
+
+@pytest.mark.parametrize('columns', [['Date'], ['Nutrition', 'Date'], ['a.1', 'a.2', 'Date.1']])
+def test_read_csv_columns_match_pandas(csv_file, columns):
+    expected = plain_read(csv_file, columns)
+    if expected.shape[1] == 0:
+        pytest.skip('none of the columns is in this file')
+    pd.testing.assert_frame_equal(read_csv(csv_file, columns), expected)
+
+
+def test_latin1_past_the_prefix(tmp_path, monkeypatch):
+    import csv_reader
+    monkeypatch.setattr(csv_reader, 'PREFIX_BYTES', 32)
+    path = tmp_path / 'late.csv'
+    path.write_bytes(('Date,Nutrition\n' + '01-05-2020,egg\n' * 10 + '02-05-2020,crème\n').encode('latin-1'))
+    pd.testing.assert_frame_equal(read_csv(path), plain_read(path))
+
+
+def test_categorical_columns(csv_file):
+    df = read_csv(csv_file, categorical=['Date'])
+    expected = plain_read(csv_file)
+    if 'Date' not in expected.columns:
+        pytest.skip('no Date column')
+    assert isinstance(df['Date'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_series_equal(df['Date'].astype(str), expected['Date'].astype(str))
@@ -0,0 +1,91 @@
+"""DailyPatch builds against full rebuilds of the same frames."""
+
+import pandas as pd
+import pytest
+
+import create_final_daily_csv as final_daily
+import export_nutrition_full_and_agg as full_agg
+from daily_patch import DailyPatch
+
+
+def events():
+    return pd.DataFrame({
+        'Date': ['01-05-2020', '01-05-2020', '02-05-2020', '03-05-2020', '03-05-2020', '05-05-2020'],
+        'Nutrition': ['egg', 'toast', 'rice', 'soup', 'egg', ''],
+        'Exercise': ['', 'run', '', 'swim', 'run', 'walk'],
+    })
+
+
+def add(df):
+    new = pd.DataFrame({'Date': ['02-05-2020', '06-05-2020'], 'Nutrition': ['tea', 'pasta'],
+                        'Exercise': ['', 'yoga']})
+    return pd.concat([df, new], ignore_index=True)
+
+
+def delete(df):
+    return df[df['Nutrition'] != 'soup'].reset_index(drop=True)
+
+
+def edit(df):
+    df = df.copy()
+    df.loc[df['Nutrition'] == 'rice', 'Nutrition'] = 'rice | beans'
+    return df
+
+
+def reorder(df):
+    # swaps two rows of one day, which changes the order its items are joined in
+    return df.iloc[[1, 0] + list(range(2, len(df)))].reset_index(drop=True)
+
+
+def drop_day(df):
+    return df[df['Date'] != '05-05-2020'].reset_index(drop=True)
+
+
+STEPS = [add, delete, edit, reorder, drop_day]
+
+
+def final_build(df, patch=None):
+    return final_daily.build(df, patch=patch)
+
+
+def full_agg_build(df, patch=None):
+    out = full_agg.build(df.rename(columns={'Date': 'Date_normalized'}), patch)
+    return out[1].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('build', [final_build, full_agg_build])
+def test_patched_build_matches_full_build(tmp_path, build):
+    path = tmp_path / 'patch.pkl'
+    df = events()
+    if build is full_agg_build:
+        df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y').dt.strftime('%Y-%m-%d')
+    patch = DailyPatch(path, 'v1')
+    build(df, patch)
+    patch.save()
+    for step in STEPS:
+        df = step(df)
+        patch = DailyPatch(path, 'v1')
+        patched = build(df, patch)
+        patch.save()
+        assert patch.recomputed is not None
+        pd.testing.assert_frame_equal(patched.reset_index(drop=True), build(df).reset_index(drop=True))
+
+
+def test_unchanged_input_recomputes_nothing(tmp_path):
+    path = tmp_path / 'patch.pkl'
+    patch = DailyPatch(path, 'v1')
+    final_build(events(), patch)
+    patch.save()
+    patch = DailyPatch(path, 'v1')
+    final_build(events(), patch)
+    assert patch.recomputed == 0
+
+
+def test_other_version_builds_everything(tmp_path):
+    path = tmp_path / 'patch.pkl'
+    patch = DailyPatch(path, 'v1')
+    final_build(events(), patch)
+    patch.save()
+    patch = DailyPatch(path, 'v2')
+    final_build(events(), patch)
+    assert patch.recomputed is None
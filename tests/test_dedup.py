@@ -0,0 +1,113 @@
+"""RowDeduper against a plain set of row contents."""
+
+import random
+from collections import Counter
+
+import pandas as pd
+
+from dedup import RowDeduper
+
+
+def plain_dedup(sheets):
+    """Keep a row unless an earlier sheet had its content as often: the
+    content is its non-empty (lowercased column, stripped value) cells."""
+    seen = Counter()
+    kept = []
+    for df in sheets:
+        counts = Counter()
+        rows = []
+        for _, row in df.iterrows():
+            content = frozenset((str(c).lower().strip(), str(v).strip()) for c, v in row.items()
+                                if pd.notna(v) and str(v).strip() != '')
+            counts[content] += 1
+            if counts[content] > seen[content]:
+                rows.append(row.name)
+        for content, n in counts.items():
+            seen[content] = max(seen[content], n)
+        kept.append(df.loc[rows])
+    return kept
+
+
+def fast_dedup(sheets):
+    deduper = RowDeduper()
+    return [deduper.add(df, f'file{i}.xlsx', 'Sheet1') for i, df in enumerate(sheets)]
+
+
+def test_drops_only_real_repeats():
+    first = pd.DataFrame({'Weight': ['70', '70', '71'], 'Nutrition': ['egg', 'egg', 'rice']})
+    # same rows, other column order and case, padding and number spelling
+    copy = pd.DataFrame({'nutrition ': [' egg', 'rice'], 'WEIGHT': ['70.0', '71']})
+    # one repeat of a row the first sheet lists twice, and a new row
+    partly = pd.DataFrame({'Weight': ['70', '70', '70', '72'], 'Nutrition': ['egg', 'egg', 'egg', 'egg']})
+    deduper = RowDeduper()
+    assert len(deduper.add(first, 'a.xlsx', 'Log')) == 3
+    assert len(deduper.add(copy, 'b.xlsx', 'Log')) == 0
+    kept = deduper.add(partly, 'c.csv', '')
+    assert kept.index.tolist() == [2, 3]
+    duplicates = deduper.duplicates()
+    assert len(duplicates) == 4
+    assert duplicates[duplicates['source_file'] == 'c.csv'][['row', 'kept_file', 'kept_row']].values.tolist() \
+        == [[0, 'a.xlsx', 0], [1, 'a.xlsx', 1]]
+
+
+def test_empty_cells_and_sources_are_not_content():
+    first = pd.DataFrame({'Nutrition': ['egg'], 'Exercise': [''], 'source_file': ['a.xlsx']})
+    second = pd.DataFrame({'Nutrition': ['egg'], 'source_file': ['b.xlsx']})
+    deduper = RowDeduper()
+    deduper.add(first, 'a.xlsx', 'Log')
+    assert len(deduper.add(second, 'b.xlsx', 'Log')) == 0
+
+
+def test_matches_plain_dedup():
+    rng = random.Random(0)
+    values = ['egg', 'rice', 'soup', '', 'tea']
+    sheets = []
+    for _ in range(30):
+        columns = rng.sample(['Nutrition', 'Exercise', 'Notes'], rng.randint(1, 3))
+        n = rng.randint(0, 6)
+        sheets.append(pd.DataFrame({c: [rng.choice(values) for _ in range(n)] for c in columns}, dtype=str))
+    for fast, plain in zip(fast_dedup(sheets), plain_dedup(sheets)):
+        assert fast.index.tolist() == plain.index.tolist()
+
+
+def test_first_copy_is_kept_and_decides_the_last_weight():
+    # a.xlsx and its later copy c.xlsx, with b.csv in between giving the
+    # same day another weight; the copy's rows are dropped, so the day's
+    # last weight is b.csv's and not the copy's
+    import export_nutrition_full_and_agg as full_agg
+    a = pd.DataFrame({'Date_normalized': ['2022-04-27'], 'Weight': ['125.8'], 'Nutrition': ['egg']})
+    b = pd.DataFrame({'Date_normalized': ['2022-04-27'], 'Weight': ['130.8'], 'Nutrition': ['rice']})
+    deduper = RowDeduper()
+    kept = [deduper.add(df, name, '') for name, df in [('a.xlsx', a), ('b.csv', b), ('c.xlsx', a.copy())]]
+    assert [len(df) for df in kept] == [1, 1, 0]
+    agg = full_agg.build(pd.concat(kept, ignore_index=True))[1]
+    assert agg['Weight'].tolist() == ['130.8']
+    assert agg['Nutrition'].tolist() == ['egg | rice']
+
+
+def test_many_sheets_match_plain_dedup():
+    rng = random.Random(1)
+    sheets = [pd.DataFrame({'Nutrition': [str(rng.randint(0, 400)) for _ in range(rng.randint(0, 40))]}, dtype=str)
+              for _ in range(200)]
+    deduper = RowDeduper()
+    fast = [deduper.add(df, f'file{i}.csv', '') for i, df in enumerate(sheets)]
+    for fast_df, plain_df in zip(fast, plain_dedup(sheets)):
+        assert fast_df.index.tolist() == plain_df.index.tolist()
+    assert len(deduper.runs) <= 9
+    duplicates = deduper.duplicates()
+    for _, dup in duplicates.sample(50, random_state=0).iterrows():
+        source = sheets[int(dup['source_file'][4:-4])]
+        kept = sheets[int(dup['kept_file'][4:-4])]
+        assert source['Nutrition'].iat[dup['row']] == kept['Nutrition'].iat[dup['kept_row']]
+
+
+def test_date_formats_are_counted_before_dedup():
+    import extract_and_fix_dates_downloads as dates
+    df = pd.DataFrame({'Date': ['01/05/2020', '02/05/2020'], 'Nutrition': ['egg', 'rice'],
+                       'Date_normalized': ['2020-05-01', '2020-05-02']})
+    copy = df.copy()
+    entries = [(f'{name}.csv', [('', 'csv', frame.assign(source_file=f'{name}.csv', source_sheet=''))])
+               for name, frame in [('a', df), ('b', copy)]]
+    sources, frames, bad_frames, duplicates, formats = dates.collect(entries)
+    assert len(frames) == 1 and len(duplicates) == 2
+    assert [(f['source_file'], f['values']) for f in formats] == [('a.csv', 2), ('b.csv', 2)]
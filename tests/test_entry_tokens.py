@@ -0,0 +1,44 @@
+"""entry_tokens: entry parsing, interning and tokens back on their rows."""
+
+import math
+
+import pandas as pd
+import pytest
+
+from entry_tokens import items, parse_entries, tokenize
+
+
+@pytest.mark.parametrize('entry, quantity, unit, item', [
+    ('2 Electrolyte Drink', 2, None, 'Electrolyte Drink'),
+    ('4L water', 4, 'l', 'water'),
+    ('2x Black Coffee', 2, 'x', 'Black Coffee'),
+    ('99% Cocoa', 99, '%', 'Cocoa'),
+    ('100 Bicep Curls', 100, None, 'Bicep Curls'),
+    ('7 up Zero', None, None, '7 up Zero'),
+    ('1.5 kg rice', 1.5, 'kg', 'rice'),
+    ('500 ml milk', 500, 'ml', 'milk'),
+    ('2 Large eggs', 2, None, 'Large eggs'),
+    ('almonds', None, None, 'almonds'),
+    ('12', 12, None, None),
+])
+def test_parse_entries(entry, quantity, unit, item):
+    row = parse_entries([entry]).iloc[0]
+    assert (math.isnan(row['quantity']) if quantity is None else row['quantity'] == quantity)
+    assert (pd.isna(row['unit']) if unit is None else row['unit'] == unit)
+    assert (pd.isna(row['item']) if item is None else row['item'] == item)
+
+
+def test_tokenize_interns_items_and_keeps_rows():
+    df = pd.DataFrame({
+        'Date': ['01-05-2020', '02-05-2020', '03-05-2020'],
+        'Nutrition': ['2 Pumpkin seeds | 1.5 kg rice', 'Pumpkin  Seeds', ''],
+        'Exercise': ['', '100 Bicep Curls', '50 bicep curls'],
+    }, dtype='str')
+    tokens, vocabulary = tokenize(df)
+    assert tokens[['event', 'column', 'position']].values.tolist() == [
+        [0, 'Nutrition', 0], [0, 'Nutrition', 1], [1, 'Nutrition', 0], [1, 'Exercise', 0], [2, 'Exercise', 0]]
+    assert tokens['Date'].tolist() == ['01-05-2020', '01-05-2020', '02-05-2020', '02-05-2020', '03-05-2020']
+    assert vocabulary['item'].tolist() == ['Pumpkin seeds', 'rice', 'Bicep Curls']
+    assert vocabulary['entries'].tolist() == [2, 1, 2]
+    assert list(items(tokens, vocabulary)) == ['Pumpkin seeds', 'rice', 'Pumpkin seeds', 'Bicep Curls', 'Bicep Curls']
+    assert tokens['quantity'].tolist()[:2] == [2, 1.5]
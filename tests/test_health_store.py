@@ -0,0 +1,61 @@
+"""health_store: upserts that mirror the last scan, range queries and the CLI."""
+
+import pandas as pd
+import pytest
+
+import health_store
+
+
+def merged(weights=('70', '71', '72')):
+    return pd.DataFrame({
+        'Date': ['01/09/2025', '10/09/2025', '20/09/2025'],
+        'Date_normalized': ['2025-09-01', '2025-09-10', '2025-09-20'],
+        'Weight': list(weights),
+        'Nutrition': ['egg', 'rice', 'egg | tea'],
+        'Exercise': ['', '100 Bicep Curls', ''],
+        'source_file': ['a.xlsx', 'a.xlsx', 'b.csv'],
+        'source_sheet': ['Log', 'Log', ''],
+    }, dtype='str')
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / 'health.sqlite'
+    assert health_store.load(merged(), path) == 3
+    return path
+
+
+def test_query_range(db):
+    rows = health_store.query(db, '2025-09-05', '2025-09-30')
+    assert rows['date'].tolist() == ['2025-09-10', '2025-09-20']
+    assert rows['weight'].tolist() == [71.0, 72.0]
+    assert health_store.query(db, exercise='%curl%')['row'].tolist() == [1]
+
+
+def test_load_mirrors_the_last_scan(db):
+    # a.xlsx shrank to one row with a new weight; b.csv is gone
+    df = merged(('69', '71', '72')).iloc[:1]
+    assert health_store.load(df, db) == 1
+    rows = health_store.query(db)
+    assert rows[['source_file', 'row', 'weight_raw']].values.tolist() == [['a.xlsx', 0, '69']]
+
+
+def test_daily_matches_the_aggregate(db):
+    out = health_store.daily(health_store.query(db))
+    assert out['Date'].tolist() == ['2025-09-20', '2025-09-10', '2025-09-01']
+    assert out['Nutrition'].tolist() == ['egg | tea', 'rice', 'egg']
+
+
+@pytest.mark.parametrize('value', ['garbage', '01/02/2025', '2025-13-01'])
+def test_bad_range_is_a_usage_error(db, capsys, value):
+    with pytest.raises(SystemExit) as exit:
+        health_store.main(['--db', str(db), 'query', '--from', value])
+    assert exit.value.code == 2
+    assert 'not a YYYY-MM-DD date' in capsys.readouterr().err
+
+
+def test_cli_query(db, capsys):
+    health_store.main(['--db', str(db), 'query', '--from', '2025-09-10', '--to', '2025-09-10', '--csv'])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == 'Date,Weight,Nutrition,Exercise,source_file,source_sheet'
+    assert out[1:] == ['2025-09-10,71,rice,100 Bicep Curls,a.xlsx,Log']
@@ -0,0 +1,94 @@
+"""month_partitions: rewrites of only the changed months, and range reads
+against filtering the whole table."""
+
+import pandas as pd
+import pytest
+
+from month_partitions import (MANIFEST_NAME, UNDATED, dataset_dir, load_manifest, range_path, read_range,
+                              write_dataset)
+
+
+def merged():
+    return pd.DataFrame({
+        'Date_normalized': ['2025-01-03', '2025-01-20', '2025-02-01', '2025-02-28', '2025-03-15', ''],
+        'Nutrition': ['egg', 'rice', 'soup', 'tea', 'pasta', 'undated'],
+    }, dtype='str').replace('', pd.NA)
+
+
+def part(path, name):
+    return dataset_dir(path) / name / 'part.csv'
+
+
+def mtimes(path):
+    return {p.parent.relative_to(dataset_dir(path)).as_posix(): p.stat().st_mtime_ns
+            for p in dataset_dir(path).rglob('part.csv')}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'merged.csv'
+    assert write_dataset(merged(), path) == 4
+    return path
+
+
+def test_unchanged_rows_write_nothing(path):
+    before = mtimes(path)
+    assert write_dataset(merged(), path) == 0
+    assert mtimes(path) == before
+
+
+def test_only_changed_months_are_rewritten(path):
+    before = mtimes(path)
+    df = merged()
+    df.loc[2, 'Nutrition'] = 'soup | bread'
+    assert write_dataset(df, path) == 1
+    after = mtimes(path)
+    assert [name for name in after if after[name] != before[name]] == ['year=2025/month=02']
+    assert 'soup | bread' in part(path, 'year=2025/month=02').read_text()
+
+
+def test_new_and_removed_months(path):
+    df = merged()
+    df = df[~df['Date_normalized'].fillna('').str.startswith('2025-03')]
+    df = pd.concat([df, pd.DataFrame({'Date_normalized': ['2025-04-01'], 'Nutrition': ['oats']}, dtype='str')])
+    assert write_dataset(df, path) == 1
+    assert not part(path, 'year=2025/month=03').exists()
+    assert part(path, 'year=2025/month=04').exists()
+    assert sorted(load_manifest(dataset_dir(path))['partitions']) == [
+        'year=2025/month=01', 'year=2025/month=02', 'year=2025/month=04', f'year={UNDATED}/month={UNDATED}']
+
+
+def test_missing_partition_is_rewritten(path):
+    part(path, 'year=2025/month=01').unlink()
+    assert write_dataset(merged(), path) == 1
+    assert part(path, 'year=2025/month=01').exists()
+
+
+def test_new_columns_rewrite_everything(path):
+    assert write_dataset(merged().assign(Weight='70'), path) == 4
+    assert (dataset_dir(path) / MANIFEST_NAME).exists()
+
+
+@pytest.mark.parametrize('start, end', [('2025-01', '2025-01'), ('2025-01-15', '2025-02-01'), ('2025-02', None),
+                                        (None, '2025-01'), ('2024', '2024'), (None, None)])
+def test_read_range_matches_filtering_the_table(path, start, end):
+    df = merged()
+    dates = pd.to_datetime(df['Date_normalized'])
+    keep = pd.Series(True, index=df.index) if start is None and end is None else dates.notna()
+    if start is not None:
+        keep &= dates >= pd.Period(start).start_time
+    if end is not None:
+        keep &= dates <= pd.Period(end).end_time
+    expected = df[keep]
+    if start is None and end is None:
+        # the undated rows come last
+        expected = pd.concat([expected[dates.notna()], expected[dates.isna()]])
+    pd.testing.assert_frame_equal(read_range(path, start, end), expected.reset_index(drop=True))
+
+
+def test_range_path_keeps_full_output(tmp_path):
+    out = tmp_path / 'nutrition_aggregated.csv'
+    assert range_path(out) == out
+    assert range_path(out, '2025-06', '2025-07').name == 'nutrition_aggregated_2025-06_to_2025-07.csv'
+    assert range_path(out, '2025-06').name == 'nutrition_aggregated_from_2025-06.csv'
+    assert range_path(out, None, '2025').name == 'nutrition_aggregated_to_2025.csv'
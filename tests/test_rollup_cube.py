@@ -0,0 +1,72 @@
+"""rollup_cube: period weights, date parsing, patched builds and lookups."""
+
+import pandas as pd
+
+import rollup_cube
+from daily_patch import DailyPatch
+
+
+def full_rows():
+    # in source-file order, not date order
+    return pd.DataFrame({
+        'Date': ['2025-09-20', '2025-09-01', '2025-09-10', '2025-09-10'],
+        'Weight': ['72', '70', '71', ''],
+        'Nutrition': ['2 Electrolyte Drink', '1 Electrolyte Drink', 'almonds', '4L water'],
+        'Exercise': ['100 Bicep Curls', '', '50 Bicep Curls', ''],
+    }, dtype='str')
+
+
+def totals(cube, level):
+    rows = cube[(cube['level'] == level) & (cube['item'] == '')]
+    return dict(zip(rows['period'], rows['weight']))
+
+
+def test_period_weight_is_the_latest_days():
+    cube = rollup_cube.build(full_rows())
+    assert totals(cube, 'month') == {'2025-09': '72'}
+    assert totals(cube, 'week') == {'2025-W36': '70', '2025-W37': '71', '2025-W38': '72'}
+    assert totals(cube, 'day')['2025-09-10'] == '71'
+
+
+def test_sums_and_counts():
+    cube = rollup_cube.build(full_rows())
+    month = cube[cube['level'] == 'month'].set_index(['column', 'item', 'unit'])
+    assert month.loc[('Exercise', 'bicep curls', ''), 'quantity'] == 150
+    assert month.loc[('Nutrition', 'electrolyte drink', ''), 'entries'] == 2
+    assert month.loc[('Nutrition', 'water', 'l'), 'quantity'] == 4
+    assert month.loc[('', '', ''), 'entries'] == 6
+
+
+def test_dates_in_other_formats_are_left_out():
+    df = pd.concat([pd.DataFrame({'Date': ['20/09/2025'], 'Weight': ['99'], 'Nutrition': ['tea'], 'Exercise': ['']},
+                                 dtype='str'), full_rows()], ignore_index=True)
+    cube = rollup_cube.build(df)
+    assert set(cube.loc[cube['level'] == 'day', 'period']) == {'2025-09-01', '2025-09-10', '2025-09-20'}
+    assert 'tea' not in set(cube['item'])
+
+
+def test_patched_build_matches_full_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollup_cube, 'PATCH_DIR', tmp_path)
+    patches = rollup_cube.level_patches()
+    rollup_cube.build(full_rows(), patches)
+    for patch in patches.values():
+        patch.save()
+    df = full_rows()
+    df.loc[1, 'Nutrition'] = '3 Electrolyte Drink'
+    df = pd.concat([df, pd.DataFrame({'Date': ['2025-10-02'], 'Weight': ['73'], 'Nutrition': ['tea'],
+                                      'Exercise': ['']}, dtype='str')], ignore_index=True)
+    patches = rollup_cube.level_patches()
+    patched = rollup_cube.build(df, patches)
+    assert all(isinstance(p, DailyPatch) and p.recomputed is not None for p in patches.values())
+    pd.testing.assert_frame_equal(patched, rollup_cube.build(df))
+
+
+def test_lookup(tmp_path):
+    path = tmp_path / 'rollup_cube.csv'
+    rollup_cube.build(full_rows()).to_csv(path, index=False)
+    cube = rollup_cube.load_cube(path)
+    rows = rollup_cube.lookup(cube, 'week', 'BICEP  curls')
+    assert rows['period'].tolist() == ['2025-W37', '2025-W38']
+    assert rows['quantity'].tolist() == [50, 100]
+    missing = rollup_cube.lookup(cube, 'week', 'no such item')
+    assert len(missing) == 0 and list(missing.columns) == rollup_cube.CUBE_COLUMNS
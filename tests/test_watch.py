@@ -0,0 +1,87 @@
+"""watch: change detection and incremental rebuilds on a small tree."""
+
+import importlib
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+SCRIPTS = ['extract_and_fix_dates_downloads', 'extract_health_from_downloads', 'fix_subset_dates',
+           'export_nutrition_full_and_agg', 'export_nutrition_events', 'entry_tokens', 'rollup_cube',
+           'create_final_daily_csv', 'create_nutrition_csv', 'create_nutrition_dmy', 'health_store']
+HEADER = 'Date,Weight,Nutrition,Exercise\n'
+
+
+@pytest.fixture
+def watch(tmp_path, monkeypatch):
+    """The watch module with every data/ path of the scripts under tmp_path."""
+    data = Path(__file__).resolve().parents[1] / 'data'
+    out = tmp_path / 'data'
+
+    def redirect(module):
+        for name, value in list(vars(module).items()):
+            if isinstance(value, Path) and (value == data or data in value.parents):
+                monkeypatch.setattr(module, name, out / value.relative_to(data))
+
+    for name in SCRIPTS:
+        redirect(importlib.import_module(name))
+    # the pipeline's stages hold the paths of the scripts when it is imported
+    pipeline = importlib.reload(importlib.import_module('pipeline'))
+    redirect(pipeline)
+    return importlib.reload(importlib.import_module('watch'))
+
+
+def discover(root):
+    from discover import DEFAULT_EXTENSIONS, DEFAULT_IGNORE
+    return {'root': root, 'extensions': DEFAULT_EXTENSIONS, 'ignore': DEFAULT_IGNORE,
+            'max_depth': None, 'max_bytes': None, 'skip_hidden': True}
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(HEADER + text)
+    return path
+
+
+def test_polling_source_reports_added_changed_and_removed_files(watch, tmp_path):
+    tree = tmp_path / 'Downloads'
+    first = write(tree / 'health_a.csv', '2025-09-01,70,egg,\n')
+    source = watch.PollingSource(discover(tree), interval=0.01)
+    assert source.changes(timeout=0) == set()
+    second = write(tree / 'sub' / 'health_b.csv', '2025-09-02,71,rice,\n')
+    assert source.changes(timeout=1) == {second}
+    time.sleep(0.01)
+    first.write_text(HEADER + '2025-09-01,70,egg | tea,\n')
+    assert source.changes(timeout=1) == {first}
+    second.unlink()
+    assert source.changes(timeout=1) == {second}
+
+
+def test_update_rebuilds_only_on_changes(watch, tmp_path):
+    import create_final_daily_csv as final_daily
+    tree = tmp_path / 'Downloads'
+    first = write(tree / 'health_a.csv', '2025-09-01,70,egg,Run\n2025-09-02,71,rice,\n')
+    options = {'discover': discover(tree), 'scan': {'workers': 1, 'timeout': None}}
+    watcher = watch.Watcher(options, jobs=1)
+    watcher.load_all()
+    state = {}
+    assert watcher.update(set(), state, force=True) is not None
+    assert read_dates(final_daily.OUT) == ['02-09-2025', '01-09-2025']
+
+    second = write(tree / 'health_b.csv', '2025-09-03,72,soup,\n')
+    status = watcher.update({second}, state)
+    assert status is not None and status['final_daily'] == 'ran'
+    assert read_dates(final_daily.OUT) == ['03-09-2025', '02-09-2025', '01-09-2025']
+
+    # nothing changed: no rebuild
+    assert watcher.update({second}, state) is None
+
+    first.unlink()
+    watcher.update({first}, state)
+    assert read_dates(final_daily.OUT) == ['03-09-2025']
+    assert set(watcher.entries) == {second}
+
+
+def read_dates(path):
+    return pd.read_csv(path, dtype=str)['Date'].tolist()